@@ -0,0 +1,145 @@
+"""
+Runs node steps concurrently against a local fake salt-api (see fake_salt_api.py) and reports the requests
+made per node, the step latencies, the CPU time and the peak RSS of the steps.
+
+Run from the contents directory:
+
+    python benchmarks/bench_node_steps.py --nodes 1 100 1000 --job-duration 2 --payload-size 10000
+
+The steps run as threads of this process by default, or as one salt.py process per node with --mode process,
+as Rundeck runs them. The fake salt-api runs in its own process so its CPU time is not counted.
+In thread mode the peak RSS is that of this process so far, in process mode the largest of the step processes.
+"""
+import sys, os
+import time
+import json
+import logging
+import argparse
+import resource
+import subprocess
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin
+from util.step_context import StepContext
+
+USER = "user"
+PASSWORD = "password"
+EAUTH = "pam"
+
+
+def start_fake_salt_api(args):
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), 'fake_salt_api.py'),
+                               '--job-duration', str(args.job_duration),
+                               '--payload-size', str(args.payload_size),
+                               '--error-rate', str(args.error_rate),
+                               '--seed', '42'],
+                              stdout=subprocess.PIPE, text=True)
+    return server, server.stdout.readline().strip()
+
+
+def request_stats(endpoint):
+    with urllib.request.urlopen(endpoint + '/stats?reset=1') as response:
+        return json.load(response)
+
+
+def step_context(endpoint, args, minionId):
+    optionData = {
+        'SALT_API_END_POINT': endpoint,
+        'SALT_API_EAUTH': EAUTH,
+        'SALT_USER': USER,
+        'SALT_PASSWORD': PASSWORD,
+    }
+    config = {
+        'FUNCTION': args.function,
+        'EVENTSTREAM': 'true' if args.events else 'false',
+        'JOBLOOKUP': args.job_lookup,
+    }
+    return optionData, config, {'NAME': minionId}
+
+
+def run_thread_step(endpoint, args, minionId):
+    optionData, config, node = step_context(endpoint, args, minionId)
+    started = time.perf_counter()
+    try:
+        SaltApiNodeStepPlugin().run_step(StepContext(optionData, {}, config, node))
+        failed = False
+    except Exception:
+        # Unmapped errors, e.g. salt-api answering 503, are raised as they are
+        failed = True
+    return time.perf_counter() - started, failed
+
+
+def run_process_step(endpoint, args, minionId):
+    optionData, config, node = step_context(endpoint, args, minionId)
+    env = dict(os.environ)
+    env.update({'RD_OPTION_' + key: value for key, value in optionData.items()})
+    env.update({'RD_CONFIG_' + key: value for key, value in config.items()})
+    env.update({'RD_NODE_' + key: value for key, value in node.items()})
+
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, 'salt.py'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started, process.returncode != 0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(endpoint, args, nodes):
+    run = run_thread_step if args.mode == 'thread' else run_process_step
+    who = resource.RUSAGE_SELF if args.mode == 'thread' else resource.RUSAGE_CHILDREN
+
+    request_stats(endpoint)
+    before = resource.getrusage(who)
+    started = time.perf_counter()
+
+    # A barrier would be fairer, but starting the steps is part of what is measured
+    with ThreadPoolExecutor(max_workers=nodes) as executor:
+        results = list(executor.map(lambda i: run(endpoint, args, "minion%04d" % i), range(nodes)))
+
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(who)
+    requests = sum(request_stats(endpoint).values())
+
+    latencies = [latency for latency, failed in results]
+    failures = sum(1 for latency, failed in results if failed)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    print("%6d %10.2f %10.3f %10.3f %8d %8.2f %10.2f %10.1f" % (
+        nodes, requests / nodes, percentile(latencies, 0.5), percentile(latencies, 0.99), failures,
+        cpu, elapsed, after.ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 100, 1000], help="numbers of concurrent node steps to run")
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread', help="run the steps as threads or as salt.py processes")
+    parser.add_argument('--function', default='cmd.run_all "echo benchmark"', help="salt function the steps run")
+    parser.add_argument('--job-duration', type=float, default=0.0, help="seconds each job takes to return")
+    parser.add_argument('--payload-size', type=int, default=100, help="characters of output of each return")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument('--events', action='store_true', help="wait for the returns on the event stream")
+    parser.add_argument('--job-lookup', choices=['jobs', 'runner'], default='jobs', help="how the returns are polled")
+    parser.add_argument('--debug', action='store_true', help="run with DEBUG logging enabled")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.ERROR, format='%(threadName)s %(levelname)s - %(message)s')
+    threading.stack_size(512 * 1024)
+
+    server, endpoint = start_fake_salt_api(args)
+    try:
+        print("fake salt-api at %s: jobs of %.2f s, %d character returns, %.1f%% errors" % (
+            endpoint, args.job_duration, args.payload_size, args.error_rate * 100))
+        print("%6s %10s %10s %10s %8s %8s %10s %10s" % ("nodes", "req/node", "p50 s", "p99 s", "failed", "cpu s", "wall s", "rss MB"))
+        for nodes in args.nodes:
+            measure(endpoint, args, nodes)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares masking secure options with a str.replace per secret, as build_lowstate used to,
+with a flat alternation of the secrets and with util.redaction.Redactor.
+
+Run from the contents directory:
+
+    python benchmarks/bench_redaction.py --secrets 10 100 500 --output-size 5000000
+"""
+import sys, os
+import re
+import time
+import random
+import string
+import argparse
+
+sys.path.append(os.getcwd())
+from util.redaction import Redactor, MASK
+
+
+def replace_loop(secrets):
+    def redact(text):
+        for secret in secrets:
+            text = text.replace(secret, MASK)
+        return text
+    return redact
+
+
+def alternation(secrets):
+    pattern = re.compile('|'.join(re.escape(secret) for secret in sorted(secrets, key=len, reverse=True)))
+    return lambda text: pattern.sub(MASK, text)
+
+
+def trie(secrets):
+    return Redactor(secrets).redact
+
+
+def make_secrets(count, rng):
+    # Tokens sharing prefixes, as API keys of the same service do
+    return ["sk_live_" + "".join(rng.choices(string.ascii_letters + string.digits, k=24)) for _ in range(count)]
+
+
+def make_output(size, secrets, rng):
+    line = "2024-01-15 10:00:00 INFO request handled in 12 ms for sk_live_ user\n"
+    lines = [line] * (size // len(line))
+    for i in range(0, len(lines), 1000):
+        lines[i] = "token=%s\n" % rng.choice(secrets)
+    return "".join(lines)
+
+
+def measure(name, compile_redactor, secrets, output):
+    started = time.perf_counter()
+    redact = compile_redactor(secrets)
+    compiled = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = redact(output)
+    elapsed = time.perf_counter() - started
+
+    print("%-14s %8d %10.4f %10.4f %10.1f" % (name, len(secrets), compiled, elapsed, len(output) / elapsed / 1e6))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--secrets', type=int, nargs='+', default=[1, 10, 100, 500], help="numbers of secure options")
+    parser.add_argument('--output-size', type=int, default=5000000, help="characters of minion output to mask")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print("%-14s %8s %10s %10s %10s" % ("engine", "secrets", "compile s", "mask s", "MB/s"))
+
+    for count in args.secrets:
+        secrets = make_secrets(count, rng)
+        output = make_output(args.output_size, secrets, rng)
+
+        results = [measure(name, engine, secrets, output)
+                   for name, engine in [("replace loop", replace_loop), ("alternation", alternation), ("trie", trie)]]
+        if len(set(results)) != 1:
+            print("engines disagree for %d secrets" % count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Counts the json decodes per node step for a large highstate-like minion return.
+
+Run from the contents directory:
+
+    python benchmarks/bench_response_decoding.py --states 20000 --polls 5
+"""
+import sys, os
+import time
+import json
+import logging
+import argparse
+from unittest import mock
+
+import requests
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin
+
+MINION = "minion"
+JID = "20130213093536481553"
+
+
+class CountingResponse(requests.Response):
+    decodes = 0
+
+    def json(self, **kwargs):
+        CountingResponse.decodes += 1
+        return super().json(**kwargs)
+
+
+def make_response(status_code, document):
+    response = CountingResponse()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response._content = json.dumps(document).encode()
+    return response
+
+
+def highstate(states):
+    return {
+        f"file_|-state{i}_|-/etc/state{i}_|-managed": {
+            "name": f"/etc/state{i}",
+            "result": True,
+            "comment": "File /etc/state%d is in the correct state" % i,
+            "changes": {},
+            "duration": 1.25,
+            "start_time": "10:00:00.000000",
+            "__run_num__": i,
+            "__sls__": "bench",
+        } for i in range(states)
+    }
+
+
+def measure(name, call, requests_made):
+    CountingResponse.decodes = 0
+    started = time.perf_counter()
+    call()
+    elapsed = time.perf_counter() - started
+    print("%-24s %8d %8d %10.4f" % (name, requests_made, CountingResponse.decodes, elapsed))
+    return CountingResponse.decodes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--states', type=int, default=20000, help="number of states in the minion return")
+    parser.add_argument('--polls', type=int, default=5, help="number of polls before the minion returns")
+    parser.add_argument('--debug', action='store_true', help="run with DEBUG logging enabled")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.DEBUG if args.debug else logging.WARNING)
+
+    document = {"return": [{MINION: highstate(args.states)}]}
+    print("minion return: %d states, %.1f MB" % (args.states, len(json.dumps(document)) / 1e6))
+    print("%-24s %8s %8s %10s" % ("step", "requests", "decodes", "seconds"))
+
+    plugin = SaltApiNodeStepPlugin("https://localhost", "user", "password", "pam")
+    plugin.timer = mock.MagicMock()
+
+    login = make_response(200, {"return": [{"token": "123qwe", "expire": time.time() + 3600}]})
+    with mock.patch.object(plugin.session, 'post', return_value=login):
+        measure("authenticate", plugin.authenticate, 1)
+
+    dispatched = make_response(202, {"return": [{"jid": JID, "minions": [MINION]}]})
+    with mock.patch.object(plugin.session, 'post', return_value=dispatched):
+        measure("submit_job", lambda: plugin.submit_job("123qwe", MINION, "state.highstate"), 1)
+
+    polls = [make_response(200, {"return": [{}]}) for _ in range(args.polls)] + [make_response(200, document)]
+    with mock.patch.object(plugin.session, 'get', side_effect=polls):
+        decodes, elapsed = measure("wait_for_jid_response", lambda: plugin.wait_for_jid_response("123qwe", JID, MINION), len(polls))
+
+    print("decodes per poll: %.2f" % (decodes / len(polls)))
+
+
+if __name__ == "__main__":
+    main()
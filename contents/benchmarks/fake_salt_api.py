@@ -0,0 +1,267 @@
+"""
+A local stand-in for salt-api, serving /login, /minions, / (local_async, jobs.lookup_jid and jobs.list_jobs lowstates),
+/jobs/<jid>, /events and /logout from memory, with configurable job durations, return sizes and error rates.
+
+Run from the contents directory, it prints the port it listens on:
+
+    python benchmarks/fake_salt_api.py --job-duration 0.5 --payload-size 10000 --error-rate 0.01
+
+GET /stats returns the number of requests served per resource, GET /stats?reset=1 also resets them.
+"""
+import json
+import random
+import argparse
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STATE_SIZE = 200
+
+
+class FakeSaltApi(ThreadingHTTPServer):
+    """
+    Serves salt-api's resources for the jobs it is asked to run, without any minion.
+    Every targeted minion returns its job job_duration seconds after it was submitted.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), job_duration=0.0, payload_size=100, error_rate=0.0, seed=None):
+        """
+        :param job_duration: The number of seconds a job takes to return.
+        :param payload_size: The number of characters of output (or states, for state functions) of each return.
+        :param error_rate: The fraction of requests to answer with a 503 instead.
+        :param seed: The seed of the errors, for reproducible runs.
+        """
+        super().__init__(address, FakeSaltApiHandler)
+        self.job_duration = job_duration
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.jobs = {}
+        self.requests = Counter()
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, resource):
+        """
+        Counts a request and decides whether it fails.
+        :return True if the request should be answered with an error.
+        """
+        with self.lock:
+            self.requests[resource] += 1
+            return self.random.random() < self.error_rate
+
+    def stats(self, reset=False):
+        with self.lock:
+            stats = dict(self.requests)
+            if reset:
+                self.requests.clear()
+        return stats
+
+    def login(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        return {"token": token, "expire": time.time() + 43200, "start": time.time(), "eauth": "pam", "perms": [".*"]}
+
+    def submit(self, lowstate):
+        target = lowstate.get('tgt')
+        minions = target if isinstance(target, list) else [target]
+        jid = "%d%06d" % (time.time() * 1000000, self.random.randint(0, 999999))
+        with self.lock:
+            self.jobs[jid] = (time.monotonic() + self.job_duration, lowstate.get('fun'), minions, lowstate.get('arg') or [])
+        return {"jid": jid, "minions": minions}
+
+    def returns(self, jid):
+        """
+        Returns the returns of the minions of the job, empty until the job is done.
+        """
+        with self.lock:
+            job = self.jobs.get(jid)
+        if job is None or job[0] > time.monotonic():
+            return {}
+
+        done, function, minions, arguments = job
+        return {minionId: self.minion_return(function, minionId) for minionId in minions}
+
+    def list_jobs(self, search_function=None, search_target=None):
+        """
+        Lists the jobs as the jobs.list_jobs runner does, ignoring their start time.
+        """
+        with self.lock:
+            jobs = list(self.jobs.items())
+        return {
+            jid: {"Function": function, "Arguments": arguments, "Target": minions[0] if len(minions) == 1 else minions,
+                  "Target-type": "glob" if len(minions) == 1 else "list", "User": "user"}
+            for jid, (done, function, minions, arguments) in jobs
+            if search_function in (None, function) and (search_target is None or search_target in minions)
+        }
+
+    def minion_return(self, function, minionId):
+        if function == 'test.ping':
+            return True
+        if function == 'cmd.run':
+            return "x" * self.payload_size
+        if function and function.startswith('state.'):
+            return {
+                f"file_|-state{i}_|-/etc/state{i}_|-managed": {
+                    "__id__": f"state{i}", "name": f"/etc/state{i}", "result": True, "changes": {},
+                    "comment": "File /etc/state%d is in the correct state" % i, "duration": 1.25, "__run_num__": i,
+                } for i in range(max(1, self.payload_size // STATE_SIZE))
+            }
+        return {"pid": 4242, "retcode": 0, "stdout": "x" * self.payload_size, "stderr": ""}
+
+
+class FakeSaltApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, document):
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def authorized(self):
+        if self.headers.get('X-Auth-Token') in self.server.tokens:
+            return True
+        self.send_empty(401)
+        return False
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.read_body()
+
+        if self.server.count(path if path in ['/', '/login', '/minions', '/logout'] else 'other'):
+            self.send_empty(503)
+        elif path == '/login':
+            self.send_json(200, {"return": [self.server.login()]})
+        elif path == '/logout':
+            with self.server.lock:
+                self.server.tokens.discard(self.headers.get('X-Auth-Token'))
+            self.send_json(200, {"return": "Your token has been cleared"})
+        elif not self.authorized():
+            pass
+        elif path == '/minions':
+            self.send_json(202, {"return": [self.server.submit(body)]})
+        elif path == '/':
+            self.send_json(200, {"return": [self.lowstate(chunk) for chunk in body]})
+        else:
+            self.send_empty(404)
+
+    def lowstate(self, chunk):
+        if chunk.get('client') == 'runner' and chunk.get('fun') == 'jobs.lookup_jid':
+            return self.server.returns(chunk['jid'])
+        if chunk.get('client') == 'runner' and chunk.get('fun') == 'jobs.list_jobs':
+            return self.server.list_jobs(chunk.get('search_function'), chunk.get('search_target'))
+        if chunk.get('client') == 'local_async':
+            return self.server.submit(chunk)
+        return "Unsupported lowstate chunk: %s" % chunk
+
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        if url.path == '/stats':
+            self.send_json(200, self.server.stats(reset='reset' in parse_qs(url.query)))
+            return
+
+        resource = '/jobs' if url.path.startswith('/jobs/') else url.path
+        if self.server.count(resource if resource in ['/jobs', '/events'] else 'other'):
+            self.send_empty(503)
+        elif not self.authorized():
+            pass
+        elif resource == '/jobs':
+            jid = url.path[len('/jobs/'):]
+            returns = self.server.returns(jid)
+            self.send_json(200, {"info": [{"jid": jid, "Minions": sorted(returns), "Result": {}}], "return": [returns]})
+        elif resource == '/events':
+            self.stream_events()
+        else:
+            self.send_empty(404)
+
+    def stream_events(self):
+        """
+        Streams the return event of each minion as its job completes, until the client goes away.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        sent = set()
+        try:
+            self.write_chunk(b"retry: 400\n\n")
+            while True:
+                with self.server.lock:
+                    jobs = list(self.server.jobs.items())
+                for jid, (done, function, minions, arguments) in jobs:
+                    if jid in sent or done > time.monotonic():
+                        continue
+                    sent.add(jid)
+                    for minionId in minions:
+                        tag = f"salt/job/{jid}/ret/{minionId}"
+                        data = {"jid": jid, "id": minionId, "fun": function, "retcode": 0,
+                                "return": self.server.minion_return(function, minionId)}
+                        self.write_chunk(f"tag: {tag}\ndata: {json.dumps({'tag': tag, 'data': data})}\n\n".encode())
+                time.sleep(0.01)
+        except OSError:
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=0, help="port to listen on, any free port when 0")
+    parser.add_argument('--job-duration', type=float, default=0.0, help="seconds each job takes to return")
+    parser.add_argument('--payload-size', type=int, default=100, help="characters of output of each return")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument('--seed', type=int, help="seed of the errors")
+    args = parser.parse_args()
+
+    server = FakeSaltApi(('127.0.0.1', args.port), args.job_duration, args.payload_size, args.error_rate, args.seed)
+    print(server.endpoint, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,258 @@
-class returnHandlerRegistry:
-    def __init__(self, fully_qualified_function_name, return_handler):
-        """
-        Creates a backoff timer using the given delay_step and maximum_delay
+import fnmatch
+import logging
 
-        :param delay_step: A multiplier value (in ms) for the amount to sleep for.
-        :param maximum_delay: The maximum amount for the sleep value (in ms)
-        """
-        self.fully_qualified_function_name = fully_qualified_function_name
-        self.return_handler = return_handler
+# Distributions can add handlers by exposing their classes under this entry point group,
+# named after the function (or glob of functions) they handle.
+ENTRY_POINT_GROUP = 'rundeck_salt_step.return_handlers'
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_patterns = []
+_entry_points_loaded = False
+
+
+def register(*function_names):
+    """
+    Class decorator registering a return handler for the given functions.
+
+    :param function_names: Fully qualified function names (e.g. cmd.run), or globs of them (e.g. state.*).
+                           The most recently registered handler of a name or glob wins.
+    """
+    def decorator(handler_class):
+        for function_name in function_names:
+            register_handler(function_name, handler_class)
+        return handler_class
+    return decorator
+
+
+def register_handler(function_name, handler_class):
+    """
+    Registers handler_class for the fully qualified function name or glob of function names.
+    """
+    if any(c in function_name for c in '*?['):
+        _patterns[:] = [(pattern, registered) for pattern, registered in _patterns if pattern != function_name]
+        _patterns.insert(0, (function_name, handler_class))
+    else:
+        _handlers[function_name] = handler_class
+
+
+def load_entry_points():
+    """
+    Registers the handlers exposed under ENTRY_POINT_GROUP by the installed distributions, once.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    # Only needed when a function has no built-in handler, importing it takes a while
+    from importlib.metadata import entry_points
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            register_handler(entry_point.name, entry_point.load())
+        except Exception as e:
+            logger.warning("Could not load the return handler [%s]: %s", entry_point.value, e)
+
+
+def handler_class_for(fully_qualified_function_name, default=None):
+    """
+    Finds the handler class of the function: its own handler, then one of the entry points, then the first matching glob.
+    :return the handler class, or default (ReturnHandler when None) if no handler matches.
+    """
+    handler_class = _handlers.get(fully_qualified_function_name)
+    if handler_class is not None:
+        return handler_class
+
+    load_entry_points()
+    handler_class = _handlers.get(fully_qualified_function_name)
+    if handler_class is not None:
+        return handler_class
+
+    for pattern, handler_class in _patterns:
+        if fnmatch.fnmatchcase(fully_qualified_function_name, pattern):
+            return handler_class
+
+    return default or ReturnHandler
+
+
+class ReturnHandler:
+    """
+    Turns the return of a salt function into output, error and exit code.
+
+    The default handler, used for the functions without one, reports no output and exit code 0.
+    """
+
+    __slots__ = ('output', 'error', 'exit_code')
+
+    def __init__(self):
         self.output = None
         self.error = None
         self.exit_code = 0
 
     def extract_response(self, raw_response):
+        pass
+
+    def get_standard_output(self):
+        return self.output
+
+    def get_standard_error(self):
+        return self.error
+
+    def get_exit_code(self):
+        return self.exit_code
+
+
+@register('cmd.run_all')
+class CmdRunAllReturnHandler(ReturnHandler):
+
+    __slots__ = ()
+
+    def extract_response(self, raw_response):
+        self.output = raw_response['stdout']
+        self.error = raw_response['stderr']
+        self.exit_code = raw_response['retcode']
+
+
+@register('cmd.run')
+class CmdRunReturnHandler(ReturnHandler):
+
+    __slots__ = ()
+
+    def extract_response(self, raw_response):
+        self.output = raw_response
+
+
+@register('test.ping')
+class TestPingReturnHandler(ReturnHandler):
+
+    __slots__ = ()
+
+
+@register('pkg.install', 'pkg.remove', 'pkg.purge', 'pkg.upgrade')
+class PkgReturnHandler(ReturnHandler):
+    """
+    Reports the packages changed, salt returns a dict of package name to its old and new versions.
+    A string return is the error the function failed with.
+    """
+
+    __slots__ = ()
+
+    def extract_response(self, raw_response):
+        if not isinstance(raw_response, dict):
+            self.error = str(raw_response)
+            self.exit_code = 1
+            return
+
+        self.output = "\n".join("%s: %s -> %s" % (name, change.get('old') or '-', change.get('new') or '-')
+                                for name, change in raw_response.items() if isinstance(change, dict))
+
+
+# The functions returning the results of a state run keyed by state. The other state functions (state.show_*,
+# state.running, state.sls_exists...) return listings or flags and keep the default handler.
+STATE_RUN_FUNCTIONS = ['state.apply', 'state.highstate', 'state.sls', 'state.sls_id', 'state.single', 'state.top',
+                       'state.template', 'state.template_str', 'state.high', 'state.pkg', 'state.test',
+                       'state.run_request', 'state.orchestrate', 'state.orch']
+
+
+@register(*STATE_RUN_FUNCTIONS)
+class StateReturnHandler(ReturnHandler):
+    """
+    Summarises the return of state.apply, state.highstate, state.sls and the like in a single pass over the states.
+
+    The output is the summary of the run and the error lists the failed states only. A list return holds the
+    errors that kept the states from running, e.g. rendering errors. The exit codes are salt's: 2 if a state
+    failed, 1 if the states could not run.
+    """
+
+    __slots__ = ('succeeded', 'changed', 'failed', 'duration', 'failures')
+
+    def __init__(self):
+        super().__init__()
+        self.succeeded = 0
+        self.changed = 0
+        self.failed = 0
+        self.duration = 0.0
+        self.failures = []
+
+    def extract_response(self, raw_response):
+        if not isinstance(raw_response, dict):
+            self.error = "\n".join(str(error) for error in raw_response) if isinstance(raw_response, list) else str(raw_response)
+            self.exit_code = 1
+            return
+
+        succeeded = changed = 0
+        duration = 0.0
+        failures = self.failures
+
+        for key, state in raw_response.items():
+            if not isinstance(state, dict):
+                failures.append("%s: %s" % (key, state))
+                continue
+
+            if state.get('result') is False:
+                failures.append(self.describe_failure(key, state))
+            else:
+                succeeded += 1
+
+            if state.get('changes'):
+                changed += 1
+
+            stateDuration = state.get('duration')
+            if isinstance(stateDuration, (int, float)):
+                duration += stateDuration
 
-        if self.fully_qualified_function_name == 'cmd.run_all':
+        self.succeeded = succeeded
+        self.changed = changed
+        self.failed = len(failures)
+        self.duration = duration
 
-            self.output = raw_response['stdout']
-            self.error = raw_response['stderr']
-            self.exit_code = raw_response['retcode']
+        self.output = "Succeeded: %d (changed=%d), Failed: %d, Total states run: %d, Total run time: %.3f s" % (
+            succeeded, changed, self.failed, succeeded + self.failed, duration / 1000)
 
-        elif self.fully_qualified_function_name == 'cmd.run':
+        if failures:
+            self.error = "\n".join(failures)
+            self.exit_code = 2
 
-            self.output = raw_response
-            self.error = None
-            self.exit_code = 0
+    @staticmethod
+    def describe_failure(key, state):
+        # The state keys are module_|-id_|-name_|-function
+        parts = key.split('_|-')
+        stateId = state.get('__id__') or (parts[1] if len(parts) == 4 else key)
+        function = "%s.%s" % (parts[0], parts[3]) if len(parts) == 4 else '?'
+        return "Failed: %s (%s): %s" % (stateId, function, state.get('comment', ''))
 
-        elif self.fully_qualified_function_name == 'test.ping':
 
-            self.output = None
-            self.error = None
-            self.exit_code = 0
+class returnHandlerRegistry:
+    """
+    Handles the return of a salt function with the handler registered for it.
+    """
+
+    __slots__ = ('fully_qualified_function_name', 'return_handler', 'handler')
+
+    def __init__(self, fully_qualified_function_name, return_handler):
+        """
+        Creates the handler of the function
+
+        :param fully_qualified_function_name: The salt function, e.g. cmd.run_all
+        :param return_handler: The handler class to use if none is registered for the function, ReturnHandler when None.
+        """
+        self.fully_qualified_function_name = fully_qualified_function_name
+        self.return_handler = return_handler
+        self.handler = handler_class_for(fully_qualified_function_name, return_handler)()
+
+    def __str__(self):
+        return "%s for %s" % (type(self.handler).__name__, self.fully_qualified_function_name)
+
+    def extract_response(self, raw_response):
+        self.handler.extract_response(raw_response)
 
     def get_standard_output(self):
-        return self.output
+        return self.handler.get_standard_output()
 
     def get_standard_error(self):
-        return self.error
+        return self.handler.get_standard_error()
 
     def get_exit_code(self):
-        return self.exit_code
+        return self.handler.get_exit_code()
@@ -1,18 +1,36 @@
 #!/usr/bin/python3
 
 import sys, os
-import requests
 import json
 import shlex
 import logging
+import time
 from urllib.parse import urlparse
 
+# The script runs in a fresh interpreter for every node. requests and the modules of
+# optional features are imported where they are first used, so they are only loaded
+# when the step actually needs them. tests/test_import_time.py keeps it that way.
 sys.path.append(os.getcwd())
-from util.exponential_backoff_timer import ExponentialBackoffTimer
+from util.exponential_backoff_timer import ExponentialBackoffTimer, DeadlineExceeded, JITTER_MODES
+from util.salt_api_response import SaltApiResponse
+from util.step_metrics import StepMetrics
+from util.step_context import StepContext
+from util.redaction import RedactingFilter, RedactingWriter, redactor_for
 from output.salt_return_handler_registry import returnHandlerRegistry
 
+DEFAULT_EVENT_TIMEOUT = 300
+# Seconds between the notices that a job is still running while waiting on the event stream
+PROGRESS_INTERVAL = 60
+STREAM_CHUNK_SIZE = 65536
+# Functions whose stdout/stderr are logged as they are decoded when streaming job returns
+STREAMED_OUTPUT_FUNCTIONS = ['cmd.run', 'cmd.run_all']
+# Most recent matching jobs of the job cache whose returns are looked up when reusing jobs
+REUSE_CANDIDATES = 3
+
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+# Masks the secure options of the step in everything it logs, arguments and minion output included
+redaction = RedactingFilter()
+logger.addFilter(redaction)
 
 
 # define Python user-defined exceptions
@@ -49,6 +67,12 @@ class SaltApiException(Exception):
         super().__init__(self.message)
 
 
+class SaltApiAuthenticationException(SaltApiException):
+    """
+    Represents salt-api rejecting the authentication token of a request.
+    """
+
+
 class SaltApiNodeStepFailureReason(Exception):
 
     def __init__(self, error_type, message):
@@ -61,7 +85,8 @@ class SaltApiNodeStepFailureReason(Exception):
             'COMMUNICATION_FAILURE',
             'SALT_API_FAILURE',
             'SALT_TARGET_MISMATCH',
-            'INTERRUPTED'
+            'INTERRUPTED',
+            'JOB_TIMEOUT'
         ]:
             raise ValueError('FailureReason %s now known' % error_type)
 
@@ -97,6 +122,55 @@ class SaltReturnResponseParseException(RuntimeError):
         super().__init__(self.message)
 
 
+# Exceptions raised while running the step and their failure reason, the first matching type applies
+FAILURE_REASONS = [
+    (SaltReturnResponseParseException, 'SALT_API_FAILURE'),
+    (InterruptedError, 'INTERRUPTED'),
+    (DeadlineExceeded, 'JOB_TIMEOUT'),
+    (SaltTargettingMismatchException, 'SALT_TARGET_MISMATCH'),
+    (SaltApiAuthenticationException, 'AUTHENTICATION_FAILURE'),
+    (SaltApiException, 'SALT_API_FAILURE'),
+    (IOError, 'COMMUNICATION_FAILURE'),
+]
+
+
+def number_config(config, name, default, cast=int):
+    """
+    Reads a numeric plugin configuration value.
+
+    :param config: The RD_CONFIG_ values of the step.
+    :param name: The configuration name, without the RD_CONFIG_ prefix.
+    :param default: The value to use when the configuration is not set.
+    :param cast: The numeric type to convert the value to.
+    :raises SaltStepValidationException: if the value is not a valid number.
+    """
+    value = config.get(name)
+    if value is None or value == '':
+        return default
+
+    try:
+        return cast(value)
+    except ValueError:
+        raise SaltStepValidationException(name, f"{value} is not a valid number", 'ARGUMENTS_INVALID', '')
+
+
+def bool_config(config, name):
+    """
+    Reads a boolean plugin configuration value, Rundeck passes these as 'true' or 'false'.
+    """
+    return (config.get(name) or '').lower() == 'true'
+
+
+def failure_reason(exception):
+    """
+    Returns the SaltApiNodeStepFailureReason of an exception raised while running the step, None if it is unexpected.
+    """
+    for exception_type, reason in FAILURE_REASONS:
+        if isinstance(exception, exception_type):
+            return reason
+    return None
+
+
 class SaltApiNodeStepPlugin(object):
 
     def __init__(self, endpoint=None, username=None, password=None, eauth='auto'):
@@ -104,116 +178,589 @@ class SaltApiNodeStepPlugin(object):
         self.username = username
         self.password = password
         self.eauth = eauth
+        self.function = None
         self.timer = ExponentialBackoffTimer(500, 15000)
+        self._session = None
+        self.token_cache = None
+        self.token_expire = None
+        self.auth_token = None
+        self.result_cache = None
+        self.reuse_jobs = None
+        self.batch = None
+        self.batch_minions = []
+        self.use_events = False
+        self.event_timeout = DEFAULT_EVENT_TIMEOUT
+        self.progress_events = False
+        self.runtime_history = None
+        self.job_lookup = 'jobs'
+        self.streaming_decode = False
+        # Whether the output of the return was logged while decoded, and stripped from it
+        self.output_streamed = False
+        self.max_return_size = None
+        self.output_spool_size = None
+        self.output_chunk_size = None
+        self.output_truncation = 'none'
+        self.output_limit = None
+        self.metrics = StepMetrics()
+        self.log_metrics = False
+        self.metrics_file = None
+        self.tracer = None
+
+    @property
+    def session(self):
+        """
+        The pooled requests session to salt-api, created on first use.
+        """
+        if self._session is None:
+            from util.http_session import PooledSession
+            self._session = PooledSession()
+        return self._session
 
-    def execute_node_step(self):
-
-        # Parse environment variable to variables
-        optionData = {}
-        secureOptions = {}
-        config = {}
-        node = {}
-        for envVariable in os.environ:
-            if envVariable[0:10] == 'RD_OPTION_':
-                optionData[envVariable[10:]] = os.environ.get(envVariable)
-            elif envVariable[0:16] == 'RD_SECUREOPTION_':
-                secureOptions[envVariable[16:]] = os.environ.get(envVariable)
-            elif envVariable[0:10] == 'RD_CONFIG_':
-                config[envVariable[10:]] = os.environ.get(envVariable)
-            elif envVariable[0:8] == 'RD_NODE_':
-                node[envVariable[8:]] = os.environ.get(envVariable)
+    def execute_node_step(self, context=None):
+        """
+        Runs the step with the given StepContext, read from the environment when None.
+        """
+        self.run_step(context or StepContext.from_environ())
+
+    def execute_dispatched_node_step(self, socket_path, context=None):
+        """
+        Hands the step over to the dispatcher listening on socket_path (see salt_dispatcher.py), logging its output.
+        :param context: The StepContext of the step, read from the environment when None.
+        :return False if no dispatcher is running, the step then still has to be executed.
+        :raises NodeStepException: if the step failed.
+        """
+        from util.dispatcher_client import dispatch, DispatcherUnavailable
+
+        context = context or StepContext.from_environ()
+        node = context.node
+
+        try:
+            result = dispatch(socket_path, {"context": context.to_dict()}, logger.log)
+        except DispatcherUnavailable as e:
+            logger.debug("No dispatcher available (%s), executing the step in process", e)
+            return False
+        except IOError as e:
+            raise NodeStepException(e, 'COMMUNICATION_FAILURE', node)
+
+        if result.get('failure_reason'):
+            raise NodeStepException(result['message'], result['failure_reason'], node)
+
+        return True
+
+    def run_step(self, context):
+        """
+        Runs the step with the given Rundeck context, masking its secure options in its logs.
+        :param context: The StepContext of the step.
+        :raises NodeStepException: if the step failed.
+        """
+
+        with redaction.redacting(redactor_for(context.secure_options.values())):
+            self.run_redacted_step(context)
+
+    def run_redacted_step(self, context):
+        """
+        Runs the step, see run_step.
+        """
+
+        config = context.config
+        node = context.node
 
         # Extract options from context.
-        if optionData == {}:
+        if not context.options:
             raise NodeStepException("Missing data context.", 'ARGUMENTS_MISSING', node)
 
-        self.endpoint = optionData['SALT_API_END_POINT']
-        self.function = config['FUNCTION']
-        self.eauth = optionData['SALT_API_EAUTH']
-        self.username = optionData['SALT_USER']
-        self.password = optionData['SALT_PASSWORD']
+        self.metrics = StepMetrics()
+        self.configure(context.options, config)
 
-        self.validate()
+        if config.get('BATCHNODES'):
+            self.configure_batch(config, context.job, node)
+
+        if config.get('RUNTIMEHISTORY'):
+            self.configure_runtime_history(config['RUNTIMEHISTORY'])
+
+        dispatchedJid = None
+        result = 'success'
+        self.session.hooks['response'].append(self.metrics.count_response)
+
+        rootSpan = None
+        if self.tracer is not None:
+            from util.tracing import inject_trace_context
+
+            self.metrics.tracer = self.tracer
+            self.session.auth = inject_trace_context
+            rootSpan = self.tracer.start_span('node_step', {'rundeck.node': node.get('NAME'),
+                                                            'salt.function': shlex.split(self.function)[0],
+                                                            'salt.endpoint': self.endpoint})
+            logger.debug("Tracing the step in trace [%s]", rootSpan.trace_id)
 
         try:
             # capability = getSaltApiCapability();
             capability = "2019.2.0"
             logger.debug("Using salt-api version: [%s]", capability)
 
-            authToken = self.authenticate()
-
-            if authToken is None:
-                raise NodeStepException("Authentication failure", 'AUTHENTICATION_FAILURE', node)
-
-            secureData = self.extract_secure_data()
-            dispatchedJid = self.submit_job(authToken, node['NAME'], self.function, secureData)
-            logger.info("Received jid [%s] for submitted job", dispatchedJid)
-            jobOutput = self.wait_for_jid_response(authToken, dispatchedJid, node['NAME'])
-            handler = returnHandlerRegistry(shlex.split(self.function)[0], None)
-            logger.debug("Using [%s] as salt's response handler", handler)
-            handler.extract_response(jobOutput)
-
-            self.logoutQuietly(authToken)
+            cacheKey = self.result_cache_key(node)
+            jobOutput = self.cached_return(cacheKey)
+
+            if jobOutput is not None:
+                logger.info("Using the cached return of [%s] on [%s]", self.function, node['NAME'])
+                handler = self.handle_return(jobOutput)
+            else:
+                authToken = self.auth_token = self.acquire_token()
+
+                if authToken is None:
+                    raise NodeStepException("Authentication failure", 'AUTHENTICATION_FAILURE', node)
+
+                try:
+                    reused = None
+                    if self.reuse_jobs and self.batch is None:
+                        with self.metrics.time('reuse_lookup', {'salt.minion': node['NAME'], 'salt.function': shlex.split(self.function)[0]}):
+                            authToken, reused = self.call_with_token(authToken, self.find_recent_job, node['NAME'], self.function)
+
+                    if reused is not None:
+                        dispatchedJid, jobOutput = reused
+                        logger.info("Reusing the return of job [%s] completed less than %d s ago", dispatchedJid, self.reuse_jobs)
+                    else:
+                        secureData = context.secure_options
+                        dispatchedAt = time.monotonic()
+                        with self.metrics.time('dispatch', {'salt.minion': node['NAME'], 'salt.function': shlex.split(self.function)[0]}):
+                            if self.batch is not None:
+                                authToken, dispatchedJid = self.call_with_token(authToken, self.claim_batch_job, node['NAME'], self.function, secureData)
+                            else:
+                                authToken, dispatchedJid = self.call_with_token(authToken, self.submit_job, node['NAME'], self.function, secureData)
+                        logger.info("Received jid [%s] for submitted job", dispatchedJid)
+                        wait = self.wait_for_jid_event if self.use_events else self.wait_for_jid_response
+                        authToken, jobOutput = self.call_with_token(authToken, wait, dispatchedJid, node['NAME'])
+                        if self.runtime_history is not None and self.batch is None:
+                            self.record_runtime((time.monotonic() - dispatchedAt) * 1000)
+                    handler = self.handle_return(jobOutput)
+                finally:
+                    # The token refreshed by call_with_token, even if the call it retried failed
+                    self.release_token(self.auth_token)
+
+                # Only successful returns are reused, a failure may be transient. The output of a streamed
+                # return was logged already and is missing from it, a cache hit would print none.
+                if cacheKey is not None and not handler.get_exit_code() and not self.output_streamed:
+                    self.cache_return(cacheKey, jobOutput)
 
             if handler.get_standard_output():
-                logger.info(handler.get_standard_output())
+                self.emit_output(handler.get_standard_output())
 
             if handler.get_standard_error():
-                logger.info(handler.get_standard_error())
+                self.emit_output(handler.get_standard_error())
 
             if handler.get_exit_code():
                 raise NodeStepException("Execution failed on minion with exit code %d" % handler.get_exit_code(), 'EXIT_CODE', node)
 
-        except SaltReturnResponseParseException as e:
-            raise NodeStepException(e, 'SALT_API_FAILURE', node)
+        except NodeStepException as e:
+            result = e.failure_reason
+            raise
+
+        except Exception as e:
+            reason = failure_reason(e)
+            result = reason or 'ERROR'
+            if reason is None:
+                raise
+            raise NodeStepException(e, reason, node)
+
+        finally:
+            self.session.hooks['response'].remove(self.metrics.count_response)
+            new, reused = self.session.connection_stats()
+            logger.debug("salt-api connections: %d new, %d reused", new, reused)
+            self.report_metrics(node, dispatchedJid, result)
+
+            if rootSpan is not None:
+                rootSpan.set_attribute('salt.jid', dispatchedJid)
+                rootSpan.set_attribute('rundeck.result', result)
+                self.tracer.end_span(rootSpan, None if result == 'success' else result)
+
+    def emit_output(self, output):
+        """
+        Logs output of the minion. Output larger than a chunk is spooled (to a temporary file beyond OUTPUTSPOOLSIZE)
+        and logged chunk by chunk, truncated as configured, so it is never copied whole by the logging.
+        """
 
-        except InterruptedError as e:
-            raise NodeStepException(e, 'INTERRUPTED', node)
+        from util.output_spool import DEFAULT_CHUNK_SIZE, DEFAULT_OUTPUT_LIMIT
 
-        except SaltTargettingMismatchException as e:
-            raise NodeStepException(e, 'SALT_TARGET_MISMATCH', node)
+        output = output if isinstance(output, str) else str(output)
+        chunkSize = self.output_chunk_size or DEFAULT_CHUNK_SIZE
 
-        except SaltApiException as e:
-            raise NodeStepException(e, 'SALT_API_FAILURE', node)
+        # Most outputs fit in a chunk, which is checked without encoding the large ones
+        if len(output) <= chunkSize and len(output.encode('utf-8', 'surrogateescape')) <= min(chunkSize, self.output_limit or DEFAULT_OUTPUT_LIMIT):
+            logger.info(output)
+            return
 
-        except requests.exceptions.HTTPError as e:
-            raise NodeStepException(e, 'COMMUNICATION_FAILURE', node)
+        emitter = self.output_emitter()
+        emitter.write(output)
+        del output
+        emitter.flush()
 
-        except IOError as e:
-            raise NodeStepException(e, 'COMMUNICATION_FAILURE', node)
+    def output_emitter(self):
+        """
+        Returns a SpooledEmitter logging the output written to it as configured, once flushed, masking the secure options.
+        """
+
+        from util.output_spool import SpooledEmitter, DEFAULT_SPOOL_THRESHOLD, DEFAULT_CHUNK_SIZE, DEFAULT_OUTPUT_LIMIT
+
+        return self.redacting_writer(SpooledEmitter(logger.info,
+                                                    threshold=self.output_spool_size or DEFAULT_SPOOL_THRESHOLD,
+                                                    chunk_size=self.output_chunk_size or DEFAULT_CHUNK_SIZE,
+                                                    truncation=self.output_truncation,
+                                                    limit=self.output_limit or DEFAULT_OUTPUT_LIMIT))
+
+    @staticmethod
+    def redacting_writer(emitter):
+        """
+        Masks the secure options of the step in the text written to the emitter before it cuts the text into log
+        records, as a secret cut in two would not be masked in the records.
+        """
+
+        redactor = redaction.current()
+        return RedactingWriter(redactor, emitter) if redactor else emitter
+
+    def handle_return(self, jobOutput):
+        """
+        Extracts the output, error and exit code of the job return with the handler of the function.
+        :return the handler.
+        """
+
+        handler = returnHandlerRegistry(shlex.split(self.function)[0], None)
+        logger.debug("Using [%s] as salt's response handler", handler)
+        with self.metrics.time('output', {'salt.function': shlex.split(self.function)[0]}):
+            handler.extract_response(jobOutput)
+        return handler
+
+    def result_cache_key(self, node):
+        """
+        Returns the result cache key of the step, or None if its return is not cached.
+        Batch steps are not cached, the other nodes of the batch wait for the job of the first one.
+        """
+
+        if self.result_cache is None or self.batch is not None:
+            return None
+        if self.result_cache.ttl(shlex.split(self.function)[0]) is None:
+            return None
+        return self.result_cache.key(self.endpoint, self.username, self.password, self.eauth, node['NAME'], self.function)
+
+    def cached_return(self, cacheKey):
+        """
+        Returns the cached return of the step, or None if there is none.
+        """
+
+        if cacheKey is None:
+            return None
+
+        try:
+            with self.metrics.time('cache_lookup'):
+                return self.result_cache.get(cacheKey)
+        except OSError as e:
+            logger.warning("Could not read the result cache in %s: %s", self.result_cache.directory, e)
+            return None
+
+    def cache_return(self, cacheKey, jobOutput):
+        """
+        Keeps the return of the step in the result cache for the TTL of its function.
+        """
+
+        try:
+            self.result_cache.put(cacheKey, shlex.split(self.function)[0], jobOutput)
+        except OSError as e:
+            logger.warning("Could not write the result cache in %s: %s", self.result_cache.directory, e)
+
+    def report_metrics(self, node, jid, result):
+        """
+        Logs the timings of the step as one json line and adds them to the metrics file, as configured.
+        :param result: success, or the failure reason of the step.
+        """
+
+        if not self.log_metrics and not self.metrics_file:
+            return
+
+        report = self.metrics.report(node=node.get('NAME'), function=shlex.split(self.function)[0], jid=jid, result=result)
+
+        if self.log_metrics:
+            logger.info(json.dumps(report))
+
+        if self.metrics_file:
+            from util.step_metrics import record_textfile
+
+            try:
+                record_textfile(self.metrics_file, report)
+            except OSError as e:
+                logger.warning("Could not record the step metrics in %s: %s", self.metrics_file, e)
+
+    def configure(self, optionData, config):
+        """
+        Configures the plugin from the RD_OPTION_ and RD_CONFIG_ values of the step.
+        :raises SaltStepValidationException: if a value is invalid.
+        """
+
+        # Missing values are reported by validate
+        self.endpoint = optionData.get('SALT_API_END_POINT')
+        self.function = config.get('FUNCTION')
+        self.eauth = optionData.get('SALT_API_EAUTH')
+        self.username = optionData.get('SALT_USER')
+        self.password = optionData.get('SALT_PASSWORD')
+
+        self.validate()
+
+        self.configure_session(config)
+
+        if config.get('TOKENCACHEDIR'):
+            from util.token_cache import TokenCache
+            self.token_cache = TokenCache(config['TOKENCACHEDIR'])
+
+        if config.get('RESULTCACHEDIR'):
+            self.configure_result_cache(config)
+
+        self.use_events = bool_config(config, 'EVENTSTREAM')
+        self.event_timeout = number_config(config, 'EVENTTIMEOUT', DEFAULT_EVENT_TIMEOUT, float)
+        self.progress_events = bool_config(config, 'PROGRESSEVENTS')
+        self.log_metrics = bool_config(config, 'STEPMETRICS')
+        self.metrics_file = config.get('METRICSFILE') or None
+
+        traceExporter = config.get('TRACEEXPORTER') or 'none'
+        if traceExporter != 'none':
+            from util.tracing import Tracer, EXPORTERS
+
+            if traceExporter not in EXPORTERS:
+                raise SaltStepValidationException('TRACEEXPORTER', f"{traceExporter} is not a valid trace exporter", 'ARGUMENTS_INVALID', '')
+            if traceExporter == 'file' and not config.get('TRACEFILE'):
+                raise SaltStepValidationException('TRACEFILE', "TRACEFILE is required to export traces to a file", 'ARGUMENTS_MISSING', '')
+
+            # Continues the trace of the caller when it passes one, as the OpenTelemetry tools do
+            self.tracer = Tracer(EXPORTERS[traceExporter](config.get('TRACEFILE')), os.environ.get('TRACEPARENT'))
+
+        self.job_lookup = config.get('JOBLOOKUP') or 'jobs'
+        if self.job_lookup not in ['jobs', 'runner']:
+            raise SaltStepValidationException('JOBLOOKUP', f"{self.job_lookup} is not a valid job lookup", 'ARGUMENTS_INVALID', '')
+
+        self.reuse_jobs = number_config(config, 'REUSEJOBS', None, float) or None
+
+        jitterMode = config.get('POLLJITTER') or 'none'
+        if jitterMode not in JITTER_MODES + ['none']:
+            raise SaltStepValidationException('POLLJITTER', f"{jitterMode} is not a valid jitter mode", 'ARGUMENTS_INVALID', '')
+        self.timer.jitter_mode = None if jitterMode == 'none' else jitterMode
+
+        jobTimeout = number_config(config, 'JOBTIMEOUT', None, float)
+        self.timer.deadline = jobTimeout * 1000 if jobTimeout else None
+
+        self.streaming_decode = bool_config(config, 'STREAMINGDECODE')
+        self.max_return_size = number_config(config, 'MAXRETURNSIZE', None)
+
+        self.configure_output(config)
+
+    def configure_output(self, config):
+        """
+        Configures how the output of the minion is spooled, chunked and truncated when it is logged.
+        """
+
+        self.output_truncation = config.get('OUTPUTTRUNCATION') or 'none'
+        if self.output_truncation not in ['none', 'head', 'tail', 'head_tail']:
+            raise SaltStepValidationException('OUTPUTTRUNCATION', f"{self.output_truncation} is not a valid output truncation", 'ARGUMENTS_INVALID', '')
+
+        self.output_spool_size = number_config(config, 'OUTPUTSPOOLSIZE', None)
+        self.output_chunk_size = number_config(config, 'OUTPUTCHUNKSIZE', None)
+        self.output_limit = number_config(config, 'OUTPUTLIMIT', None)
+        if self.output_chunk_size is not None and self.output_chunk_size <= 0:
+            raise SaltStepValidationException('OUTPUTCHUNKSIZE', f"{self.output_chunk_size} is not a valid chunk size", 'ARGUMENTS_INVALID', '')
+
+    def configure_session(self, config):
+        """
+        Configures the pool, retries and timeouts of the session from the HTTP* configuration.
+        """
+
+        from util.http_session import DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+        self.session.configure(
+            pool_size=number_config(config, 'HTTPPOOLSIZE', DEFAULT_POOL_SIZE),
+            retries=number_config(config, 'HTTPRETRIES', DEFAULT_RETRIES),
+            connect_timeout=number_config(config, 'HTTPCONNECTTIMEOUT', DEFAULT_CONNECT_TIMEOUT, float),
+            read_timeout=number_config(config, 'HTTPREADTIMEOUT', DEFAULT_READ_TIMEOUT, float),
+        )
+
+    def configure_result_cache(self, config):
+        """
+        Reuses the returns of the functions of the RESULTCACHETTLS allow-list for their TTL.
+        """
+
+        from util.result_cache import ResultCache, parse_ttls, MAXIMUM_BYTES
+
+        try:
+            ttls = parse_ttls(config.get('RESULTCACHETTLS') or '')
+        except ValueError as e:
+            raise SaltStepValidationException('RESULTCACHETTLS', str(e), 'ARGUMENTS_INVALID', '')
+
+        maximumSize = number_config(config, 'RESULTCACHESIZE', MAXIMUM_BYTES / 1024 / 1024, float)
+        self.result_cache = ResultCache(config['RESULTCACHEDIR'], ttls, maximum_bytes=maximumSize * 1024 * 1024)
 
-    def extract_secure_data(self):
+    def configure_batch(self, config, job, node):
         """
-        Return collection of secure data values from data context.
+        Enables batch dispatch for the node set in the BATCHNODES configuration.
         """
 
-        secureOptions = {}
-        for envVariable in os.environ:
-            if envVariable[0:16] == 'RD_SECUREOPTION_':
-                secureOptions[envVariable[16:]] = os.environ.get(envVariable)
+        minions = config['BATCHNODES'].replace(',', ' ').split()
 
-        return secureOptions
+        if not job.get('EXECID'):
+            logger.warning("No Rundeck execution id available, submitting a job per node")
+            return
+
+        if node.get('NAME') not in minions:
+            logger.warning("Node [%s] is not part of the batch, submitting a job for it alone", node.get('NAME'))
+            return
+
+        import tempfile
+        from util.batch_coordinator import BatchCoordinator
+
+        directory = config.get('BATCHDIR') or os.path.join(tempfile.gettempdir(), 'salt-step')
+        self.batch_minions = minions
+        self.batch = BatchCoordinator(directory, BatchCoordinator.key(job['EXECID'], self.endpoint, self.function, minions))
+
+    def configure_runtime_history(self, path):
+        """
+        Times the first poll after the completion times previously observed for the function.
+        """
+
+        from util.adaptive_backoff_timer import AdaptiveBackoffTimer
+        from util.runtime_history import RuntimeHistory
+
+        self.runtime_history = RuntimeHistory(path)
+        try:
+            expected = self.runtime_history.expected(shlex.split(self.function)[0])
+        except OSError as e:
+            logger.warning("Could not read the runtime history in %s: %s", path, e)
+            return
+
+        if expected is not None:
+            logger.debug("Expecting job to complete in %d ms", expected)
+            self.timer = AdaptiveBackoffTimer(self.timer.delay_step, self.timer.maximum_delay, expected,
+                                              jitter_mode=self.timer.jitter_mode, deadline=self.timer.deadline)
+
+    def record_runtime(self, duration):
+        """
+        Adds the completion time (in ms) of the job to the runtime history of the function.
+        """
+
+        try:
+            self.runtime_history.record(shlex.split(self.function)[0], duration)
+        except OSError as e:
+            logger.warning("Could not record the runtime history in %s: %s", self.runtime_history.path, e)
+
+    def claim_batch_job(self, authToken, minionId, function, secure_options={}):
+        """
+        Returns the jid of the batch job shared by the node set, submitting it if this is the first node.
+        """
+
+        def submit():
+            jid, minions = self.submit_batch_job(authToken, self.batch_minions, function, secure_options)
+            logger.info("Submitted batch job [%s] for %d minions", jid, len(minions))
+            return jid, minions
+
+        def submit_alone():
+            logger.info("Node [%s] already claimed the batch job, submitting a job for it alone", minionId)
+            return self.submit_job(authToken, minionId, function, secure_options), [minionId]
+
+        jid, minions = self.batch.claim(minionId, self.batch_minions, submit, submit_alone)
+
+        if minionId not in minions:
+            raise(SaltTargettingMismatchException("Minion dispatch mis-match. Expected:%s,  was:%s" % (minionId, minions)))
+
+        return jid
 
     def submit_job(self, authToken, minionId, function, secure_options={}):
         """
         Submits the job to salt-api using the class function and args
         """
 
+        dispatched = self.dispatch_job(authToken, self.build_lowstate(minionId, function, secure_options))
+
+        return self.dispatched_jid(minionId, dispatched)
+
+    def submit_jobs(self, authToken, jobs, secure_options={}):
+        """
+        Submits several jobs with a single request, one local_async lowstate chunk per job
+        :param jobs: A list of (minion id, function) tuples
+        :return a list with, for each job in order, either its jid or the SaltTargettingMismatchException its dispatch failed with.
+        """
+
+        lowstates = [self.build_lowstate(minionId, function, secure_options) for minionId, function in jobs]
+        dispatches = self.dispatch_jobs(authToken, lowstates)
+
+        jids = []
+        for (minionId, function), dispatched in zip(jobs, dispatches):
+            try:
+                jids.append(self.dispatched_jid(minionId, dispatched if isinstance(dispatched, dict) else {}))
+            except SaltTargettingMismatchException as e:
+                jids.append(e)
+
+        return jids
+
+    def dispatched_jid(self, minionId, dispatched):
+        """
+        Checks salt dispatched the job to the minion only
+        :param dispatched: The dispatch information (jid and minions) returned by salt-api
+        :return the jid of the job.
+        """
+
+        try:
+            minions_size = len(dispatched['minions'])
+            minions_output = dispatched['minions']
+        except KeyError:
+            minions_size = 0
+            minions_output = None
+
+        if minions_size != 1:
+            raise(SaltTargettingMismatchException("Expected minion delegation count of 1, was %d. Full minion string: (%s)" % (minions_size, minions_output)))
+
+        if minionId not in dispatched['minions']:
+            raise(SaltTargettingMismatchException("Minion dispatch mis-match. Expected:%s,  was:%s" % (minionId, minions_output)))
+
+        return dispatched["jid"]
+
+    def submit_batch_job(self, authToken, minionIds, function, secure_options={}):
+        """
+        Submits one job targeting all the given minions as a list
+        :return a tuple of the jid and the minions salt dispatched the job to.
+        """
+
+        dispatched = self.dispatch_job(authToken, self.build_lowstate(minionIds, function, secure_options, tgt_type='list'))
+
+        minions = dispatched.get('minions') or []
+        if not minions:
+            raise(SaltTargettingMismatchException("Expected minion delegation count of %d, was 0. Targets: (%s)" % (len(minionIds), minionIds)))
+
+        return dispatched["jid"], minions
+
+    def build_lowstate(self, target, function, secure_options={}, tgt_type=None):
+        """
+        Builds the lowstate chunk for the function and its args
+        :return a tuple of the lowstate and a copy with the secure options masked for logging.
+        """
+
         # Parse the function into its arguments
         args = shlex.split(function)
         params = {
             'fun': args[0],
-            'tgt': minionId
+            'tgt': target
         }
+        if tgt_type is not None:
+            params['tgt_type'] = tgt_type
         printable_params = params.copy()
+        redactor = redactor_for(secure_options.values())
 
         # Add the arguments to the params
         for i in range(1, len(args)):
             value = args[i]
             params.setdefault('arg', []).append(value)
-            for k, s in secure_options.items():
-                value = value.replace(s, "****")
-            printable_params.setdefault('arg', []).append(value)
+            printable_params.setdefault('arg', []).append(redactor.redact(value))
+
+        return params, printable_params
+
+    def dispatch_job(self, authToken, lowstate):
+        """
+        Posts a lowstate chunk to the minions resource
+        :return the dispatch information (jid and minions) returned by salt-api.
+        """
+
+        params, printable_params = lowstate
 
         headers = {
             "X-Auth-Token": authToken,
@@ -226,28 +773,48 @@ class SaltApiNodeStepPlugin(object):
         logger.debug("Submitting job with arguments [%s]", printable_params)
         logger.info("Submitting job with salt-api endpoint: [%s]", url)
 
-        response = requests.post(url,
-                                 headers=headers,
-                                 data=json.dumps(params))
+        response = SaltApiResponse(self.session.post(url,
+                                                     headers=headers,
+                                                     data=json.dumps(params)))
 
         if response.status_code == 202:
+            return response.json()['return'][0]
+        elif response.status_code == 401:
+            raise SaltApiAuthenticationException("salt-api rejected the token while submitting the job")
+        else:
+            raise Exception("Expected response code %d, received %d. %s" % (202, response.status_code, response.text))
 
-            try:
-                minions_size = len(response.json()['return'][0]['minions'])
-                minions_output = response.json()['return'][0]['minions']
-            except KeyError:
-                minions_size = 0
-                minions_output = None
+    def dispatch_jobs(self, authToken, lowstates):
+        """
+        Posts the lowstate chunks to the root resource as local_async jobs, salt-api runs them in order.
+        :return the dispatch information (jid and minions) returned by salt-api for each chunk.
+        """
 
-            if minions_size != 1:
-                raise(SaltTargettingMismatchException("Expected minion delegation count of 1, was %d. Full minion string: (%s)" % (minions_size, minions_output)))
+        headers = {
+            "X-Auth-Token": authToken,
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+
+        url = f"{self.endpoint}/"
 
-            if minionId not in response.json()['return'][0]['minions']:
-                raise(SaltTargettingMismatchException("Minion dispatch mis-match. Expected:%s,  was:%s" % (minionId, minions_output)))
+        logger.debug("Submitting jobs with arguments [%s]", [printable_params for params, printable_params in lowstates])
+        logger.info("Submitting %d jobs with salt-api endpoint: [%s]", len(lowstates), url)
 
-            return response.json()["return"][0]["jid"]
+        chunks = [dict(params, client='local_async') for params, printable_params in lowstates]
+        response = SaltApiResponse(self.session.post(url,
+                                                     headers=headers,
+                                                     data=json.dumps(chunks)))
+
+        if response.status_code == 200:
+            dispatches = response.json()['return']
+            if len(dispatches) != len(chunks):
+                raise SaltApiException("Expected %d responses, received %d" % (len(chunks), len(dispatches)))
+            return dispatches
+        elif response.status_code == 401:
+            raise SaltApiAuthenticationException("salt-api rejected the token while submitting the jobs")
         else:
-            raise Exception("Expected response code %d, received %d. %s", 202, response.status_code, response.text())
+            raise Exception("Expected response code %d, received %d. %s" % (200, response.status_code, response.text))
 
     def validate(self):
 
@@ -274,16 +841,133 @@ class SaltApiNodeStepPlugin(object):
             raise SaltStepValidationException('SALT_API_END_POINT', f"{self.endpoint} is not a valid endpoint", 'ARGUMENTS_INVALID', '')
 
     def wait_for_jid_response(self, authToken, jid, minionId):
-        jid_resource = f"{self.endpoint}/jobs/{jid}"
-        logger.info("Polling for job status with salt-api endpoint: [%s]", jid_resource)
+        if self.job_lookup == 'runner':
+            logger.info("Polling for job status with salt-api runner jobs.lookup_jid: [%s]", jid)
+        else:
+            logger.info("Polling for job status with salt-api endpoint: [%s]", f"{self.endpoint}/jobs/{jid}")
+        self.timer.wait_for_first()
         while True:
-            response = self.extract_output_for_jid(authToken, jid, minionId)
+            with self.metrics.time('poll', {'salt.jid': jid, 'salt.minion': minionId}):
+                response = self.extract_output_for_jid(authToken, jid, minionId)
             if response is not None:
                 return response
 
             self.timer.wait_for_next()
         pass
 
+    def wait_for_jid_event(self, authToken, jid, minionId):
+        """
+        Waits for the return event of the minion on salt-api's event stream.
+        Falls back to polling the job resource when the stream is unavailable or drops.
+        :param authToken: The token of the session
+        :param jid: The job id
+        :param minionId: The minion id
+        :return the host response encoded in json.
+        """
+
+        import requests
+
+        try:
+            with self.metrics.time('event_wait', {'salt.jid': jid, 'salt.minion': minionId}):
+                return self.await_return_event(authToken, jid, minionId)
+        except SaltApiAuthenticationException:
+            raise
+        except (requests.exceptions.RequestException, SaltApiException, ValueError, KeyError) as e:
+            logger.warning("salt-api event stream unavailable (%s), polling for job status instead", e)
+
+        return self.wait_for_jid_response(authToken, jid, minionId)
+
+    def await_return_event(self, authToken, jid, minionId):
+        """
+        Subscribes to the event stream and returns the job return of the minion once its event arrives.
+        salt-api sends no heartbeat, so when logging progress a stream quiet for PROGRESS_INTERVAL is subscribed
+        to again, checking the job and logging that it is still running, rather than waiting for EVENTTIMEOUT.
+        :raises SaltApiException: if the stream ends before the return event arrived.
+        """
+
+        import requests
+        from util.event_stream import iter_events, return_tag, progress_tag_prefix
+
+        headers = {
+            "X-Auth-Token": authToken,
+            "Accept": "text/event-stream"
+        }
+
+        url = f"{self.endpoint}/events"
+        tag = return_tag(jid, minionId)
+        progressTag = progress_tag_prefix(jid, minionId)
+
+        logger.info("Waiting for job return event [%s] with salt-api endpoint: [%s]", tag, url)
+
+        quietTimeout = min(self.event_timeout, max(PROGRESS_INTERVAL, 0.1)) if self.progress_events else self.event_timeout
+        subscribedAt = lastNotice = time.monotonic()
+        quiet = False
+
+        while True:
+            # Waits for the job timeout at most, polling once more after it
+            readTimeout = self.timer.until_deadline(quietTimeout * 1000) / 1000.0
+
+            response = self.session.get(url,
+                                        headers=headers,
+                                        stream=True,
+                                        timeout=(self.session.timeout[0], readTimeout))
+
+            with response:
+                if response.status_code == 401:
+                    raise SaltApiAuthenticationException("salt-api rejected the token while subscribing to events")
+
+                if response.status_code != 200:
+                    raise SaltApiException("Expected response code 200 from the event stream, received %d" % response.status_code)
+
+                # The job may have returned before the subscription started
+                output = self.extract_output_for_jid(authToken, jid, minionId)
+                if output is not None:
+                    return output
+
+                if quiet:
+                    lastNotice = time.monotonic()
+                    logger.info("Job %s still running on %s after %d s", jid, minionId, lastNotice - subscribedAt)
+
+                response.encoding = response.encoding or 'utf-8'
+                lastEvent = time.monotonic()
+                try:
+                    for eventTag, data in iter_events(response.iter_lines(decode_unicode=True)):
+                        if eventTag == tag:
+                            logger.debug("Received event %s", tag)
+                            return json.loads(data)["data"]["return"]
+
+                        self.timer.until_deadline(0)
+                        lastEvent = now = time.monotonic()
+
+                        if not self.progress_events:
+                            continue
+
+                        if eventTag is not None and eventTag.startswith(progressTag):
+                            self.log_progress_event(json.loads(data)["data"])
+                            lastNotice = now
+                        elif now - lastNotice >= PROGRESS_INTERVAL:
+                            logger.info("Job %s still running on %s after %d s", jid, minionId, now - subscribedAt)
+                            lastNotice = now
+                except requests.exceptions.RequestException:
+                    # Only a read timing out on a quiet bus is retried, not the deadline nor a dropped stream
+                    if not self.progress_events or readTimeout < quietTimeout or time.monotonic() - lastEvent < readTimeout:
+                        raise
+                    quiet = True
+                else:
+                    raise SaltApiException("salt-api event stream ended before job %s returned" % jid)
+
+    def log_progress_event(self, data):
+        """
+        Logs the outcome of a state from the progress event salt fires after running it, when state_events is enabled.
+        :param data: The data of the event, holding the state return and the number of states of the run.
+        """
+
+        state = data.get("ret") or {}
+        result = {True: "Succeeded", False: "Failed"}.get(state.get("result"), "Changes pending")
+
+        logger.info("[%d/%s] %s: %s. %s", state.get("__run_num__", 0) + 1, data.get("len", "?"),
+                    state.get("__id__") or state.get("name"), result, state.get("comment", ""))
+
     def extract_output_for_jid(self, authToken, jid, minionId):
         """
         Extracts the minion job response by calling the job resource.
@@ -293,6 +977,112 @@ class SaltApiNodeStepPlugin(object):
         :return the host response or null if none is available encoded in json.
         """
 
+        if self.streaming_decode:
+            return self.extract_streamed_output_for_jid(authToken, jid, minionId)
+
+        minion_responses = self.job_returns(authToken, jid)
+
+        if minionId in minion_responses:
+            logger.debug("Received response for jobs/%s = %s", jid, minion_responses)
+            return minion_responses[minionId]
+
+    def job_returns(self, authToken, jid):
+        """
+        Requests the returns of all the minions of a job.
+        :param authToken: The token of the session
+        :param jid: The job id
+        :return a dict of minion id to host response, for the minions which returned so far.
+        """
+
+        response = self.request_job_returns(authToken, jid)
+
+        if response.status_code == 200:
+
+            responses = response.json()["return"]
+
+            if len(responses) > 1:
+                raise(SaltApiException("Too many responses received: %s" % response.json()))
+
+            elif len(responses) == 1:
+                minion_responses = responses[0]
+                if not isinstance(minion_responses, dict):
+                    raise(SaltApiException("Unexpected response received: %s" % minion_responses))
+
+                return minion_responses
+
+        elif response.status_code == 401:
+            raise SaltApiAuthenticationException(f"salt-api rejected the token while polling jobs/{jid}")
+
+        return {}
+
+    def extract_streamed_output_for_jid(self, authToken, jid, minionId):
+        """
+        Extracts the minion job response like extract_output_for_jid, decoding the body while it is received.
+        Only the return of the minion is kept, the stdout/stderr of the functions in STREAMED_OUTPUT_FUNCTIONS
+        are logged as they are decoded instead, or spooled and logged once decoded when OUTPUTTRUNCATION is set.
+        :param authToken: The token of the session
+        :param jid: The job id
+        :param minionId: The minion id
+        :return the host response or null if none is available encoded in json.
+        """
+
+        from util.json_stream import extract_minion_return, JsonStreamError, JsonSizeExceeded
+        from util.line_emitter import LineEmitter
+
+        emitters = {}
+        if self.function and shlex.split(self.function)[0] in STREAMED_OUTPUT_FUNCTIONS:
+            if self.output_truncation == 'none':
+                emitters = {stream: self.redacting_writer(LineEmitter(logger.info)) for stream in ['stdout', 'stderr']}
+            else:
+                # The tail of the output is only known at its end, it is spooled until then
+                emitters = {stream: self.output_emitter() for stream in ['stdout', 'stderr']}
+
+        def on_output(stream, text):
+            emitters[stream].write(text)
+
+        with self.request_job_returns(authToken, jid, stream=True) as response:
+            if response.status_code == 401:
+                raise SaltApiAuthenticationException(f"salt-api rejected the token while polling jobs/{jid}")
+
+            if response.status_code != 200:
+                return None
+
+            try:
+                result = extract_minion_return(response.iter_text(STREAM_CHUNK_SIZE), minionId, on_output if emitters else None, self.max_return_size)
+            except JsonSizeExceeded:
+                raise SaltReturnResponseParseException(f"Return of {minionId} for job {jid} exceeds {self.max_return_size} characters")
+            except JsonStreamError as e:
+                raise SaltReturnResponseParseException(f"Unable to decode the returns of job {jid}: {e}")
+            finally:
+                for emitter in emitters.values():
+                    emitter.flush()
+
+        if result.responses > 1:
+            raise(SaltApiException("Too many responses received for jobs/%s" % jid))
+
+        if result.unexpected:
+            raise(SaltApiException("Unexpected response received for jobs/%s" % jid))
+
+        if result.found:
+            logger.debug("Received response for jobs/%s", jid)
+            self.output_streamed = bool(emitters)
+            return result.value
+
+    def request_job_returns(self, authToken, jid, stream=False):
+        """
+        Requests the minion returns of a job, through the jobs.lookup_jid runner when JOBLOOKUP is runner.
+        The runner only returns the minion returns, the job resource also repeats them in the job info.
+        :param authToken: The token of the session
+        :param jid: The job id
+        :param stream: Whether to leave the body to be read with iter_text.
+        :return the wrapped http response.
+        """
+
+        streaming = {'stream': True} if stream else {}
+
+        if self.job_lookup == 'runner':
+            return self.request_runner_lookups(authToken, [jid], **streaming)
+
         headers = {
             "X-Auth-Token": authToken,
             "Accept": "application/json"
@@ -300,21 +1090,168 @@ class SaltApiNodeStepPlugin(object):
 
         url = f"{self.endpoint}/jobs/{jid}"
 
-        response = requests.get(url,
-                                headers=headers)
+        return SaltApiResponse(self.session.get(url,
+                                                headers=headers,
+                                                **streaming))
+
+    def request_runner_lookups(self, authToken, jids, **kwargs):
+        """
+        Posts a jobs.lookup_jid runner chunk per job to the root resource, salt-api runs them in order.
+        :param authToken: The token of the session
+        :param jids: The job ids
+        :return the wrapped http response.
+        """
+
+        return self.request_runners(authToken, [{"fun": "jobs.lookup_jid", "jid": jid} for jid in jids], **kwargs)
+
+    def request_runners(self, authToken, chunks, **kwargs):
+        """
+        Posts runner chunks to the root resource, salt-api runs them in order.
+        :param authToken: The token of the session
+        :param chunks: The lowstate chunks, without their client.
+        :return the wrapped http response.
+        """
+
+        headers = {
+            "X-Auth-Token": authToken,
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        }
+
+        lowstate = [dict(client="runner", **chunk) for chunk in chunks]
+
+        return SaltApiResponse(self.session.post(f"{self.endpoint}/",
+                                                 headers=headers,
+                                                 data=json.dumps(lowstate),
+                                                 **kwargs))
+
+    def lookup_jobs(self, authToken, jids):
+        """
+        Requests the minion returns of several jobs at once. With the runner job lookup this is a single request,
+        otherwise the job resource is requested for each job.
+        :param authToken: The token of the session
+        :param jids: The job ids
+        :return a dict of jid to either a dict of minion id to host response, or the SaltApiException the lookup of that job failed with.
+        """
+
+        lookups = {}
+
+        if self.job_lookup != 'runner':
+            for jid in jids:
+                try:
+                    lookups[jid] = self.job_returns(authToken, jid)
+                except SaltApiAuthenticationException:
+                    raise
+                except SaltApiException as e:
+                    lookups[jid] = e
+            return lookups
+
+        response = self.request_runner_lookups(authToken, jids)
 
         if response.status_code == 200:
 
             responses = response.json()["return"]
 
-            if len(responses) > 1:
-                raise(SaltApiException("Too many responses received: %s" % response.json()))
+            if len(responses) != len(jids):
+                raise(SaltApiException("Expected %d responses, received %d" % (len(jids), len(responses))))
 
-            elif len(responses) == 1:
-                minion_response = responses[0]
-                if minionId in minion_response:
-                    logger.debug("Received response for jobs/%s = %s", jid, response.json())
-                    return minion_response[minionId]
+            for jid, minion_responses in zip(jids, responses):
+                if isinstance(minion_responses, dict):
+                    lookups[jid] = minion_responses
+                else:
+                    lookups[jid] = SaltApiException("Unexpected response received for jobs/%s: %s" % (jid, minion_responses))
+
+        elif response.status_code == 401:
+            raise SaltApiAuthenticationException("salt-api rejected the token while looking up jobs")
+
+        return lookups
+
+    def find_recent_job(self, authToken, minionId, function):
+        """
+        Looks in the master's job cache for a job of the function, with the same arguments and targeting only the minion,
+        started within the last reuse_jobs seconds and which the minion returned for successfully.
+        The job cache is searched with the jobs.list_jobs runner, which requires @runner permissions. Its start times are
+        in the master's local time, which is assumed to be the local time of this host.
+        :param authToken: The token of the session
+        :param minionId: The minion id
+        :param function: The function with its arguments
+        :return a tuple of the jid and the host response, or None if there is no such job.
+        """
+
+        args = shlex.split(function)
+        since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - self.reuse_jobs))
+
+        response = self.request_runners(authToken, [{
+            "fun": "jobs.list_jobs",
+            "search_function": args[0],
+            "search_target": minionId,
+            "start_time": since
+        }])
+
+        if response.status_code == 401:
+            raise SaltApiAuthenticationException("salt-api rejected the token while listing jobs")
+
+        responses = response.json()["return"] if response.status_code == 200 else []
+        jobs = responses[0] if len(responses) == 1 else None
+        if not isinstance(jobs, dict):
+            logger.warning("Unable to list the recent jobs of %s, dispatching a new job: %s", minionId, jobs or response.status_code)
+            return None
+
+        # jids are timestamps, the most recent sort last
+        candidates = sorted((jid for jid, job in jobs.items() if self.same_job(job, minionId, args)), reverse=True)[:REUSE_CANDIDATES]
+        if not candidates:
+            return None
+
+        lookups = self.lookup_jobs(authToken, candidates)
+        for jid in candidates:
+            minion_responses = lookups.get(jid)
+            if isinstance(minion_responses, dict) and minionId in minion_responses:
+                # Only a successful return is reused, a retried step runs again after a failure
+                if not self.succeeded(args[0], minion_responses[minionId]):
+                    logger.info("Recent job [%s] failed on %s, dispatching a new job", jid, minionId)
+                    return None
+                return jid, minion_responses[minionId]
+
+        logger.debug("Recent jobs %s of %s have not returned yet", candidates, minionId)
+        return None
+
+    @staticmethod
+    def succeeded(function, jobOutput):
+        """
+        Checks the handler of the function finds the job return successful.
+        :param function: The function, without its arguments.
+        """
+
+        handler = returnHandlerRegistry(function, None)
+        try:
+            handler.extract_response(jobOutput)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return not handler.get_exit_code()
+
+    @staticmethod
+    def same_job(job, minionId, args):
+        """
+        Checks a job of the job cache ran the function with the given arguments on the minion only.
+        :param job: The job as listed by jobs.list_jobs
+        :param args: The function and its arguments, as split from the FUNCTION configuration.
+        """
+
+        if not isinstance(job, dict) or job.get('Function') != args[0]:
+            return False
+
+        if job.get('Target') not in (minionId, [minionId]) or job.get('Target-type', 'glob') not in ('glob', 'list'):
+            return False
+
+        # salt keeps the key=value arguments as a keyword argument dict
+        arguments = []
+        for argument in job.get('Arguments') or []:
+            if isinstance(argument, dict) and argument.get('__kwarg__'):
+                arguments.extend(f"{key}={value}" for key, value in argument.items() if key != '__kwarg__')
+            else:
+                arguments.append(str(argument))
+
+        return arguments == args[1:]
 
     def authenticate(self):
         """
@@ -336,23 +1273,89 @@ class SaltApiNodeStepPlugin(object):
 
         logger.info("Authenticating with salt-api endpoint: [%s]", url)
 
-        response = requests.post(url,
-                                 headers=headers,
-                                 data=json.dumps(data))
+        with self.metrics.time('login'):
+            response = SaltApiResponse(self.session.post(url,
+                                                         headers=headers,
+                                                         data=json.dumps(data)))
 
         if response.status_code == 200:
             try:
-                token = response.json()["return"][0]["token"]
+                login = response.json()["return"][0]
+                token = login["token"]
+                self.token_expire = login.get("expire")
                 return token
             except NameError:
-                raise Exception(f"Error fetching token: ${response.text()}")
+                raise Exception(f"Error fetching token: ${response.text}")
             except Exception as e:
                 print("Error:", e)
-                raise Exception(f"Error fetching token: ${response.text()}")
+                raise Exception(f"Error fetching token: ${response.text}")
         elif response.status_code == 401:
             return None
         else:
-            raise Exception(f"Unexpected failure interacting with salt-api {response.text()}")
+            raise Exception(f"Unexpected failure interacting with salt-api {response.text}")
+
+    def acquire_token(self):
+        """
+        Returns a token for the session, reusing the one in the token cache if enabled.
+        :return the token or None if authentication failed.
+        """
+
+        if self.token_cache is None:
+            return self.authenticate()
+
+        def authenticate():
+            return self.authenticate(), self.token_expire
+
+        key = self.token_cache.key(self.endpoint, self.username, self.eauth)
+        return self.token_cache.acquire(key, self.password, authenticate)
+
+    def release_token(self, authToken):
+        """
+        Gives up the token of the session, logging out unless it is still shared through the token cache.
+        :param authToken: The token of the session
+        """
+
+        if self.token_cache is None:
+            self.logoutQuietly(authToken)
+            return
+
+        key = self.token_cache.key(self.endpoint, self.username, self.eauth)
+        if self.token_cache.release(key, authToken):
+            self.logoutQuietly(authToken)
+        else:
+            logger.debug("Keeping cached salt-api token for reuse")
+
+    def refresh_token(self, authToken):
+        """
+        Replaces a token that salt-api rejected.
+        :param authToken: The rejected token
+        :return the new token or None if authentication failed.
+        """
+
+        if self.token_cache is not None:
+            self.token_cache.invalidate(self.token_cache.key(self.endpoint, self.username, self.eauth), authToken)
+
+        return self.acquire_token()
+
+    def call_with_token(self, authToken, method, *args):
+        """
+        Calls method with the token and args, authenticating once more if salt-api rejects the token.
+        The refreshed token is kept in auth_token, to be released even if the retried call fails.
+        :param authToken: The token of the session
+        :param method: The plugin method to call, taking the token as its first argument.
+        :return a tuple of the (possibly refreshed) token and the result of the method.
+        """
+
+        try:
+            return authToken, method(authToken, *args)
+        except SaltApiAuthenticationException:
+            logger.info("salt-api rejected the token, authenticating again")
+            authToken = self.refresh_token(authToken)
+            if authToken is None:
+                raise
+            self.auth_token = authToken
+
+            return authToken, method(authToken, *args)
 
     def logoutQuietly(self, authToken):
         """
@@ -360,6 +1363,8 @@ class SaltApiNodeStepPlugin(object):
         :header authToken: The token of the session
         """
 
+        import requests
+
         headers = {
             "X-Auth-Token": authToken,
         }
@@ -369,8 +1374,9 @@ class SaltApiNodeStepPlugin(object):
         logger.info("Logging out with salt-api endpoint: [%s]", url)
 
         try:
-            requests.post(url,
-                          headers=headers)
+            with self.metrics.time('logout'):
+                self.session.post(url,
+                                  headers=headers)
         except requests.exceptions.ConnectionError as e:
             logger.warning("Encountered exception (%s) while trying to logout. Ignoring...", e)
             pass
@@ -381,9 +1387,16 @@ class SaltApiNodeStepPlugin(object):
 
 def main():  # pragma: no cover
 
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
     client = SaltApiNodeStepPlugin()
+    context = StepContext.from_environ()
+
+    dispatcherSocket = context.config.get('DISPATCHERSOCKET')
+    if dispatcherSocket and client.execute_dispatched_node_step(dispatcherSocket, context):
+        return
 
-    client.execute_node_step()
+    client.execute_node_step(context)
 
 
 if __name__ == "__main__":
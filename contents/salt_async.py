@@ -0,0 +1,278 @@
+#!/usr/bin/python3
+
+import sys, os
+import asyncio
+import copy
+import logging
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin, SaltApiAuthenticationException, NodeStepException
+from salt import failure_reason, number_config, redaction
+from output.salt_return_handler_registry import returnHandlerRegistry
+from util.jid_poller import JidPoller
+from util.step_context import StepContext
+from util.redaction import redactor_for
+
+DEFAULT_CONCURRENCY = 10
+
+logger = logging.getLogger(__name__)
+
+
+class NodeResult:
+    """
+    The outcome of the node step on one minion.
+    """
+
+    def __init__(self, minionId):
+        self.minionId = minionId
+        self.jid = None
+        self.output = None
+        self.error = None
+        self.exit_code = None
+        self.failure_reason = None
+        self.message = None
+
+    @property
+    def succeeded(self):
+        return self.failure_reason is None
+
+
+class AsyncSaltApiClient:
+    """
+    Runs the node step (authenticate, submit_job, wait_for_jid_response, extract_response)
+    for many minions concurrently from a single process.
+
+    All nodes share one token and the connection pool of the plugin's session. The
+    requests themselves are sent by the plugin in a thread pool of the size of the
+    concurrency limit. The jobs of the nodes passing the concurrency limit together are
+    submitted in one request, and the returns of all the jobs in flight are polled for
+    together by a JidPoller, so a node waiting for its job holds no thread.
+    """
+
+    def __init__(self, plugin, concurrency=DEFAULT_CONCURRENCY, context=None):
+        """
+        Creates a client running the steps through the given, configured, plugin
+
+        :param plugin: The SaltApiNodeStepPlugin to send the requests with.
+        :param concurrency: The maximum number of nodes submitting or polling at once.
+        :param context: The StepContext of the step, for its secure options.
+        """
+        self.plugin = plugin
+        self.concurrency = concurrency
+        self.context = context or StepContext()
+        self.token = None
+        self.executor = None
+        self.semaphore = None
+        self.token_lock = None
+        self.loop = None
+        self.pending = []
+        self.submissions = set()
+        self.poller = JidPoller(self.lookup, lambda: copy.copy(plugin.timer), sweep=plugin.job_lookup == 'runner')
+
+        session = plugin.session
+        if session.pool_size < concurrency:
+            session.configure(pool_size=concurrency,
+                              retries=session.retries,
+                              connect_timeout=session.timeout[0],
+                              read_timeout=session.timeout[1])
+
+    async def call(self, method, *args):
+        """
+        Calls a blocking plugin method in the thread pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def call_with_token(self, method, *args):
+        """
+        Calls method with the shared token and args, authenticating once more if salt-api rejects the token.
+        Concurrent calls rejecting the same token only authenticate once.
+        """
+        authToken = self.token
+
+        try:
+            return await self.call(method, authToken, *args)
+        except SaltApiAuthenticationException:
+            await self.refresh(authToken)
+
+        return await self.call(method, self.token, *args)
+
+    async def refresh(self, authToken):
+        """
+        Replaces the shared token that salt-api rejected, unless it was replaced already.
+        :raises SaltApiAuthenticationException: if authentication failed.
+        """
+        async with self.token_lock:
+            if self.token == authToken:
+                logger.info("salt-api rejected the token, authenticating again")
+                refreshed = await self.call(self.plugin.refresh_token, authToken)
+                if refreshed is None:
+                    raise SaltApiAuthenticationException("salt-api rejected the credentials")
+                self.token = refreshed
+
+    def lookup(self, jids):
+        """
+        Looks up the returns of the jobs for the poller, from its thread.
+        """
+        authToken = self.token
+        try:
+            return self.plugin.lookup_jobs(authToken, jids)
+        except SaltApiAuthenticationException:
+            asyncio.run_coroutine_threadsafe(self.refresh(authToken), self.loop).result()
+            return self.plugin.lookup_jobs(self.token, jids)
+
+    async def submit_job(self, minionId, secureData):
+        """
+        Submits the job of the minion together with those of the nodes submitting in the same
+        iteration of the event loop, in a single request (see SaltApiNodeStepPlugin.submit_jobs).
+        :return the jid of the job.
+        :raises SaltTargettingMismatchException: if salt did not dispatch the job to the minion only.
+        """
+        future = self.loop.create_future()
+        if not self.pending:
+            # Runs once the other nodes ready to run in this iteration queued their job
+            submission = self.loop.create_task(self.submit_pending(secureData))
+            self.submissions.add(submission)
+            submission.add_done_callback(self.submissions.discard)
+        self.pending.append((minionId, future))
+        return await future
+
+    async def submit_pending(self, secureData):
+        """
+        Submits the queued jobs, settling the future of each with its jid or the exception its submission failed with.
+        """
+        pending, self.pending = self.pending, []
+
+        try:
+            jids = await self.call_with_token(self.plugin.submit_jobs, [(minionId, self.plugin.function) for minionId, future in pending], secureData)
+        except Exception as e:
+            jids = [e] * len(pending)
+        else:
+            if len(pending) > 1:
+                logger.info("Submitted %d jobs in one request", len(pending))
+
+        for (minionId, future), jid in zip(pending, jids):
+            if future.done():
+                continue
+            if isinstance(jid, Exception):
+                future.set_exception(jid)
+            else:
+                future.set_result(jid)
+
+    async def wait_for_jid_response(self, jid, minionId):
+        future = self.loop.create_future()
+
+        def settle(response, error):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(response)
+
+        self.poller.subscribe(jid, minionId,
+                              lambda response, error: self.loop.call_soon_threadsafe(settle, response, error),
+                              copy.copy(self.plugin.timer))
+        return await future
+
+    async def run_node(self, minionId, secureData):
+        """
+        Runs the step on one minion.
+        :return a NodeResult, failures are recorded in it rather than raised.
+        """
+        result = NodeResult(minionId)
+        function = shlex.split(self.plugin.function)[0]
+
+        try:
+            async with self.semaphore:
+                result.jid = await self.submit_job(minionId, secureData)
+                logger.info("Received jid [%s] for job submitted to [%s]", result.jid, minionId)
+                jobOutput = await self.wait_for_jid_response(result.jid, minionId)
+
+            handler = returnHandlerRegistry(function, None)
+            handler.extract_response(jobOutput)
+            result.output = handler.get_standard_output()
+            result.error = handler.get_standard_error()
+            result.exit_code = handler.get_exit_code()
+
+            if result.exit_code:
+                result.failure_reason = 'EXIT_CODE'
+                result.message = "Execution failed on minion with exit code %d" % result.exit_code
+
+        except Exception as e:
+            result.failure_reason = failure_reason(e)
+            if result.failure_reason is None:
+                raise
+            result.message = str(e)
+
+        return result
+
+    async def run(self, minionIds):
+        """
+        Runs the step on all the given minions, at most concurrency at a time.
+        :return a dict of minion id to NodeResult.
+        :raises NodeStepException: if authentication failed.
+        """
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.token_lock = asyncio.Lock()
+        self.loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.executor:
+            self.token = await self.call(self.plugin.acquire_token)
+            if self.token is None:
+                raise NodeStepException("Authentication failure", 'AUTHENTICATION_FAILURE', {})
+
+            try:
+                secureData = self.context.secure_options
+                results = await asyncio.gather(*[self.run_node(minionId, secureData) for minionId in minionIds])
+            finally:
+                await self.call(self.plugin.release_token, self.token)
+
+        return {result.minionId: result for result in results}
+
+
+def run_nodes(plugin, minionIds, concurrency=DEFAULT_CONCURRENCY, context=None):
+    """
+    Runs the step on all the given minions with an AsyncSaltApiClient.
+    :param context: The StepContext of the step.
+    :return a dict of minion id to NodeResult.
+    """
+    return asyncio.run(AsyncSaltApiClient(plugin, concurrency, context).run(minionIds))
+
+
+def main():  # pragma: no cover
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    context = StepContext.from_environ()
+    config = context.config
+
+    # The nodes run in a thread pool, every thread masks the secure options of the step
+    redaction.default = redactor_for(context.secure_options.values())
+    logger.addFilter(redaction)
+
+    if not context.options:
+        raise NodeStepException("Missing data context.", 'ARGUMENTS_MISSING', context.node)
+
+    plugin = SaltApiNodeStepPlugin()
+    plugin.configure(context.options, config)
+
+    minionIds = sys.argv[1:] or (config.get('NODES') or '').replace(',', ' ').split()
+    results = run_nodes(plugin, minionIds, number_config(config, 'CONCURRENCY', DEFAULT_CONCURRENCY), context)
+
+    failed = 0
+    for minionId, result in results.items():
+        if result.output:
+            logger.info("[%s] %s", minionId, result.output)
+        if result.error:
+            logger.info("[%s] %s", minionId, result.error)
+        if not result.succeeded:
+            failed += 1
+            logger.error("[%s] %s: %s", minionId, result.failure_reason, result.message)
+
+    logger.info("Step completed on %d of %d nodes", len(results) - failed, len(results))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/python3
+
+import sys, os
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import socket
+import socketserver
+import threading
+import time
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin, SaltApiAuthenticationException, SaltTargettingMismatchException
+from salt import NodeStepException
+from util.jid_poller import JidPoller
+from util.step_context import StepContext
+
+DEFAULT_GROUP_WINDOW = 50
+EXPIRY_MARGIN = 60
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCredentials:
+    """
+    The session, token and job poller shared by all the steps using the same salt-api credentials.
+    """
+
+    def __init__(self, plugin):
+        """
+        Shares the session of the given plugin, authenticating with its credentials
+
+        :param plugin: A configured SaltApiNodeStepPlugin.
+        """
+        self.plugin = plugin
+        self.session = plugin.session
+        self.lock = threading.Lock()
+        self.token = None
+        self.expire = None
+        self.poller = JidPoller(self.lookup, lambda: copy.copy(plugin.timer), sweep=plugin.job_lookup == 'runner')
+
+    def acquire(self):
+        """
+        Returns the shared token, authenticating if there is none or it is about to expire.
+        :return the token or None if authentication failed.
+        """
+        with self.lock:
+            if self.token is None or (self.expire is not None and self.expire - EXPIRY_MARGIN < time.time()):
+                self.token = self.plugin.authenticate()
+                self.expire = self.plugin.token_expire
+            return self.token
+
+    def refresh(self, rejected):
+        """
+        Replaces a token that salt-api rejected, unless another step replaced it already.
+        :return the new token or None if authentication failed.
+        """
+        with self.lock:
+            if self.token == rejected:
+                self.token = None
+        return self.acquire()
+
+    def lookup(self, jids):
+        """
+        Looks up the returns of the jobs for the poller, authenticating once more if salt-api rejects the token.
+        """
+        authToken = self.acquire()
+        try:
+            return self.plugin.lookup_jobs(authToken, jids)
+        except SaltApiAuthenticationException:
+            authToken = self.refresh(authToken)
+            if authToken is None:
+                raise
+            return self.plugin.lookup_jobs(authToken, jids)
+
+    def close(self):
+        with self.lock:
+            if self.token is not None:
+                self.plugin.logoutQuietly(self.token)
+                self.token = None
+
+
+class _Group:
+
+    def __init__(self):
+        self.minions = []
+        self.done = threading.Event()
+        self.jid = None
+        self.dispatched = []
+        self.error = None
+
+
+class SubmissionGroups:
+    """
+    Groups the submissions of the same function that arrive within a short window into
+    one list targeted job, as batch dispatch does.
+    """
+
+    def __init__(self, window=DEFAULT_GROUP_WINDOW):
+        """
+        :param window: The time (in ms) the first submission of a group waits for others.
+        """
+        self.window = window
+        self.lock = threading.Lock()
+        self.groups = {}
+
+    def submit(self, plugin, authToken, minionId, function, secure_options={}, poller=None):
+        """
+        Submits the function to the minion, together with the concurrent submissions of the same function.
+        :param poller: The JidPoller to start polling the job of a group with.
+        :return the jid of the job.
+        :raises SaltTargettingMismatchException: if salt did not dispatch the job to the minion.
+        """
+        key = (plugin.credentials_key, function, json.dumps(secure_options, sort_keys=True))
+
+        with self.lock:
+            group = self.groups.get(key)
+            leader = group is None
+            if leader:
+                group = self.groups[key] = _Group()
+            group.minions.append(minionId)
+
+        if leader:
+            time.sleep(self.window / 1000.0)
+            with self.lock:
+                del self.groups[key]
+
+            try:
+                if len(group.minions) == 1:
+                    group.jid = SaltApiNodeStepPlugin.submit_job(plugin, authToken, minionId, function, secure_options)
+                    group.dispatched = [minionId]
+                else:
+                    group.jid, group.dispatched = plugin.submit_batch_job(authToken, group.minions, function, secure_options)
+                    logger.info("Submitted grouped job [%s] for %d minions", group.jid, len(group.minions))
+                    if poller is not None:
+                        poller.expect(group.jid, set(group.minions).intersection(group.dispatched))
+            except Exception as e:
+                group.error = e
+            finally:
+                group.done.set()
+        else:
+            group.done.wait()
+
+        if group.error is not None:
+            raise group.error
+
+        if minionId not in group.dispatched:
+            raise(SaltTargettingMismatchException("Minion dispatch mis-match. Expected:%s,  was:%s" % (minionId, group.dispatched)))
+
+        return group.jid
+
+
+class DispatchedNodeStepPlugin(SaltApiNodeStepPlugin):
+    """
+    Runs a step handed over to the dispatcher, sharing the session, token, submissions and polls with the other steps.
+    """
+
+    def __init__(self, dispatcher):
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.credentials = None
+        self.credentials_key = None
+
+    def configure_session(self, config):
+        self.credentials_key = (self.endpoint, self.username, self.eauth, hashlib.sha256(self.password.encode()).hexdigest())
+        self.credentials = self.dispatcher.credentials(self, config)
+        self._session = self.credentials.session
+
+    def acquire_token(self):
+        return self.credentials.acquire()
+
+    def release_token(self, authToken):
+        # Kept for the next steps, logged out when the dispatcher stops
+        pass
+
+    def refresh_token(self, authToken):
+        return self.credentials.refresh(authToken)
+
+    def submit_job(self, authToken, minionId, function, secure_options={}):
+        return self.dispatcher.submissions.submit(self, authToken, minionId, function, secure_options, self.credentials.poller)
+
+    def wait_for_jid_response(self, authToken, jid, minionId):
+        return self.credentials.poller.wait(jid, minionId, copy.copy(self.timer))
+
+
+class _StepLogForwarder(logging.Handler):
+    """
+    Forwards the log records of the threads running steps to their clients.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.writers = {}
+
+    def emit(self, record):
+        write = self.writers.get(record.thread)
+        if write is not None:
+            write({"log": [record.levelno, record.getMessage()]})
+
+
+class SaltDispatcher:
+    """
+    Holds the state shared by the steps handed over by salt.py processes.
+    """
+
+    def __init__(self, group_window=DEFAULT_GROUP_WINDOW):
+        """
+        :param group_window: The time (in ms) a submission waits for others of the same function.
+        """
+        self.lock = threading.Lock()
+        self.shared = {}
+        self.submissions = SubmissionGroups(group_window)
+        # A single handler, adding and removing one per step would race with the logging of the others
+        self.forwarder = _StepLogForwarder()
+        logging.getLogger('salt').addHandler(self.forwarder)
+
+    def credentials(self, plugin, config):
+        """
+        Returns the SharedCredentials of the credentials the plugin is configured with.
+        """
+        with self.lock:
+            shared = self.shared.get(plugin.credentials_key)
+            if shared is None:
+                base = SaltApiNodeStepPlugin(plugin.endpoint, plugin.username, plugin.password, plugin.eauth)
+                base.configure_session(config)
+                shared = self.shared[plugin.credentials_key] = SharedCredentials(base)
+            return shared
+
+    def execute(self, context, write):
+        """
+        Runs a step, forwarding its log records.
+        :param context: The StepContext of the step.
+        :param write: A callable sending a json document to the client.
+        :return the result document, with the failure_reason and message of a failed step.
+        """
+        node = context.node
+        plugin = DispatchedNodeStepPlugin(self)
+        thread = threading.get_ident()
+
+        self.forwarder.writers[thread] = write
+        try:
+            plugin.run_step(context)
+            return {}
+        except NodeStepException as e:
+            return {"failure_reason": e.failure_reason, "message": str(e.message)}
+        except Exception as e:
+            logger.exception("Unexpected failure running step on [%s]", node.get('NAME'))
+            return {"failure_reason": 'SALT_API_FAILURE', "message": str(e)}
+        finally:
+            del self.forwarder.writers[thread]
+
+    def close(self):
+        """
+        Logs out of all the shared sessions.
+        """
+        logging.getLogger('salt').removeHandler(self.forwarder)
+        with self.lock:
+            for shared in self.shared.values():
+                shared.close()
+            self.shared = {}
+
+
+class DispatcherRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        def write(message):
+            self.wfile.write(json.dumps(message).encode() + b'\n')
+
+        result = self.server.dispatcher.execute(StepContext(**json.loads(line)['context']), write)
+        write({"result": result})
+
+
+class DispatcherServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Accepts steps from salt.py processes on a unix socket only the current user can connect to.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, dispatcher):
+        """
+        :raises RuntimeError: if another dispatcher is listening on the socket.
+        """
+        self.dispatcher = dispatcher
+
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+                raise RuntimeError(f"A dispatcher is already listening on {socket_path}")
+            except ConnectionRefusedError:
+                os.unlink(socket_path)
+            finally:
+                probe.close()
+
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, DispatcherRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():  # pragma: no cover
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Runs salt.py steps handed over on a unix socket with shared salt-api state")
+    parser.add_argument('socket', help="The unix socket to listen on, the dispatcherSocket step configuration")
+    parser.add_argument('--group-window', type=int, default=DEFAULT_GROUP_WINDOW,
+                        help="Time in ms a submission waits for others of the same function (default %(default)s)")
+    args = parser.parse_args()
+
+    dispatcher = SaltDispatcher(args.group_window)
+    server = DispatcherServer(args.socket, dispatcher)
+    logger.info("Dispatching steps on [%s]", args.socket)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
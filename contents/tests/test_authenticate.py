@@ -23,7 +23,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD, self.PARAM_EAUTH)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_authenticate_with_ok_response_code(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {"return": [{
@@ -42,6 +42,8 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         result = self.plugin.authenticate()
         self.assertEqual(result, self.AUTH_TOKEN)
+        self.assertEqual(self.plugin.token_expire, mock_post.return_value.json.return_value["return"][0]["expire"])
+        mock_post.return_value.json.assert_called_once_with()
         mock_post.assert_called_once_with(
             self.PARAM_ENDPOINT+'/login',
             headers={"Accept": "application/json", "Content-Type": "application/json"},
@@ -52,7 +54,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             })
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_authenticate_failure(self, mock_post):
         mock_post.return_value.status_code = 401
         mock_post.return_value.json.return_value = {}
@@ -60,7 +62,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         result = self.plugin.authenticate()
         self.assertIsNone(result)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_authentication_failure_on_internal_server_error(self, mock_post):
         mock_post.return_value.status_code = 500
         mock_post.return_value.json.return_value = {}
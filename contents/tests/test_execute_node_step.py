@@ -1,4 +1,7 @@
 import sys, os
+import json
+import tempfile
+import time
 import unittest
 from unittest.mock import MagicMock
 from unittest import mock
@@ -6,6 +9,10 @@ from unittest import mock
 sys.path.append(os.getcwd())
 from salt import SaltApiNodeStepPlugin
 from salt import NodeStepException, SaltStepValidationException, SaltApiException, SaltTargettingMismatchException
+from salt import SaltApiAuthenticationException, SaltApiNodeStepFailureReason, FAILURE_REASONS
+from util.adaptive_backoff_timer import AdaptiveBackoffTimer
+from util.exponential_backoff_timer import DeadlineExceeded
+from util.runtime_history import RuntimeHistory
 
 from requests.exceptions import HTTPError
 
@@ -124,13 +131,10 @@ class SaltApiNodeStepPluginTest(unittest.TestCase):
         self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
         self.plugin.extract_output_for_jid.return_value = MagicMock(exit_code=0, stdout=[], stderr=[])
 
-        secure_options = set()
-        self.plugin.extract_secure_data = MagicMock()
-        self.plugin.extract_secure_data.return_value = secure_options
-
-        self.plugin.execute_node_step()
+        with mock.patch.dict(os.environ, {"RD_SECUREOPTION_API_KEY": "s3cr3t"}):
+            self.plugin.execute_node_step()
 
-        self.plugin.submit_job.assert_called_once_with(self.AUTH_TOKEN, self.PARAM_MINION_NAME, 'test.ping', secure_options)
+        self.plugin.submit_job.assert_called_once_with(self.AUTH_TOKEN, self.PARAM_MINION_NAME, 'test.ping', {"API_KEY": "s3cr3t"})
 
     @mock.patch.dict(os.environ, {
             "RD_OPTION_SALT_API_EAUTH": "pam",
@@ -288,3 +292,742 @@ class SaltApiNodeStepPluginTest(unittest.TestCase):
             self.plugin.execute_node_step()
 
         self.assertEqual(context.exception.failure_reason, 'COMMUNICATION_FAILURE')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_HTTPPOOLSIZE": "4",
+            "RD_CONFIG_HTTPRETRIES": "1",
+            "RD_CONFIG_HTTPCONNECTTIMEOUT": "2.5",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_configures_http_session(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        self.plugin.execute_node_step()
+
+        self.assertEqual(self.plugin.session.pool_size, 4)
+        self.assertEqual(self.plugin.session.retries, 1)
+        self.assertEqual(self.plugin.session.timeout, (2.5, 60))
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_HTTPPOOLSIZE": "many",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_http_config(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'HTTPPOOLSIZE')
+        self.assertEqual(context.exception.failure_reason, 'ARGUMENTS_INVALID')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_token_cache_skips_login_and_logout(self):
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        def authenticate():
+            self.plugin.token_expire = time.time() + 3600
+            return self.AUTH_TOKEN
+
+        self.plugin.authenticate.side_effect = authenticate
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_TOKENCACHEDIR": directory}):
+                self.plugin.execute_node_step()
+                self.plugin.execute_node_step()
+
+        self.plugin.authenticate.assert_called_once_with()
+        self.plugin.logoutQuietly.assert_not_called()
+        self.assertEqual(self.plugin.submit_job.call_count, 2)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_refreshes_rejected_token(self):
+        self.plugin.authenticate.side_effect = ["expired_token", self.AUTH_TOKEN]
+        self.plugin.submit_job.side_effect = [SaltApiAuthenticationException("Rejected"), self.OUTPUT_JID]
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        self.plugin.execute_node_step()
+
+        self.assertEqual(self.plugin.authenticate.call_count, 2)
+        self.plugin.wait_for_jid_response.assert_called_once_with(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+        self.plugin.logoutQuietly.assert_called_once_with(self.AUTH_TOKEN)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_releases_refreshed_token_when_retry_fails(self):
+        self.plugin.authenticate.side_effect = ["expired_token", self.AUTH_TOKEN]
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.side_effect = [SaltApiAuthenticationException("Rejected"), DeadlineExceeded("Timed out")]
+
+        with self.assertRaises(NodeStepException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.failure_reason, 'JOB_TIMEOUT')
+        self.plugin.logoutQuietly.assert_called_once_with(self.AUTH_TOKEN)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_token_rejected_twice(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.side_effect = SaltApiAuthenticationException("Rejected")
+
+        with self.assertRaises(NodeStepException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.failure_reason, 'AUTHENTICATION_FAILURE')
+        self.plugin.logoutQuietly.assert_called_once_with(self.AUTH_TOKEN)
+
+    def test_execute_with_batch_submits_one_job(self):
+        minions = ["minion1", "minion2", "minion3"]
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_batch_job = MagicMock(return_value=(self.OUTPUT_JID, minions))
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        with tempfile.TemporaryDirectory() as directory:
+            for minion in minions:
+                with mock.patch.dict(os.environ, {
+                        "RD_OPTION_SALT_API_EAUTH": "pam",
+                        "RD_OPTION_SALT_USER": "user",
+                        "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+                        "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+                        "RD_CONFIG_FUNCTION": "test.ping",
+                        "RD_CONFIG_BATCHNODES": ",".join(minions),
+                        "RD_CONFIG_BATCHDIR": directory,
+                        "RD_JOB_EXECID": "42",
+                        "RD_NODE_NAME": minion,
+                        }):
+                    self.plugin.execute_node_step()
+
+        self.plugin.submit_batch_job.assert_called_once_with(self.AUTH_TOKEN, minions, "test.ping", {})
+        self.plugin.submit_job.assert_not_called()
+        self.plugin.wait_for_jid_response.assert_called_with(self.AUTH_TOKEN, self.OUTPUT_JID, "minion3")
+        self.assertEqual(self.plugin.wait_for_jid_response.call_count, 3)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_BATCHNODES": "minion1,minion_name",
+            "RD_JOB_EXECID": "42",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_batch_retried_node_submits_job_for_it_alone(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_batch_job = MagicMock(return_value=(self.OUTPUT_JID, ["minion1", "minion_name"]))
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_BATCHDIR": directory}):
+                self.plugin.execute_node_step()
+                self.plugin.execute_node_step()
+
+        self.plugin.submit_batch_job.assert_called_once_with(self.AUTH_TOKEN, ["minion1", "minion_name"], "test.ping", {})
+        self.plugin.submit_job.assert_called_once_with(self.AUTH_TOKEN, "minion_name", "test.ping", {})
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_BATCHNODES": "minion1 minion_name",
+            "RD_JOB_EXECID": "42",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_batch_minion_not_targetted(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_batch_job = MagicMock(return_value=(self.OUTPUT_JID, ["minion1"]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_BATCHDIR": directory}):
+                with self.assertRaises(NodeStepException) as context:
+                    self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.failure_reason, 'SALT_TARGET_MISMATCH')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_BATCHNODES": "minion1,minion_name",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_batch_without_execution_id(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.submit_batch_job = MagicMock()
+
+        self.plugin.execute_node_step()
+
+        self.plugin.submit_batch_job.assert_not_called()
+        self.plugin.submit_job.assert_called_once_with(self.AUTH_TOKEN, self.PARAM_MINION_NAME, "test.ping", {})
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_EVENTSTREAM": "true",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_event_stream(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_event = MagicMock(return_value=self.HOST_RESPONSE)
+
+        self.plugin.execute_node_step()
+
+        self.plugin.wait_for_jid_event.assert_called_once_with(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+        self.plugin.wait_for_jid_response.assert_not_called()
+
+    def test_execute_with_runtime_history(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.json')
+            RuntimeHistory(path).record('test.ping', 400)
+
+            with mock.patch.dict(os.environ, {
+                    "RD_OPTION_SALT_API_EAUTH": "pam",
+                    "RD_OPTION_SALT_USER": "user",
+                    "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+                    "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+                    "RD_CONFIG_FUNCTION": "test.ping",
+                    "RD_CONFIG_RUNTIMEHISTORY": path,
+                    "RD_NODE_NAME": "minion_name",
+                    }):
+                self.plugin.execute_node_step()
+
+            self.assertIsInstance(self.plugin.timer, AdaptiveBackoffTimer)
+            self.assertEqual(self.plugin.timer.expected_delay, 400)
+            self.assertLess(RuntimeHistory(path).expected('test.ping'), 400)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_RUNTIMEHISTORY": "/nonexistent/history.json",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_unwritable_runtime_history(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        with mock.patch('util.runtime_history.locked_file', side_effect=PermissionError("Permission denied")):
+            with self.assertLogs('salt', level='WARNING') as logs:
+                self.plugin.execute_node_step()
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertTrue(all("runtime history" in line for line in logs.output))
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_JOBLOOKUP": "minions",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_job_lookup(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'JOBLOOKUP')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_STREAMINGDECODE": "true",
+            "RD_CONFIG_MAXRETURNSIZE": "1048576",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_streaming_decode(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = self.HOST_RESPONSE
+
+        self.plugin.execute_node_step()
+
+        self.assertTrue(self.plugin.streaming_decode)
+        self.assertEqual(self.plugin.max_return_size, 1048576)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_MAXRETURNSIZE": "1MB",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_max_return_size(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'MAXRETURNSIZE')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_POLLJITTER": "decorrelated",
+            "RD_CONFIG_JOBTIMEOUT": "1.5",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_job_timeout(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.side_effect = DeadlineExceeded("Gave up waiting after 1500 ms")
+
+        with self.assertRaises(NodeStepException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.failure_reason, 'JOB_TIMEOUT')
+        self.assertEqual(self.plugin.timer.jitter_mode, 'decorrelated')
+        self.assertEqual(self.plugin.timer.deadline, 1500)
+
+    def test_failure_reasons_are_known(self):
+        for exception_type, reason in FAILURE_REASONS:
+            self.assertEqual(SaltApiNodeStepFailureReason(reason, "message").error_type, reason)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_POLLJITTER": "random",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_poll_jitter(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'POLLJITTER')
+
+    def test_execute_with_step_metrics(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"pid": 42, "retcode": 3, "stdout": "", "stderr": ""}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'salt.prom')
+            env = {
+                "RD_OPTION_SALT_API_EAUTH": "pam",
+                "RD_OPTION_SALT_USER": "user",
+                "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+                "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+                "RD_CONFIG_FUNCTION": "cmd.run_all 'ls -l'",
+                "RD_CONFIG_STEPMETRICS": "true",
+                "RD_CONFIG_METRICSFILE": path,
+                "RD_NODE_NAME": "minion_name",
+            }
+
+            with mock.patch.dict(os.environ, env), self.assertLogs('salt', level='INFO') as logs:
+                with self.assertRaises(NodeStepException):
+                    self.plugin.execute_node_step()
+
+            with open(path) as f:
+                textfile = f.read()
+
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['node'], "minion_name")
+        self.assertEqual(report['function'], "cmd.run_all")
+        self.assertEqual(report['jid'], self.OUTPUT_JID)
+        self.assertEqual(report['result'], 'EXIT_CODE')
+        self.assertEqual(sorted(report['phases']), ['dispatch', 'output'])
+        self.assertIn('salt_node_steps_total{function="cmd.run_all",result="EXIT_CODE"} 1.0', textfile)
+
+    def test_execute_with_trace_file(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"pid": 42, "retcode": 0, "stdout": "", "stderr": ""}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'traces.jsonl')
+            env = {
+                "RD_OPTION_SALT_API_EAUTH": "pam",
+                "RD_OPTION_SALT_USER": "user",
+                "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+                "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+                "RD_CONFIG_FUNCTION": "cmd.run_all 'ls -l'",
+                "RD_CONFIG_TRACEEXPORTER": "file",
+                "RD_CONFIG_TRACEFILE": path,
+                "RD_NODE_NAME": "minion_name",
+                "TRACEPARENT": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+            }
+
+            with mock.patch.dict(os.environ, env):
+                self.plugin.execute_node_step()
+
+            with open(path) as f:
+                spans = json.loads(f.read())['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+        spans = {span['name']: span for span in spans}
+        self.assertEqual(sorted(spans), ['dispatch', 'node_step', 'output'])
+        self.assertEqual(spans['node_step']['traceId'], "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertEqual(spans['node_step']['parentSpanId'], "00f067aa0ba902b7")
+        self.assertEqual(spans['dispatch']['parentSpanId'], spans['node_step']['spanId'])
+        self.assertIn({"key": "salt.jid", "value": {"stringValue": self.OUTPUT_JID}}, spans['node_step']['attributes'])
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_TRACEEXPORTER": "file",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_trace_file_missing(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'TRACEFILE')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'uptime'",
+            "RD_CONFIG_RESULTCACHETTLS": "grains.items=300, cmd.*=60",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_result_cache_reuses_return(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"pid": 1, "retcode": 0, "stdout": "up 3 days", "stderr": ""}
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_RESULTCACHEDIR": directory}):
+                self.plugin.execute_node_step()
+                with self.assertLogs('salt', level='INFO') as logs:
+                    self.plugin.execute_node_step()
+
+        self.plugin.authenticate.assert_called_once_with()
+        self.plugin.submit_job.assert_called_once()
+        self.plugin.logoutQuietly.assert_called_once()
+        self.assertIn('INFO:salt:up 3 days', logs.output)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'uptime'",
+            "RD_CONFIG_RESULTCACHETTLS": "cmd.*=60",
+            "RD_CONFIG_STREAMINGDECODE": "true",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    @mock.patch('requests.Session.get')
+    def test_execute_with_result_cache_skips_streamed_return(self, mock_get):
+        body = json.dumps({"return": [{"minion_name": {"pid": 1, "retcode": 0, "stdout": "up 3 days", "stderr": ""}}]})
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.encoding = None
+        mock_get.return_value.iter_content.return_value = [body]
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.side_effect = lambda authToken, jid, minionId: self.plugin.extract_streamed_output_for_jid(authToken, jid, minionId)
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_RESULTCACHEDIR": directory}):
+                self.plugin.execute_node_step()
+                with self.assertLogs('salt', level='INFO') as logs:
+                    self.plugin.execute_node_step()
+
+        self.assertEqual(self.plugin.submit_job.call_count, 2)
+        self.assertIn('INFO:salt:up 3 days', logs.output)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "grains.items",
+            "RD_CONFIG_RESULTCACHETTLS": "grains.items=300",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_result_cache_checks_password(self):
+        self.plugin.authenticate.side_effect = [self.AUTH_TOKEN, None]
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"os": "Debian"}
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_RESULTCACHEDIR": directory}):
+                self.plugin.execute_node_step()
+                with mock.patch.dict(os.environ, {"RD_OPTION_SALT_PASSWORD": "WRONG"}):
+                    with self.assertRaises(NodeStepException) as context:
+                        self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.failure_reason, 'AUTHENTICATION_FAILURE')
+        self.assertEqual(self.plugin.authenticate.call_count, 2)
+        self.plugin.submit_job.assert_called_once()
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'uptime'",
+            "RD_CONFIG_RESULTCACHETTLS": "cmd.run_all=60",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_result_cache_skips_failed_return(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"pid": 1, "retcode": 1, "stdout": "", "stderr": "failed"}
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_RESULTCACHEDIR": directory}):
+                for i in range(2):
+                    with self.assertRaises(NodeStepException):
+                        self.plugin.execute_node_step()
+
+        self.assertEqual(self.plugin.submit_job.call_count, 2)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_RESULTCACHETTLS": "grains.items=300",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_result_cache_skips_functions_not_allowed(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = True
+
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.dict(os.environ, {"RD_CONFIG_RESULTCACHEDIR": directory}):
+                self.plugin.execute_node_step()
+                self.plugin.execute_node_step()
+
+        self.assertEqual(self.plugin.submit_job.call_count, 2)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "grains.items",
+            "RD_CONFIG_RESULTCACHEDIR": "/tmp",
+            "RD_CONFIG_RESULTCACHETTLS": "grains.items",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_result_cache_ttls(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'RESULTCACHETTLS')
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'uptime'",
+            "RD_CONFIG_REUSEJOBS": "300",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_reuses_recent_job(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.find_recent_job = MagicMock(return_value=(self.OUTPUT_JID, {"pid": 1, "retcode": 0, "stdout": "up 3 days", "stderr": ""}))
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.execute_node_step()
+
+        self.plugin.find_recent_job.assert_called_once_with(self.AUTH_TOKEN, "minion_name", "cmd.run_all 'uptime'")
+        self.plugin.submit_job.assert_not_called()
+        self.plugin.wait_for_jid_response.assert_not_called()
+        self.plugin.logoutQuietly.assert_called_once()
+        self.assertIn('INFO:salt:up 3 days', logs.output)
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_REUSEJOBS": "300",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_without_recent_job(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.find_recent_job = MagicMock(return_value=None)
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = True
+
+        self.plugin.execute_node_step()
+
+        self.plugin.find_recent_job.assert_called_once()
+        self.plugin.submit_job.assert_called_once()
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_SECUREOPTION_API_KEY": "s3cr3t",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'curl -H \"Key: s3cr3t\" https://example.com'",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_masks_secure_options_in_output(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        self.plugin.wait_for_jid_response.return_value = {"pid": 1, "retcode": 0, "stdout": "sent Key: s3cr3t", "stderr": "s3cr3t rejected"}
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.execute_node_step()
+
+        self.assertIn('INFO:salt:sent Key: ****', logs.output)
+        self.assertIn('INFO:salt:**** rejected', logs.output)
+        self.assertNotIn('s3cr3t', "\n".join(logs.output))
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_SECUREOPTION_API_KEY": "s3cr3t",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'cat /etc/app.conf'",
+            "RD_CONFIG_OUTPUTCHUNKSIZE": "16",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_masks_secure_options_cut_in_chunks(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        # The secret straddles the first two chunks of the line
+        self.plugin.wait_for_jid_response.return_value = {"pid": 1, "retcode": 0, "stdout": "api_key=xxxxxxs3cr3t-and-more-config", "stderr": ""}
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.execute_node_step()
+
+        messages = [record.getMessage() for record in logs.records]
+        self.assertEqual("".join(messages[messages.index("Received jid [output_jid] for submitted job") + 1:]),
+                         "api_key=xxxxxx****-and-more-config")
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'cat /var/log/syslog'",
+            "RD_CONFIG_OUTPUTTRUNCATION": "tail",
+            "RD_CONFIG_OUTPUTLIMIT": "18",
+            "RD_CONFIG_OUTPUTCHUNKSIZE": "1000",
+            "RD_CONFIG_OUTPUTSPOOLSIZE": "64",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_output_truncation(self):
+        self.plugin.authenticate.return_value = self.AUTH_TOKEN
+        self.plugin.submit_job.return_value = self.OUTPUT_JID
+        stdout = "".join("line %03d\n" % i for i in range(100))
+        self.plugin.wait_for_jid_response.return_value = {"pid": 1, "retcode": 0, "stdout": stdout, "stderr": ""}
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.execute_node_step()
+
+        self.assertIn('INFO:salt:[... 882 bytes of output truncated ...]', logs.output)
+        self.assertIn('INFO:salt:line 098\nline 099', logs.output)
+        self.assertNotIn('line 000', "\n".join(logs.output))
+
+    @mock.patch.dict(os.environ, {
+            "RD_OPTION_SALT_API_EAUTH": "pam",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_OPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_CONFIG_FUNCTION": "test.ping",
+            "RD_CONFIG_OUTPUTTRUNCATION": "middle",
+            "RD_NODE_NAME": "minion_name",
+        }
+    )
+    def test_execute_with_invalid_output_truncation(self):
+        with self.assertRaises(SaltStepValidationException) as context:
+            self.plugin.execute_node_step()
+
+        self.assertEqual(context.exception.fieldname, 'OUTPUTTRUNCATION')
@@ -1,11 +1,12 @@
 import sys, os
+import json
 import unittest
 from unittest.mock import MagicMock
 from unittest import mock
 
 sys.path.append(os.getcwd())
 from salt import SaltApiNodeStepPlugin
-from salt import SaltApiException
+from salt import SaltApiException, SaltApiAuthenticationException, SaltReturnResponseParseException
 
 
 class TestSaltApiNodeStepPlugin(unittest.TestCase):
@@ -26,7 +27,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         self.client = MagicMock()
         self.plugin.timer = MagicMock()
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_extract_output_for_jid(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"return": [{
@@ -36,12 +37,13 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
 
         self.assertEqual(result, self.HOST_RESPONSE)
+        mock_get.return_value.json.assert_called_once_with()
         mock_get.assert_called_once_with(
             self.PARAM_ENDPOINT+'/jobs/'+self.OUTPUT_JID,
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"}
         )
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_extract_output_for_jid_bad_response(self, mock_get):
         mock_get.return_value.status_code = 500
         mock_get.return_value.json.return_value = {}
@@ -54,7 +56,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"}
         )
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_extract_output_for_jid_host_empty_response(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"return": [{
@@ -69,7 +71,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"}
         )
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_extract_output_for_jid_no_response(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"return": [{}]}
@@ -82,7 +84,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"}
         )
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_extract_output_for_jid_multiple_responses(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"return": [{}, {}]}
@@ -94,3 +96,193 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             self.PARAM_ENDPOINT+'/jobs/'+self.OUTPUT_JID,
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"}
         )
+
+    @mock.patch('requests.Session.get')
+    def test_extract_output_for_jid_rejected_token(self, mock_get):
+        mock_get.return_value.status_code = 401
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    @mock.patch('requests.Session.post')
+    def test_extract_output_for_jid_with_runner_lookup(self, mock_post):
+        self.plugin.job_lookup = 'runner'
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [{
+            self.PARAM_MINION_NAME: self.HOST_RESPONSE
+        }]}
+
+        result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        mock_post.assert_called_once_with(
+            self.PARAM_ENDPOINT+'/',
+            headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json", "Content-Type": "application/json"},
+            data=json.dumps([{
+                "client": "runner",
+                "fun": "jobs.lookup_jid",
+                "jid": self.OUTPUT_JID,
+            }])
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_extract_output_for_jid_with_runner_lookup_not_returned(self, mock_post):
+        self.plugin.job_lookup = 'runner'
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [{}]}
+
+        result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertIsNone(result)
+
+    @mock.patch('requests.Session.post')
+    def test_extract_output_for_jid_with_runner_error(self, mock_post):
+        self.plugin.job_lookup = 'runner'
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": ["Exception occurred in runner jobs.lookup_jid: minion"]}
+
+        with self.assertRaises(SaltApiException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    def streamed_body(self, mock_response, document, chunk_size=5):
+        body = json.dumps(document)
+        mock_response.status_code = 200
+        mock_response.encoding = None
+        mock_response.iter_content.return_value = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.streamed_body(mock_get.return_value, {"return": [{
+            "other_minion": {"stdout": "other"},
+            self.PARAM_MINION_NAME: {"retcode": 0, "changes": {"a": [1, 2.5, None]}},
+        }]})
+
+        result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, {"retcode": 0, "changes": {"a": [1, 2.5, None]}})
+        mock_get.return_value.json.assert_not_called()
+        mock_get.return_value.close.assert_called_once_with()
+        mock_get.assert_called_once_with(
+            self.PARAM_ENDPOINT+'/jobs/'+self.OUTPUT_JID,
+            headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json"},
+            stream=True
+        )
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_logs_output(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.plugin.function = "cmd.run_all 'ls -l'"
+        self.streamed_body(mock_get.return_value, {"return": [{
+            self.PARAM_MINION_NAME: {"pid": 42, "retcode": 1, "stdout": "line 1\nline 2", "stderr": "error"},
+        }]})
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, {"pid": 42, "retcode": 1, "stdout": "", "stderr": ""})
+        self.assertEqual([record.getMessage() for record in logs.records], ["line 1", "line 2", "error"])
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_truncates_output(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.plugin.function = "cmd.run_all 'ls -l'"
+        self.plugin.output_truncation = 'head'
+        self.plugin.output_limit = 6
+        self.streamed_body(mock_get.return_value, {"return": [{
+            self.PARAM_MINION_NAME: {"pid": 42, "retcode": 1, "stdout": "line 1\nline 2", "stderr": "error"},
+        }]})
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, {"pid": 42, "retcode": 1, "stdout": "", "stderr": ""})
+        self.assertEqual([record.getMessage() for record in logs.records],
+                         ["line 1", "[... 7 bytes of output truncated ...]", "error"])
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_no_response(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.streamed_body(mock_get.return_value, {"return": [{"other_minion": "response"}]})
+
+        result = self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertIsNone(result)
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_multiple_responses(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.streamed_body(mock_get.return_value, {"return": [{}, {}]})
+
+        with self.assertRaises(SaltApiException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_exceeds_size(self, mock_get):
+        self.plugin.streaming_decode = True
+        self.plugin.max_return_size = 100
+        self.streamed_body(mock_get.return_value, {"return": [{self.PARAM_MINION_NAME: "x" * 101}]})
+
+        with self.assertRaises(SaltReturnResponseParseException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        mock_get.return_value.close.assert_called_once_with()
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_malformed(self, mock_get):
+        self.plugin.streaming_decode = True
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.iter_content.return_value = ['{"return": [{"minion": "respo']
+
+        with self.assertRaises(SaltReturnResponseParseException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    @mock.patch('requests.Session.get')
+    def test_extract_streamed_output_for_jid_rejected_token(self, mock_get):
+        self.plugin.streaming_decode = True
+        mock_get.return_value.status_code = 401
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.extract_output_for_jid(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    @mock.patch('requests.Session.post')
+    def test_lookup_jobs_with_runner_lookup(self, mock_post):
+        self.plugin.job_lookup = 'runner'
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [
+            {self.PARAM_MINION_NAME: self.HOST_RESPONSE},
+            {},
+            "Exception occurred in runner jobs.lookup_jid: minion",
+        ]}
+
+        result = self.plugin.lookup_jobs(self.AUTH_TOKEN, ["1", "2", "3"])
+
+        self.assertEqual(result["1"], {self.PARAM_MINION_NAME: self.HOST_RESPONSE})
+        self.assertEqual(result["2"], {})
+        self.assertIsInstance(result["3"], SaltApiException)
+        mock_post.assert_called_once_with(
+            self.PARAM_ENDPOINT+'/',
+            headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json", "Content-Type": "application/json"},
+            data=json.dumps([{"client": "runner", "fun": "jobs.lookup_jid", "jid": jid} for jid in ["1", "2", "3"]])
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_lookup_jobs_with_runner_lookup_rejected_token(self, mock_post):
+        self.plugin.job_lookup = 'runner'
+        mock_post.return_value.status_code = 401
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.lookup_jobs(self.AUTH_TOKEN, ["1", "2"])
+
+    @mock.patch('requests.Session.get')
+    def test_lookup_jobs_with_jobs_lookup(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"return": [{
+            self.PARAM_MINION_NAME: self.HOST_RESPONSE
+        }]}
+
+        result = self.plugin.lookup_jobs(self.AUTH_TOKEN, ["1", "2"])
+
+        self.assertEqual(result, {"1": {self.PARAM_MINION_NAME: self.HOST_RESPONSE},
+                                  "2": {self.PARAM_MINION_NAME: self.HOST_RESPONSE}})
+        self.assertEqual(mock_get.call_count, 2)
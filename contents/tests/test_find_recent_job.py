@@ -0,0 +1,131 @@
+import sys, os
+import json
+import time
+import unittest
+from unittest.mock import MagicMock
+from unittest import mock
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin
+from salt import SaltApiAuthenticationException
+
+
+class TestFindRecentJob(unittest.TestCase):
+
+    def setUp(self):
+
+        self.PARAM_ENDPOINT = "https://localhost"
+        self.PARAM_MINION_NAME = "minion"
+        self.PARAM_FUNCTION = "pkg.version nginx"
+        self.PARAM_USER = "user"
+        self.PARAM_PASSWORD = "password&!@$*"
+        self.AUTH_TOKEN = "123qwe"
+        self.OUTPUT_JID = "20130213093536481553"
+        self.OLDER_JID = "20130213093000000000"
+        self.HOST_RESPONSE = "1.24.0-2"
+
+        self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD)
+        self.plugin.job_lookup = 'runner'
+        self.plugin.reuse_jobs = 300
+
+    def job(self, target=None, arguments=None, function='pkg.version'):
+        return {
+            "Function": function,
+            "Arguments": ["nginx"] if arguments is None else arguments,
+            "Target": target or self.PARAM_MINION_NAME,
+            "Target-type": "glob",
+            "User": self.PARAM_USER,
+            "StartTime": "2013, Feb 13 09:35:36.481553",
+        }
+
+    def response(self, status_code, document=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.json.return_value = document
+        return response
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job(self, mock_post):
+        mock_post.side_effect = [
+            self.response(200, {"return": [{self.OLDER_JID: self.job(), self.OUTPUT_JID: self.job()}]}),
+            self.response(200, {"return": [{self.PARAM_MINION_NAME: self.HOST_RESPONSE}, {}]}),
+        ]
+
+        with mock.patch('time.time', return_value=1360748400.0):
+            result = self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+        self.assertEqual(result, (self.OUTPUT_JID, self.HOST_RESPONSE))
+        since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(1360748400.0 - 300))
+        self.assertEqual(json.loads(mock_post.call_args_list[0][1]['data']), [{
+            "client": "runner",
+            "fun": "jobs.list_jobs",
+            "search_function": "pkg.version",
+            "search_target": self.PARAM_MINION_NAME,
+            "start_time": since,
+        }])
+        self.assertEqual(json.loads(mock_post.call_args_list[1][1]['data']), [
+            {"client": "runner", "fun": "jobs.lookup_jid", "jid": self.OUTPUT_JID},
+            {"client": "runner", "fun": "jobs.lookup_jid", "jid": self.OLDER_JID},
+        ])
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job_failed(self, mock_post):
+        failed = {"pid": 42, "retcode": 3, "stdout": "", "stderr": "failed"}
+        mock_post.side_effect = [
+            self.response(200, {"return": [{self.OLDER_JID: self.job(arguments=['false'], function='cmd.run_all'), self.OUTPUT_JID: self.job(arguments=['false'], function='cmd.run_all')}]}),
+            self.response(200, {"return": [{self.PARAM_MINION_NAME: failed}, {self.PARAM_MINION_NAME: dict(failed, retcode=0)}]}),
+        ]
+
+        result = self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, "cmd.run_all false")
+
+        self.assertIsNone(result)
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job_not_returned(self, mock_post):
+        mock_post.side_effect = [
+            self.response(200, {"return": [{self.OUTPUT_JID: self.job()}]}),
+            self.response(200, {"return": [{}]}),
+        ]
+
+        result = self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+        self.assertIsNone(result)
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job_none_matching(self, mock_post):
+        mock_post.return_value = self.response(200, {"return": [{
+            "1": self.job(arguments=["apache2"]),
+            "2": self.job(target="minion*"),
+            "3": self.job(target=[self.PARAM_MINION_NAME, "other"]),
+            "4": self.job(function="pkg.latest_version"),
+        }]})
+
+        result = self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+        self.assertIsNone(result)
+        mock_post.assert_called_once()
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job_without_runner_permission(self, mock_post):
+        mock_post.return_value = self.response(200, {"return": ["Permission denied for jobs.list_jobs"]})
+
+        result = self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+        self.assertIsNone(result)
+
+    @mock.patch('requests.Session.post')
+    def test_find_recent_job_rejected_token(self, mock_post):
+        mock_post.return_value = self.response(401)
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.find_recent_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+    def test_same_job_keyword_arguments(self):
+        job = self.job(arguments=["nginx", {"__kwarg__": True, "refresh": "true"}])
+
+        self.assertTrue(SaltApiNodeStepPlugin.same_job(job, self.PARAM_MINION_NAME, ["pkg.version", "nginx", "refresh=true"]))
+        self.assertFalse(SaltApiNodeStepPlugin.same_job(job, self.PARAM_MINION_NAME, ["pkg.version", "nginx"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import sys, os
+import subprocess
+import unittest
+
+sys.path.append(os.getcwd())
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    salt.py is started in a fresh interpreter for every node, so importing it must stay cheap.
+    """
+
+    def setUp(self):
+        # Cumulative import time of salt.py in microseconds. Importing requests alone takes well over this.
+        self.IMPORT_BUDGET = 100000
+        self.DEFERRED_MODULES = ['requests', 'urllib3', 'charset_normalizer', 'idna',
+                                 'util.http_session', 'util.token_cache', 'util.batch_coordinator', 'util.file_lock',
+                                 'util.event_stream', 'util.runtime_history', 'util.adaptive_backoff_timer',
+                                 'util.json_stream', 'util.line_emitter', 'util.dispatcher_client', 'util.tracing',
+                                 'util.result_cache', 'util.output_spool']
+
+    def import_salt(self):
+        """
+        Imports salt.py with -X importtime.
+        :return a dict of the modules the import loaded to their cumulative import time.
+        """
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import salt'],
+                                cwd=os.getcwd(), capture_output=True, text=True, check=True)
+
+        imported = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not name.startswith('  '):
+                # A top level import, the ones listed before it were imported by it
+                if name.strip() == 'salt':
+                    imported['salt'] = int(cumulative)
+                    return imported
+                imported = {}
+                continue
+            imported[name.strip()] = int(cumulative)
+
+        self.fail("salt was not imported: %s" % result.stderr)
+
+    def test_defers_heavy_imports(self):
+        imported = self.import_salt()
+
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, imported)
+
+    def test_import_time_within_budget(self):
+        # The best of a few runs, to not fail on a busy machine
+        cumulative = min(self.import_salt()['salt'] for _ in range(3))
+
+        self.assertLess(cumulative, self.IMPORT_BUDGET)
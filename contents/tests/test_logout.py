@@ -23,7 +23,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_logout(self, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {}
@@ -36,7 +36,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             headers={"X-Auth-Token": self.AUTH_TOKEN}
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_logout_throws_IOException_remains_quiet(self, mock_post):
         mock_post.side_effect = ConnectionError('test ConnectionError')
 
@@ -44,7 +44,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         self.assertIsNone(result)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_logout_throws_interrupted_exception_remains_quiet(self, mock_post):
         mock_post.side_effect = InterruptedError('test InterruptedError')
 
@@ -0,0 +1,73 @@
+import sys, os
+import unittest
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin
+from salt import NodeStepException
+from util.step_context import StepContext
+from benchmarks.fake_salt_api import FakeSaltApi
+
+
+class NodeStepRequestsTest(unittest.TestCase):
+    """
+    Runs node steps against the fake salt-api of the benchmarks, counting the requests they make.
+    """
+
+    def setUp(self):
+        self.server = FakeSaltApi().start()
+        self.PARAM_MINION_NAME = 'minion'
+        self.optionData = {
+            'SALT_API_END_POINT': self.server.endpoint,
+            'SALT_API_EAUTH': 'pam',
+            'SALT_USER': 'user',
+            'SALT_PASSWORD': 'password',
+        }
+        self.config = {'FUNCTION': 'cmd.run_all "echo hello"'}
+        self.node = {'NAME': self.PARAM_MINION_NAME}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_step(self, config=None):
+        SaltApiNodeStepPlugin().run_step(StepContext(self.optionData, {}, dict(self.config, **(config or {})), self.node))
+
+    def test_polled_step_requests(self):
+        self.run_step()
+
+        self.assertEqual(self.server.stats(), {'/login': 1, '/minions': 1, '/jobs': 1, '/logout': 1})
+
+    def test_runner_lookup_step_requests(self):
+        self.run_step({'JOBLOOKUP': 'runner'})
+
+        self.assertEqual(self.server.stats(), {'/login': 1, '/minions': 1, '/': 1, '/logout': 1})
+
+    def test_event_stream_step_requests(self):
+        self.server.job_duration = 0.2
+
+        self.run_step({'EVENTSTREAM': 'true'})
+
+        # The job resource is read once, in case the job returned before the subscription
+        self.assertEqual(self.server.stats(), {'/login': 1, '/minions': 1, '/events': 1, '/jobs': 1, '/logout': 1})
+
+    def test_reused_job_step_requests(self):
+        self.run_step({'JOBLOOKUP': 'runner'})
+        self.server.stats(reset=True)
+
+        self.run_step({'JOBLOOKUP': 'runner', 'REUSEJOBS': '300'})
+
+        # jobs.list_jobs then jobs.lookup_jid, without running the function again
+        self.assertEqual(self.server.stats(), {'/login': 1, '/': 2, '/logout': 1})
+
+    def test_failed_step(self):
+        self.config = {'FUNCTION': 'cmd.run_all "exit 1"'}
+        self.server.minion_return = lambda function, minionId: {"pid": 1, "retcode": 1, "stdout": "", "stderr": "failed"}
+
+        with self.assertRaises(NodeStepException) as context:
+            self.run_step()
+
+        self.assertEqual(context.exception.failure_reason, 'EXIT_CODE')
+        self.assertEqual(self.server.stats()['/logout'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
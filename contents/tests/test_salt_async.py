@@ -0,0 +1,159 @@
+import sys, os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin, SaltApiAuthenticationException, SaltTargettingMismatchException, NodeStepException
+from salt_async import AsyncSaltApiClient, run_nodes
+from util.exponential_backoff_timer import ExponentialBackoffTimer
+from util.adaptive_backoff_timer import AdaptiveBackoffTimer
+
+
+class TestAsyncSaltApiClient(unittest.TestCase):
+
+    def setUp(self):
+
+        self.PARAM_ENDPOINT = "https://localhost"
+        self.PARAM_EAUTH = "pam"
+        self.PARAM_FUNCTION = "cmd.run_all 'ls -l'"
+        self.PARAM_USER = "user"
+        self.PARAM_PASSWORD = "password&!@$*"
+        self.AUTH_TOKEN = "123qwe"
+        self.MINIONS = [f"minion{i}" for i in range(6)]
+
+        self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD, self.PARAM_EAUTH)
+        self.plugin.function = self.PARAM_FUNCTION
+        self.plugin.timer = ExponentialBackoffTimer(1, 1)
+        self.plugin.acquire_token = MagicMock(return_value=self.AUTH_TOKEN)
+        self.plugin.release_token = MagicMock()
+        self.plugin.refresh_token = MagicMock(return_value="refreshed")
+        self.plugin.submit_jobs = MagicMock(side_effect=lambda authToken, jobs, secure: ["jid-" + minionId for minionId, function in jobs])
+        self.plugin.lookup_jobs = MagicMock(side_effect=self.lookup_jobs)
+
+    def host_response(self, minionId):
+        return {"pid": 42, "retcode": 0, "stdout": "output of " + minionId, "stderr": ""}
+
+    def lookup_jobs(self, authToken, jids):
+        return {jid: {jid[4:]: self.host_response(jid[4:])} for jid in jids}
+
+    def test_runs_all_nodes_with_one_token(self):
+        results = run_nodes(self.plugin, self.MINIONS, concurrency=3)
+
+        self.assertEqual(sorted(results), self.MINIONS)
+        for minionId, result in results.items():
+            self.assertTrue(result.succeeded)
+            self.assertEqual(result.jid, "jid-" + minionId)
+            self.assertEqual(result.output, "output of " + minionId)
+            self.assertEqual(result.exit_code, 0)
+
+        self.plugin.acquire_token.assert_called_once_with()
+        self.plugin.release_token.assert_called_once_with(self.AUTH_TOKEN)
+        self.plugin.submit_jobs.assert_any_call(self.AUTH_TOKEN, [("minion0", self.PARAM_FUNCTION), ("minion1", self.PARAM_FUNCTION), ("minion2", self.PARAM_FUNCTION)], {})
+
+    def test_submits_nodes_passing_concurrency_limit_together(self):
+        results = run_nodes(self.plugin, self.MINIONS, concurrency=6)
+
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.plugin.submit_jobs.assert_called_once_with(self.AUTH_TOKEN, [(minionId, self.PARAM_FUNCTION) for minionId in self.MINIONS], {})
+
+    def test_limits_concurrency(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def slow_submit(authToken, jobs, secure):
+            with lock:
+                active[0] += len(jobs)
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= len(jobs)
+            return ["jid-" + minionId for minionId, function in jobs]
+
+        self.plugin.submit_jobs.side_effect = slow_submit
+
+        run_nodes(self.plugin, self.MINIONS, concurrency=2)
+
+        self.assertEqual(active[1], 2)
+
+    def test_polls_all_jobs_together_until_returned(self):
+        # The first poll waits for all the jobs to be submitted
+        self.plugin.timer = AdaptiveBackoffTimer(10, 10, 100, jitter=0)
+
+        def not_returned_twice(authToken, jids):
+            if self.plugin.lookup_jobs.call_count <= 2:
+                return {jid: {} for jid in jids}
+            return self.lookup_jobs(authToken, jids)
+
+        self.plugin.lookup_jobs.side_effect = not_returned_twice
+
+        results = run_nodes(self.plugin, self.MINIONS)
+
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.assertEqual(self.plugin.lookup_jobs.call_count, 3)
+        self.assertEqual(sorted(self.plugin.lookup_jobs.call_args[0][1]), ["jid-" + minionId for minionId in self.MINIONS])
+
+    def test_refreshes_token_rejected_while_polling(self):
+        def reject_first_token(authToken, jids):
+            if authToken == self.AUTH_TOKEN:
+                raise SaltApiAuthenticationException("rejected")
+            return self.lookup_jobs(authToken, jids)
+
+        self.plugin.lookup_jobs.side_effect = reject_first_token
+
+        results = run_nodes(self.plugin, self.MINIONS)
+
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.plugin.refresh_token.assert_called_once_with(self.AUTH_TOKEN)
+
+    def test_refreshes_rejected_token_once(self):
+        def reject_first_token(authToken, jobs, secure):
+            if authToken == self.AUTH_TOKEN:
+                time.sleep(0.02)
+                raise SaltApiAuthenticationException("rejected")
+            return ["jid-" + minionId for minionId, function in jobs]
+
+        self.plugin.submit_jobs.side_effect = reject_first_token
+
+        results = run_nodes(self.plugin, self.MINIONS, concurrency=6)
+
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.plugin.refresh_token.assert_called_once_with(self.AUTH_TOKEN)
+        self.plugin.release_token.assert_called_once_with("refreshed")
+
+    def test_records_node_failures(self):
+        def failing_minions(authToken, jobs, secure):
+            return [SaltTargettingMismatchException("no minion") if minionId == "minion1" else "jid-" + minionId
+                    for minionId, function in jobs]
+
+        def failing_commands(authToken, jids):
+            lookups = self.lookup_jobs(authToken, jids)
+            for minion_responses in lookups.values():
+                minion_responses.get("minion2", {})["retcode"] = 2
+            return lookups
+
+        self.plugin.submit_jobs.side_effect = failing_minions
+        self.plugin.lookup_jobs.side_effect = failing_commands
+
+        results = run_nodes(self.plugin, self.MINIONS)
+
+        self.assertEqual(results["minion1"].failure_reason, 'SALT_TARGET_MISMATCH')
+        self.assertEqual(results["minion2"].failure_reason, 'EXIT_CODE')
+        self.assertEqual(results["minion2"].exit_code, 2)
+        self.assertEqual([minionId for minionId, result in results.items() if result.succeeded],
+                         ["minion0", "minion3", "minion4", "minion5"])
+
+    def test_authentication_failure(self):
+        self.plugin.acquire_token.return_value = None
+
+        with self.assertRaises(NodeStepException) as context:
+            run_nodes(self.plugin, self.MINIONS)
+
+        self.assertEqual(context.exception.failure_reason, 'AUTHENTICATION_FAILURE')
+        self.plugin.submit_jobs.assert_not_called()
+
+    def test_grows_connection_pool_to_concurrency(self):
+        AsyncSaltApiClient(self.plugin, concurrency=32)
+
+        self.assertEqual(self.plugin.session.pool_size, 32)
@@ -0,0 +1,149 @@
+import sys, os
+import logging
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin, NodeStepException
+from salt_dispatcher import SaltDispatcher, DispatcherServer
+from util.dispatcher_client import dispatch
+from util.step_context import StepContext
+
+
+class TestSaltDispatcher(unittest.TestCase):
+
+    def setUp(self):
+
+        self.PARAM_ENDPOINT = "https://localhost"
+        self.AUTH_TOKEN = "123qwe"
+        self.OUTPUT_JID = "20130213093536481553"
+        self.OPTIONS = {
+            "SALT_API_EAUTH": "pam",
+            "SALT_USER": "user",
+            "SALT_PASSWORD": "password&!@$*",
+            "SALT_API_END_POINT": self.PARAM_ENDPOINT,
+        }
+
+        self.logger = logging.getLogger('salt')
+        self.level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, 'dispatcher.sock')
+        self.dispatcher = SaltDispatcher(group_window=100)
+        self.server = DispatcherServer(self.socket_path, self.dispatcher)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.retcodes = {}
+        self.patches = [
+            mock.patch.object(SaltApiNodeStepPlugin, 'authenticate', return_value=self.AUTH_TOKEN),
+            mock.patch.object(SaltApiNodeStepPlugin, 'dispatch_job', side_effect=self.dispatch_job),
+            mock.patch.object(SaltApiNodeStepPlugin, 'lookup_jobs', side_effect=self.lookup_jobs),
+            mock.patch.object(SaltApiNodeStepPlugin, 'logoutQuietly'),
+        ]
+        self.authenticate, self.dispatch_job_mock, self.lookup_jobs_mock, self.logout = [patch.start() for patch in self.patches]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dispatcher.close()
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.directory)
+        self.logger.setLevel(self.level)
+
+    def dispatch_job(self, authToken, lowstate):
+        target = lowstate[0]['tgt']
+        return {"jid": self.OUTPUT_JID, "minions": target if isinstance(target, list) else [target]}
+
+    def lookup_jobs(self, authToken, jids):
+        minions = ["minion%d" % i for i in range(4)]
+        return {jid: {minionId: {"pid": 42, "retcode": self.retcodes.get(minionId, 0), "stdout": "output of " + minionId, "stderr": ""}
+                      for minionId in minions}
+                for jid in jids}
+
+    def context(self, minionId, function="cmd.run_all 'ls -l'"):
+        return StepContext(self.OPTIONS, {}, {"FUNCTION": function}, {"NAME": minionId}).to_dict()
+
+    def dispatch_all(self, minionIds):
+        results = {}
+        logs = {}
+
+        def run(minionId):
+            logs[minionId] = []
+            results[minionId] = dispatch(self.socket_path, {"context": self.context(minionId)},
+                                         lambda level, message: logs[minionId].append(message))
+
+        threads = [threading.Thread(target=run, args=(minionId,)) for minionId in minionIds]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results, logs
+
+    def test_shares_token_submission_and_poll(self):
+        results, logs = self.dispatch_all(["minion1", "minion2", "minion3"])
+
+        self.assertEqual(results, {"minion1": {}, "minion2": {}, "minion3": {}})
+        for minionId in results:
+            self.assertIn("output of " + minionId, logs[minionId])
+
+        self.authenticate.assert_called_once_with()
+        self.dispatch_job_mock.assert_called_once()
+        params, printable_params = self.dispatch_job_mock.call_args[0][1]
+        self.assertEqual(params['tgt_type'], 'list')
+        self.assertEqual(sorted(params['tgt']), ["minion1", "minion2", "minion3"])
+        self.lookup_jobs_mock.assert_called_once_with(self.AUTH_TOKEN, [self.OUTPUT_JID])
+        self.logout.assert_not_called()
+
+    def test_reports_failures_per_step(self):
+        self.retcodes["minion2"] = 3
+
+        results, logs = self.dispatch_all(["minion1", "minion2"])
+
+        self.assertEqual(results["minion1"], {})
+        self.assertEqual(results["minion2"]["failure_reason"], 'EXIT_CODE')
+
+    def test_reports_minions_not_targetted(self):
+        self.dispatch_job_mock.side_effect = lambda authToken, lowstate: {"jid": self.OUTPUT_JID, "minions": ["minion1"]}
+
+        results, logs = self.dispatch_all(["minion1", "minion2"])
+
+        self.assertEqual(results["minion1"], {})
+        self.assertEqual(results["minion2"]["failure_reason"], 'SALT_TARGET_MISMATCH')
+
+    def test_logs_out_when_closed(self):
+        self.dispatch_all(["minion1"])
+
+        self.dispatcher.close()
+
+        self.logout.assert_called_once_with(self.AUTH_TOKEN)
+
+    def test_execute_dispatched_node_step(self):
+        self.retcodes["minion1"] = 1
+        env = {"RD_OPTION_" + name: value for name, value in self.OPTIONS.items()}
+        env.update({"RD_CONFIG_FUNCTION": "cmd.run_all 'ls -l'", "RD_NODE_NAME": "minion1"})
+
+        with mock.patch.dict(os.environ, env), self.assertLogs('salt', level='INFO') as logs:
+            # assertLogs replaced the handlers of the logger the dispatcher forwards from
+            self.logger.addHandler(self.dispatcher.forwarder)
+            with self.assertRaises(NodeStepException) as context:
+                SaltApiNodeStepPlugin().execute_dispatched_node_step(self.socket_path)
+
+        self.assertEqual(context.exception.failure_reason, 'EXIT_CODE')
+        self.assertIn("output of minion1", [record.getMessage() for record in logs.records])
+
+    def test_falls_back_when_not_running(self):
+        with mock.patch.dict(os.environ, {"RD_NODE_NAME": "minion1"}):
+            handed_over = SaltApiNodeStepPlugin().execute_dispatched_node_step(os.path.join(self.directory, 'none.sock'))
+
+        self.assertFalse(handed_over)
+
+    def test_refuses_second_dispatcher(self):
+        with self.assertRaises(RuntimeError):
+            DispatcherServer(self.socket_path, SaltDispatcher())
@@ -0,0 +1,197 @@
+import sys, os
+import time
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from output import salt_return_handler_registry as registry
+from output.salt_return_handler_registry import returnHandlerRegistry, ReturnHandler, register
+
+
+class TestReturnHandlerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.handlers = dict(registry._handlers)
+        self.patterns = list(registry._patterns)
+        self.entry_points_loaded = registry._entry_points_loaded
+        registry._entry_points_loaded = True
+
+    def tearDown(self):
+        registry._handlers.clear()
+        registry._handlers.update(self.handlers)
+        registry._patterns[:] = self.patterns
+        registry._entry_points_loaded = self.entry_points_loaded
+
+    def handle(self, function, raw_response, return_handler=None):
+        handler = returnHandlerRegistry(function, return_handler)
+        handler.extract_response(raw_response)
+        return handler.get_standard_output(), handler.get_standard_error(), handler.get_exit_code()
+
+    def test_cmd_run_all(self):
+        result = self.handle('cmd.run_all', {"pid": 42, "retcode": 2, "stdout": "out", "stderr": "err"})
+
+        self.assertEqual(result, ("out", "err", 2))
+
+    def test_cmd_run(self):
+        self.assertEqual(self.handle('cmd.run', "out"), ("out", None, 0))
+
+    def test_test_ping(self):
+        self.assertEqual(self.handle('test.ping', True), (None, None, 0))
+
+    def test_unknown_function(self):
+        self.assertEqual(self.handle('grains.items', {"os": "Debian"}), (None, None, 0))
+
+    def test_default_handler(self):
+        default = MagicMock()
+
+        returnHandlerRegistry('grains.items', default)
+
+        default.assert_called_once_with()
+
+    def test_pkg_install(self):
+        result = self.handle('pkg.install', {"vim": {"old": "", "new": "2:9.0"}, "curl": {"old": "7.1", "new": "7.2"}})
+
+        self.assertEqual(result, ("vim: - -> 2:9.0\ncurl: 7.1 -> 7.2", None, 0))
+
+    def test_pkg_install_error(self):
+        self.assertEqual(self.handle('pkg.install', "Unable to locate package nope"), (None, "Unable to locate package nope", 1))
+
+    def test_registers_with_decorator(self):
+        @register('custom.function')
+        class CustomReturnHandler(ReturnHandler):
+            __slots__ = ()
+
+            def extract_response(self, raw_response):
+                self.output = raw_response.upper()
+
+        self.assertEqual(self.handle('custom.function', "out"), ("OUT", None, 0))
+
+    def test_falls_back_to_glob(self):
+        @register('custom.*')
+        class CustomReturnHandler(ReturnHandler):
+            __slots__ = ()
+
+            def extract_response(self, raw_response):
+                self.output = "glob"
+
+        @register('custom.exact')
+        class ExactReturnHandler(ReturnHandler):
+            __slots__ = ()
+
+            def extract_response(self, raw_response):
+                self.output = "exact"
+
+        self.assertEqual(self.handle('custom.anything', None)[0], "glob")
+        self.assertEqual(self.handle('custom.exact', None)[0], "exact")
+        self.assertEqual(self.handle('customs.anything', None)[0], None)
+
+    def test_loads_entry_points_once(self):
+        class EntryPointReturnHandler(ReturnHandler):
+            __slots__ = ()
+
+            def extract_response(self, raw_response):
+                self.output = "entry point"
+
+        entry_point = MagicMock()
+        entry_point.name = 'custom.function'
+        entry_point.load.return_value = EntryPointReturnHandler
+        broken = MagicMock()
+        broken.name = 'custom.broken'
+        broken.load.side_effect = ImportError("no module")
+        registry._entry_points_loaded = False
+
+        with mock.patch('importlib.metadata.entry_points', return_value=[entry_point, broken]) as entry_points:
+            with self.assertLogs('output.salt_return_handler_registry', level='WARNING'):
+                self.assertEqual(self.handle('custom.function', None)[0], "entry point")
+            self.handle('other.function', None)
+
+        entry_points.assert_called_once_with(group=registry.ENTRY_POINT_GROUP)
+
+    def test_handlers_have_no_instance_dict(self):
+        handler = returnHandlerRegistry('cmd.run_all', None)
+
+        self.assertFalse(hasattr(handler, '__dict__'))
+        self.assertFalse(hasattr(handler.handler, '__dict__'))
+
+
+class TestStateReturnHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.STATE_COUNT = 50000
+        # In seconds, summarising the synthetic return takes well under a tenth of it
+        self.SUMMARY_BUDGET = 1.0
+
+    def state(self, i, result=True, changes=None, comment="Already in the desired state"):
+        key = "file_|-state%d_|-/etc/file%d_|-managed" % (i, i)
+        return key, {"__id__": "state%d" % i, "name": "/etc/file%d" % i, "result": result, "comment": comment,
+                     "changes": changes or {}, "duration": 2.0, "__run_num__": i, "start_time": "10:00:00.000000"}
+
+    def handle(self, raw_response):
+        handler = returnHandlerRegistry('state.apply', None)
+        handler.extract_response(raw_response)
+        return handler
+
+    def test_summarises_states(self):
+        handler = self.handle(dict([
+            self.state(0),
+            self.state(1, changes={"diff": "New file"}),
+            self.state(2, result=None, changes={"diff": "New file"}),
+        ]))
+
+        self.assertEqual(handler.get_standard_output(),
+                         "Succeeded: 3 (changed=2), Failed: 0, Total states run: 3, Total run time: 0.006 s")
+        self.assertIsNone(handler.get_standard_error())
+        self.assertEqual(handler.get_exit_code(), 0)
+
+    def test_reports_failed_states_only(self):
+        handler = self.handle(dict([
+            self.state(0),
+            self.state(1, result=False, comment="Source file not found"),
+        ]))
+
+        self.assertEqual(handler.get_standard_output(),
+                         "Succeeded: 1 (changed=0), Failed: 1, Total states run: 2, Total run time: 0.004 s")
+        self.assertEqual(handler.get_standard_error(), "Failed: state1 (file.managed): Source file not found")
+        self.assertEqual(handler.get_exit_code(), 2)
+
+    def test_render_errors(self):
+        handler = self.handle(["Rendering SLS 'base:web' failed: mapping values are not allowed here"])
+
+        self.assertEqual(handler.get_standard_error(), "Rendering SLS 'base:web' failed: mapping values are not allowed here")
+        self.assertEqual(handler.get_exit_code(), 1)
+
+    def test_handles_all_state_functions(self):
+        for function in ['state.apply', 'state.highstate', 'state.sls', 'state.single', 'state.sls_id', 'state.orchestrate']:
+            self.assertIsInstance(returnHandlerRegistry(function, None).handler, registry.StateReturnHandler)
+
+    def test_state_listings_keep_default_handler(self):
+        returns = {
+            'state.running': [],
+            'state.show_lowstate': [{"state": "file", "__id__": "state0", "fun": "managed"}],
+            'state.show_top': {"base": ["web"]},
+            'state.sls_exists': True,
+        }
+
+        for function, raw_response in returns.items():
+            handler = returnHandlerRegistry(function, None)
+            handler.extract_response(raw_response)
+
+            self.assertIs(type(handler.handler), registry.ReturnHandler)
+            self.assertEqual(handler.get_exit_code(), 0)
+
+    def test_summarises_large_return_within_budget(self):
+        raw_response = dict(self.state(i, result=i % 1000 != 0, changes={"diff": "changed"} if i % 10 == 0 else None)
+                            for i in range(self.STATE_COUNT))
+
+        # The best of a few runs, to not fail on a busy machine
+        elapsed = []
+        for _ in range(3):
+            started = time.perf_counter()
+            handler = self.handle(raw_response)
+            elapsed.append(time.perf_counter() - started)
+
+        self.assertEqual(handler.handler.failed, self.STATE_COUNT // 1000)
+        self.assertEqual(handler.handler.changed, self.STATE_COUNT // 10)
+        self.assertEqual(len(handler.get_standard_error().splitlines()), self.STATE_COUNT // 1000)
+        self.assertLess(min(elapsed), self.SUMMARY_BUDGET)
@@ -5,7 +5,7 @@ from unittest import mock
 
 sys.path.append(os.getcwd())
 from salt import SaltApiNodeStepPlugin
-from salt import SaltTargettingMismatchException
+from salt import SaltTargettingMismatchException, SaltApiAuthenticationException
 
 
 class TestSaltApiNodeStepPlugin(unittest.TestCase):
@@ -24,7 +24,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD, self.PARAM_EAUTH)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job(self, mock_post):
         mock_post.return_value.status_code = 202
         mock_post.return_value.json.return_value = {"return": [{
@@ -41,6 +41,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         result = self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
 
         self.assertEqual(result, self.OUTPUT_JID)
+        mock_post.return_value.json.assert_called_once_with()
         mock_post.assert_called_once_with(
             self.PARAM_ENDPOINT+'/minions',
             headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json", "Content-Type": "application/json"},
@@ -50,7 +51,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             })
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_with_args(self, mock_post):
         mock_post.return_value.status_code = 202
         mock_post.return_value.json.return_value = {"return": [{
@@ -81,7 +82,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             })
         )
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_response_code_error(self, mock_post):
         mock_post.return_value.status_code = 307
         mock_post.return_value.json.return_value = {}
@@ -89,7 +90,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         with self.assertRaises(Exception):
             self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_no_minions_matched(self, mock_post):
         mock_post.return_value.status_code = 202
         mock_post.return_value.json.return_value = {"return": [{
@@ -102,7 +103,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         with self.assertRaises(SaltTargettingMismatchException):
             self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_minion_count_mismatch(self, mock_post):
         mock_post.return_value.status_code = 202
         mock_post.return_value.json.return_value = {"return": [{
@@ -120,7 +121,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         with self.assertRaises(SaltTargettingMismatchException):
             self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_minion_id_mismatch(self, mock_post):
         mock_post.return_value.status_code = 202
         mock_post.return_value.json.return_value = {"return": [{
@@ -137,7 +138,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
         with self.assertRaises(SaltTargettingMismatchException):
             self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_submit_job_hides_secure_options(self, mock_post):
 
         secret = ("greatgooglymoogly5f5DEyIKEyde\n"
@@ -189,18 +190,7 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
             })
         )
 
-    @mock.patch.dict(os.environ, {"RD_SECUREOPTION_foo": "bar"})
-    def test_extract_secure_data(self):
-
-        result = self.plugin.extract_secure_data()
-        self.assertEqual(result, {"foo":  "bar"})
-
-    def test_extract_secure_data_no_secure_options(self):
-
-        result = self.plugin.extract_secure_data()
-        self.assertEqual(result, {})
-
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_assert_that_submit_salt_job_attempted_successfully(self, mock_post):
 
         mock_post.return_value.status_code = 202
@@ -225,3 +215,99 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
                 "tgt": self.PARAM_MINION_NAME,
             })
         )
+
+    @mock.patch('requests.Session.post')
+    def test_submit_job_with_rejected_token(self, mock_post):
+        mock_post.return_value.status_code = 401
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.submit_job(self.AUTH_TOKEN, self.PARAM_MINION_NAME, self.PARAM_FUNCTION)
+
+    @mock.patch('requests.Session.post')
+    def test_submit_batch_job(self, mock_post):
+        minions = ["minion1", "minion2"]
+        mock_post.return_value.status_code = 202
+        mock_post.return_value.json.return_value = {"return": [{
+            "jid": self.OUTPUT_JID,
+            "minions": minions
+            }]
+        }
+
+        result = self.plugin.submit_batch_job(self.AUTH_TOKEN, minions + ["minion3"], self.PARAM_FUNCTION)
+
+        self.assertEqual(result, (self.OUTPUT_JID, minions))
+        mock_post.assert_called_once_with(
+            self.PARAM_ENDPOINT+'/minions',
+            headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json", "Content-Type": "application/json"},
+            data=json.dumps({
+                "fun": self.PARAM_FUNCTION,
+                "tgt": minions + ["minion3"],
+                "tgt_type": "list",
+            })
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_submit_batch_job_without_minions(self, mock_post):
+        mock_post.return_value.status_code = 202
+        mock_post.return_value.json.return_value = {"return": [{
+            "jid": self.OUTPUT_JID,
+            "minions": []
+            }]
+        }
+
+        with self.assertRaises(SaltTargettingMismatchException):
+            self.plugin.submit_batch_job(self.AUTH_TOKEN, ["minion1"], self.PARAM_FUNCTION)
+
+    @mock.patch('requests.Session.post')
+    def test_submit_jobs(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [
+            {"jid": "1", "minions": ["minion1"]},
+            {"jid": "2", "minions": ["minion2"]},
+        ]}
+
+        result = self.plugin.submit_jobs(self.AUTH_TOKEN, [("minion1", self.PARAM_FUNCTION), ("minion2", "cmd.run 'ls -l'")])
+
+        self.assertEqual(result, ["1", "2"])
+        mock_post.assert_called_once_with(
+            self.PARAM_ENDPOINT+'/',
+            headers={"X-Auth-Token": self.AUTH_TOKEN, "Accept": "application/json", "Content-Type": "application/json"},
+            data=json.dumps([
+                {"fun": self.PARAM_FUNCTION, "tgt": "minion1", "client": "local_async"},
+                {"fun": "cmd.run", "tgt": "minion2", "arg": ["ls -l"], "client": "local_async"},
+            ])
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_submit_jobs_targetting_mismatch(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [
+            {"jid": "1", "minions": ["minion1"]},
+            {"jid": "2", "minions": []},
+            {"jid": "3", "minions": ["minion4"]},
+            "No minions matched the target.",
+        ]}
+
+        result = self.plugin.submit_jobs(self.AUTH_TOKEN, [("minion%d" % i, self.PARAM_FUNCTION) for i in range(1, 5)])
+
+        self.assertEqual(result[0], "1")
+        for jid in result[1:]:
+            self.assertIsInstance(jid, SaltTargettingMismatchException)
+
+    @mock.patch('requests.Session.post')
+    def test_submit_jobs_masks_secure_options(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"return": [{"jid": "1", "minions": ["minion1"]}]}
+
+        with self.assertLogs('salt', level='DEBUG') as logs:
+            self.plugin.submit_jobs(self.AUTH_TOKEN, [("minion1", "cmd.run 'echo secret'")], secure_options={"password": "secret"})
+
+        self.assertFalse(any("echo secret" in record.getMessage() for record in logs.records))
+        self.assertIn("echo secret", mock_post.call_args[1]['data'])
+
+    @mock.patch('requests.Session.post')
+    def test_submit_jobs_rejected_token(self, mock_post):
+        mock_post.return_value.status_code = 401
+
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.submit_jobs(self.AUTH_TOKEN, [("minion1", self.PARAM_FUNCTION)])
@@ -0,0 +1,195 @@
+import sys, os
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from salt import SaltApiNodeStepPlugin
+from salt import SaltApiAuthenticationException
+
+
+class FakeEventStreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves the events of the server as salt-api's /events resource does, in chunks.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.headers.get('X-Auth-Token') != self.server.token:
+            self.send_response(401)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.write_chunk(b"retry: 400\n\n")
+
+        for tag, data in self.server.events:
+            event = json.dumps({"tag": tag, "data": data})
+            self.write_chunk(f"tag: {tag}\ndata: {event}\n\n".encode())
+
+        if self.server.hold_open:
+            self.server.release.wait(5)
+
+        self.write_chunk(b"")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSaltApiNodeStepPlugin(unittest.TestCase):
+
+    def setUp(self):
+
+        self.PARAM_EAUTH = "pam"
+        self.PARAM_MINION_NAME = "minion"
+        self.PARAM_USER = "user"
+        self.PARAM_PASSWORD = "password&!@$*"
+        self.AUTH_TOKEN = "123qwe"
+        self.OUTPUT_JID = "20130213093536481553"
+        self.HOST_RESPONSE = {"pid": 42, "retcode": 0, "stdout": "some response", "stderr": ""}
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeEventStreamHandler)
+        self.server.token = self.AUTH_TOKEN
+        self.server.events = []
+        self.server.hold_open = True
+        self.server.release = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.PARAM_ENDPOINT = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.plugin = SaltApiNodeStepPlugin(self.PARAM_ENDPOINT, self.PARAM_USER, self.PARAM_PASSWORD, self.PARAM_EAUTH)
+        self.plugin.extract_output_for_jid = MagicMock(return_value=None)
+        self.plugin.wait_for_jid_response = MagicMock(return_value="polled")
+        self.plugin.event_timeout = 5
+
+    def tearDown(self):
+        self.server.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ret_event(self, minion):
+        return (f"salt/job/{self.OUTPUT_JID}/ret/{minion}",
+                {"jid": self.OUTPUT_JID, "id": minion, "fun": "cmd.run_all", "return": self.HOST_RESPONSE, "retcode": 0})
+
+    def test_returns_on_return_event(self):
+        self.server.events = [
+            (f"salt/job/{self.OUTPUT_JID}/new", {"jid": self.OUTPUT_JID, "minions": [self.PARAM_MINION_NAME]}),
+            self.ret_event("other_minion"),
+            self.ret_event(self.PARAM_MINION_NAME),
+        ]
+
+        result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        self.plugin.extract_output_for_jid.assert_called_once_with(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+        self.plugin.wait_for_jid_response.assert_not_called()
+
+    def prog_event(self, minion, run_num, result):
+        state = {"__id__": f"state{run_num}", "name": f"/etc/file{run_num}", "result": result,
+                 "comment": "File updated", "__run_num__": run_num}
+        return (f"salt/job/{self.OUTPUT_JID}/prog/{minion}/{run_num}",
+                {"ret": state, "len": 2, "jid": self.OUTPUT_JID})
+
+    def test_logs_progress_events(self):
+        self.plugin.progress_events = True
+        self.server.events = [
+            self.prog_event(self.PARAM_MINION_NAME, 0, True),
+            self.prog_event("other_minion", 0, True),
+            self.prog_event(self.PARAM_MINION_NAME, 1, False),
+            self.ret_event(self.PARAM_MINION_NAME),
+        ]
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        messages = [record.getMessage() for record in logs.records]
+        self.assertIn("[1/2] state0: Succeeded. File updated", messages)
+        self.assertIn("[2/2] state1: Failed. File updated", messages)
+        self.assertEqual(len([message for message in messages if message.startswith("[")]), 2)
+
+    def test_logs_job_still_running(self):
+        self.plugin.progress_events = True
+        self.server.events = [
+            self.ret_event("other_minion"),
+            self.ret_event(self.PARAM_MINION_NAME),
+        ]
+
+        with mock.patch('salt.PROGRESS_INTERVAL', 0), self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertIn(f"Job {self.OUTPUT_JID} still running on {self.PARAM_MINION_NAME} after 0 s",
+                      [record.getMessage() for record in logs.records])
+
+    def test_logs_job_still_running_on_quiet_bus(self):
+        self.plugin.progress_events = True
+        self.plugin.extract_output_for_jid.side_effect = [None, None, None, self.HOST_RESPONSE]
+
+        with mock.patch('salt.PROGRESS_INTERVAL', 0.2), self.assertLogs('salt', level='INFO') as logs:
+            result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        self.plugin.wait_for_jid_response.assert_not_called()
+        notices = [record.getMessage() for record in logs.records if "still running" in record.getMessage()]
+        self.assertEqual(len(notices), 2)
+
+    def test_ignores_progress_events_by_default(self):
+        self.server.events = [
+            self.prog_event(self.PARAM_MINION_NAME, 0, True),
+            self.ret_event(self.PARAM_MINION_NAME),
+        ]
+
+        with self.assertLogs('salt', level='INFO') as logs:
+            self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertFalse(any(record.getMessage().startswith("[") for record in logs.records))
+
+    def test_returns_job_finished_before_subscription(self):
+        self.plugin.extract_output_for_jid.return_value = self.HOST_RESPONSE
+
+        result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        self.plugin.wait_for_jid_response.assert_not_called()
+
+    def test_falls_back_to_polling_when_stream_ends(self):
+        self.server.events = [self.ret_event("other_minion")]
+        self.server.hold_open = False
+
+        result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, "polled")
+        self.plugin.wait_for_jid_response.assert_called_once_with(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    def test_falls_back_to_polling_when_stream_idle(self):
+        self.plugin.event_timeout = 0.2
+
+        result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, "polled")
+
+    def test_falls_back_to_polling_when_unavailable(self):
+        self.plugin.endpoint = "http://127.0.0.1:1"
+        self.plugin.session.configure(retries=0)
+
+        result = self.plugin.wait_for_jid_event(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, "polled")
+
+    def test_rejected_token(self):
+        with self.assertRaises(SaltApiAuthenticationException):
+            self.plugin.wait_for_jid_event("expired", self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.plugin.wait_for_jid_response.assert_not_called()
@@ -59,3 +59,12 @@ class TestSaltApiNodeStepPlugin(unittest.TestCase):
 
         # Verifying interactions
         self.plugin.extract_output_for_jid.assert_called_once_with(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+    def test_wait_for_jid_response_waits_for_first_poll(self):
+        self.plugin.extract_output_for_jid = MagicMock(return_value=self.HOST_RESPONSE)
+
+        result = self.plugin.wait_for_jid_response(self.AUTH_TOKEN, self.OUTPUT_JID, self.PARAM_MINION_NAME)
+
+        self.assertEqual(result, self.HOST_RESPONSE)
+        self.plugin.timer.wait_for_first.assert_called_once_with()
+        self.plugin.timer.wait_for_next.assert_not_called()
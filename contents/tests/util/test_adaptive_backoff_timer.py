@@ -0,0 +1,64 @@
+import sys, os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.getcwd())
+from util.adaptive_backoff_timer import AdaptiveBackoffTimer
+from util.runtime_history import RuntimeHistory
+
+
+class TestAdaptiveBackoffTimer(unittest.TestCase):
+
+    @patch.object(AdaptiveBackoffTimer, 'sleep')
+    def test_wait_for_first_sleeps_near_half_expected_delay(self, mock_sleep):
+        timer = AdaptiveBackoffTimer(1, 300, 1000, jitter=0.1)
+
+        timer.wait_for_first()
+
+        mock_sleep.assert_called_once()
+        self.assertGreaterEqual(mock_sleep.call_args[0][0], 450)
+        self.assertLessEqual(mock_sleep.call_args[0][0], 550)
+
+    @patch.object(AdaptiveBackoffTimer, 'sleep')
+    def test_wait_for_first_sleeps_for_fraction(self, mock_sleep):
+        timer = AdaptiveBackoffTimer(1, 300, 1000, jitter=0, fraction=1)
+
+        timer.wait_for_first()
+
+        mock_sleep.assert_called_once_with(1000)
+
+    @patch.object(AdaptiveBackoffTimer, 'sleep')
+    def test_backs_off_after_first(self, mock_sleep):
+        timer = AdaptiveBackoffTimer(1, 300, 1000, jitter=0)
+
+        timer.wait_for_first()
+        for _ in range(4):
+            timer.wait_for_next()
+
+        sleep_values = [call[0][0] for call in mock_sleep.call_args_list]
+        self.assertEqual(sleep_values, [500, 1, 3, 7, 15])
+
+    @patch.object(AdaptiveBackoffTimer, 'sleep')
+    def test_interrupted(self, mock_sleep):
+        mock_sleep.side_effect = KeyboardInterrupt
+
+        timer = AdaptiveBackoffTimer(1, 300, 1000)
+
+        with self.assertRaises(InterruptedError):
+            timer.wait_for_first()
+
+    def test_expected_delay_recovers_after_outlier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            history = RuntimeHistory(os.path.join(directory, 'history.json'))
+            history.record('test.sleep', 60000)
+
+            # A 500 ms job, recorded as completed at the poll which found it
+            for _ in range(50):
+                timer = AdaptiveBackoffTimer(500, 15000, history.expected('test.sleep'), jitter=0)
+                polledAt = timer.first_delay()
+                while polledAt < 500:
+                    polledAt += timer.next_delay()
+                history.record('test.sleep', polledAt)
+
+            self.assertLess(history.expected('test.sleep'), 1500)
@@ -0,0 +1,86 @@
+import sys, os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from util.batch_coordinator import BatchCoordinator
+
+
+class TestBatchCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.MINIONS = ["minion1", "minion2", "minion3"]
+        self.key = BatchCoordinator.key("42", "https://localhost", "test.ping", self.MINIONS)
+        self.submit = MagicMock(return_value=("20130213093536481553", self.MINIONS))
+        self.submit_alone = MagicMock(return_value=("20130213093536481554", ["minion1"]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def coordinator(self):
+        return BatchCoordinator(self.directory.name, self.key)
+
+    def claim(self, minion):
+        return self.coordinator().claim(minion, self.MINIONS, self.submit, self.submit_alone)
+
+    def test_key_ignores_minion_order(self):
+        self.assertEqual(self.key, BatchCoordinator.key("42", "https://localhost", "test.ping", list(reversed(self.MINIONS))))
+        self.assertNotEqual(self.key, BatchCoordinator.key("43", "https://localhost", "test.ping", self.MINIONS))
+
+    def test_first_claim_submits_once(self):
+        results = [self.claim(minion) for minion in self.MINIONS]
+
+        self.submit.assert_called_once_with()
+        for jid, minions in results:
+            self.assertEqual(jid, "20130213093536481553")
+            self.assertEqual(minions, self.MINIONS)
+
+    def test_untargeted_minion_claiming_last_gets_batch_job(self):
+        self.submit.return_value = ("20130213093536481553", ["minion1", "minion2"])
+
+        results = [self.claim(minion) for minion in self.MINIONS]
+
+        self.submit.assert_called_once_with()
+        self.assertEqual(results[2], ("20130213093536481553", ["minion1", "minion2"]))
+
+    def test_second_claim_by_same_minion_submits_for_it_alone(self):
+        self.claim("minion1")
+
+        jid, minions = self.claim("minion1")
+
+        self.assertEqual((jid, minions), ("20130213093536481554", ["minion1"]))
+        self.submit.assert_called_once_with()
+        self.submit_alone.assert_called_once_with()
+
+    def test_claim_after_every_minion_claimed_submits_for_it_alone(self):
+        for minion in self.MINIONS:
+            self.claim(minion)
+
+        self.claim("minion1")
+
+        self.submit.assert_called_once_with()
+        self.submit_alone.assert_called_once_with()
+
+    def test_prunes_expired_batches(self):
+        expired = os.path.join(self.directory.name, "batch-expired.json")
+        recent = os.path.join(self.directory.name, "batch-recent.json")
+        for path in [expired, recent]:
+            open(path, 'w').close()
+        os.utime(expired, (time.time() - 2 * 24 * 60 * 60,) * 2)
+
+        self.claim("minion1")
+
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_failed_submit_lets_next_minion_submit(self):
+        self.submit.side_effect = [Exception("failure"), ("20130213093536481553", self.MINIONS)]
+
+        with self.assertRaises(Exception):
+            self.claim("minion1")
+
+        jid, _ = self.claim("minion2")
+        self.assertEqual(jid, "20130213093536481553")
@@ -0,0 +1,37 @@
+import sys, os
+import unittest
+
+sys.path.append(os.getcwd())
+from util.event_stream import iter_events, return_tag
+
+
+class TestEventStream(unittest.TestCase):
+
+    def test_iter_events(self):
+        lines = [
+            "retry: 400",
+            "",
+            "tag: salt/job/1/new",
+            'data: {"tag": "salt/job/1/new"}',
+            "",
+            ": keep-alive",
+            "tag: salt/job/1/ret/minion",
+            'data: {"tag": "salt/job/1/ret/minion",',
+            'data:  "data": {}}',
+            "",
+        ]
+
+        events = list(iter_events(lines))
+
+        self.assertEqual(events, [
+            ("salt/job/1/new", '{"tag": "salt/job/1/new"}'),
+            ("salt/job/1/ret/minion", '{"tag": "salt/job/1/ret/minion",\n "data": {}}'),
+        ])
+
+    def test_iter_events_unterminated(self):
+        events = list(iter_events(["tag: salt/auth", "data: {}"]))
+
+        self.assertEqual(events, [("salt/auth", "{}")])
+
+    def test_return_tag(self):
+        self.assertEqual(return_tag("20130213093536481553", "minion"), "salt/job/20130213093536481553/ret/minion")
@@ -1,9 +1,10 @@
 import sys, os
+import asyncio
 import unittest
 from unittest.mock import patch
 
 sys.path.append(os.getcwd())
-from util.exponential_backoff_timer import ExponentialBackoffTimer
+from util.exponential_backoff_timer import ExponentialBackoffTimer, DeadlineExceeded
 
 
 class TestExponentialBackoffTimer(unittest.TestCase):
@@ -43,3 +44,82 @@ class TestExponentialBackoffTimer(unittest.TestCase):
                 timer.wait_for_next()
 
         self.assertEqual(mock_sleep.call_count, 1)
+
+    @patch.object(ExponentialBackoffTimer, 'sleep')
+    def test_wait_for_first_polls_immediately(self, mock_sleep):
+        timer = ExponentialBackoffTimer(1, 300)
+
+        timer.wait_for_first()
+
+        mock_sleep.assert_not_called()
+
+    @patch.object(ExponentialBackoffTimer, 'sleep')
+    def test_next_delay_without_sleeping(self, mock_sleep):
+        timer = ExponentialBackoffTimer(1, 10)
+
+        self.assertEqual(timer.first_delay(), 0)
+        self.assertEqual([timer.next_delay() for _ in range(5)], [1, 3, 7, 10, 10])
+        mock_sleep.assert_not_called()
+
+    @patch('random.uniform', side_effect=lambda low, high: high / 2)
+    def test_full_jitter(self, mock_uniform):
+        timer = ExponentialBackoffTimer(2, 20, jitter_mode='full')
+
+        self.assertEqual([timer.next_delay() for _ in range(5)], [1, 3, 7, 10, 10])
+        self.assertEqual(mock_uniform.call_args_list[0][0], (0, 2))
+
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    def test_decorrelated_jitter(self, mock_uniform):
+        timer = ExponentialBackoffTimer(2, 100, jitter_mode='decorrelated')
+
+        self.assertEqual([timer.next_delay() for _ in range(5)], [6, 18, 54, 100, 100])
+        self.assertEqual(mock_uniform.call_args_list[1][0], (2, 18))
+
+    def test_jitter_within_bounds(self):
+        timer = ExponentialBackoffTimer(10, 1000, jitter_mode='decorrelated')
+
+        for _ in range(100):
+            self.assertGreaterEqual(timer.next_delay(), 10)
+            self.assertLessEqual(timer.last_delay, 1000)
+
+    def test_invalid_jitter_mode(self):
+        with self.assertRaises(ValueError):
+            ExponentialBackoffTimer(1, 10, jitter_mode='some')
+
+    def test_reset(self):
+        timer = ExponentialBackoffTimer(1, 10)
+        [timer.next_delay() for _ in range(3)]
+
+        timer.reset()
+
+        self.assertEqual([timer.next_delay() for _ in range(3)], [1, 3, 7])
+
+    @patch('time.monotonic')
+    @patch.object(ExponentialBackoffTimer, 'sleep')
+    def test_deadline(self, mock_sleep, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        timer = ExponentialBackoffTimer(1000, 10000, deadline=2500)
+
+        timer.wait_for_first()
+        timer.wait_for_next()
+        mock_monotonic.return_value = 101.0
+        timer.wait_for_next()
+        mock_monotonic.return_value = 102.5
+
+        with self.assertRaises(DeadlineExceeded):
+            timer.wait_for_next()
+
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list], [1000, 1500])
+
+    def test_async_wait_for_next(self):
+        timer = ExponentialBackoffTimer(1, 10)
+
+        asyncio.run(timer.async_wait_for_next())
+
+        self.assertEqual(timer.next_delay(), 3)
+
+    def test_async_wait_for_next_after_deadline(self):
+        timer = ExponentialBackoffTimer(1, 10, deadline=0)
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(timer.async_wait_for_next())
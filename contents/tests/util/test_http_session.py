@@ -0,0 +1,78 @@
+import sys, os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.getcwd())
+from util.http_session import PooledSession, TimeoutHTTPAdapter
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{"return": [{}]}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPooledSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/jobs/1"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_configure(self):
+        session = PooledSession(pool_size=4, retries=2, connect_timeout=1, read_timeout=5)
+
+        adapter = session.get_adapter('https://localhost')
+        self.assertIsInstance(adapter, TimeoutHTTPAdapter)
+        self.assertIs(adapter, session.get_adapter('http://localhost'))
+        self.assertEqual(adapter.timeout, (1, 5))
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertNotIn('POST', adapter.max_retries.allowed_methods)
+
+    def test_reuses_connections(self):
+        session = PooledSession()
+
+        for _ in range(3):
+            response = session.get(self.url)
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(session.connection_stats(), (1, 2))
+
+    def test_connection_stats_without_requests(self):
+        session = PooledSession()
+
+        self.assertEqual(session.connection_stats(), (0, 0))
+
+    @mock.patch.object(HTTPAdapter, 'send', autospec=True, side_effect=HTTPAdapter.send)
+    def test_applies_default_timeout(self, mock_send):
+        session = PooledSession(connect_timeout=3, read_timeout=7)
+
+        session.get(self.url)
+
+        self.assertEqual(mock_send.call_args[1]['timeout'], (3, 7))
+
+    @mock.patch.object(HTTPAdapter, 'send', autospec=True, side_effect=HTTPAdapter.send)
+    def test_keeps_explicit_timeout(self, mock_send):
+        session = PooledSession(connect_timeout=3, read_timeout=7)
+
+        session.get(self.url, timeout=1)
+
+        self.assertEqual(mock_send.call_args[1]['timeout'], 1)
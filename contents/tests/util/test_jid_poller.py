@@ -0,0 +1,131 @@
+import sys, os
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from util.jid_poller import JidPoller
+from util.exponential_backoff_timer import ExponentialBackoffTimer, DeadlineExceeded
+from util.adaptive_backoff_timer import AdaptiveBackoffTimer
+
+
+class TestJidPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.returns = {}
+        self.lookup = MagicMock(side_effect=lambda jids: {jid: dict(self.returns.get(jid, {})) for jid in jids})
+        self.poller = JidPoller(self.lookup, lambda: ExponentialBackoffTimer(1, 1))
+
+    def wait_all(self, waits):
+        results = {}
+
+        def wait(jid, minionId):
+            try:
+                results[(jid, minionId)] = self.poller.wait(jid, minionId)
+            except Exception as e:
+                results[(jid, minionId)] = e
+
+        threads = [threading.Thread(target=wait, args=waited) for waited in waits]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_looks_up_all_jobs_with_one_call_per_tick(self):
+        self.returns = {"1": {"minion1": "one"}, "2": {"minion2": "two", "minion3": "three"}}
+        # The first tick waits for all the waiters to subscribe
+        timer = AdaptiveBackoffTimer(10, 10, 100, jitter=0)
+        for jid in self.returns:
+            self.poller.expect(jid, self.returns[jid], timer)
+
+        results = self.wait_all([("1", "minion1"), ("2", "minion2"), ("2", "minion3")])
+
+        self.assertEqual(results, {("1", "minion1"): "one", ("2", "minion2"): "two", ("2", "minion3"): "three"})
+        self.lookup.assert_called_once()
+        self.assertEqual(sorted(self.lookup.call_args[0][0]), ["1", "2"])
+        self.assertEqual(self.poller.ticks, 1)
+        self.assertEqual(self.poller.jobs, {})
+
+    def test_polls_until_returned(self):
+        def returned_on_third_tick(jids):
+            return {jid: {"minion1": "one"} if self.lookup.call_count >= 3 else {} for jid in jids}
+
+        self.lookup.side_effect = returned_on_third_tick
+
+        self.assertEqual(self.poller.wait("1", "minion1"), "one")
+        self.assertEqual(self.poller.ticks, 3)
+
+    def test_keeps_returns_of_expected_minions(self):
+        self.returns = {"1": {"minion1": "one", "minion2": "two"}}
+        self.poller.expect("1", ["minion1", "minion2"])
+
+        self.assertEqual(self.poller.wait("1", "minion1"), "one")
+        self.assertIn("1", self.poller.jobs)
+
+        self.assertEqual(self.poller.wait("1", "minion2"), "two")
+        self.lookup.assert_called_once()
+        self.assertEqual(self.poller.jobs, {})
+
+    def test_fails_waiters_of_failed_lookup(self):
+        self.lookup.side_effect = lambda jids: {jid: ValueError(jid) if jid == "2" else {"minion1": "one"} for jid in jids}
+
+        results = self.wait_all([("1", "minion1"), ("2", "minion1")])
+
+        self.assertEqual(results[("1", "minion1")], "one")
+        self.assertIsInstance(results[("2", "minion1")], ValueError)
+
+    def test_fails_all_waiters_when_lookup_raises(self):
+        self.lookup.side_effect = IOError("unreachable")
+
+        with self.assertRaises(IOError):
+            self.poller.wait("1", "minion1")
+
+        self.assertEqual(self.poller.jobs, {})
+
+    def test_fails_waiters_at_deadline(self):
+        self.poller.timer_factory = lambda: ExponentialBackoffTimer(1, 1, deadline=20)
+
+        with self.assertRaises(DeadlineExceeded):
+            self.poller.wait("1", "minion1")
+
+        self.assertGreater(self.poller.ticks, 1)
+        self.assertEqual(self.poller.jobs, {})
+
+    def test_starts_backoff_over_when_minions_return(self):
+        timer = MagicMock(started=None)
+        timer.first_delay.return_value = 0
+        timer.next_delay.return_value = 1
+
+        def one_more_minion_per_tick(jids):
+            return {jid: {"minion%d" % i: i for i in range(min(self.lookup.call_count, 3))} for jid in jids}
+
+        self.lookup.side_effect = one_more_minion_per_tick
+        self.poller.expect("1", ["minion0", "minion1", "minion2"], timer)
+
+        self.assertEqual(self.poller.wait("1", "minion2"), 2)
+        self.assertEqual(timer.reset.call_count, 2)
+
+    def test_looks_up_due_jobs_only_without_sweep(self):
+        self.poller = JidPoller(self.lookup, None, sweep=False)
+        lookups = {"fast": 0, "slow": 0}
+
+        def count_lookups(jids):
+            for jid in jids:
+                lookups[jid] += 1
+            return {jid: {"minion1": jid} if jid == "slow" or lookups[jid] >= 5 else {} for jid in jids}
+
+        def timer(delay):
+            timer = MagicMock(started=None)
+            timer.first_delay.return_value = delay
+            timer.next_delay.return_value = delay
+            return timer
+
+        self.lookup.side_effect = count_lookups
+        self.poller.expect("fast", ["minion1"], timer(10))
+        self.poller.expect("slow", ["minion1"], timer(300))
+
+        results = self.wait_all([("fast", "minion1"), ("slow", "minion1")])
+
+        self.assertEqual(results, {("fast", "minion1"): "fast", ("slow", "minion1"): "slow"})
+        self.assertEqual(lookups, {"fast": 5, "slow": 1})
@@ -0,0 +1,93 @@
+import sys, os
+import json
+import unittest
+
+sys.path.append(os.getcwd())
+from util.json_stream import iter_events, extract_minion_return, JsonStreamError, JsonSizeExceeded
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def setUp(self):
+        self.MINION = "minion"
+        self.DOCUMENT = {"return": [{
+            "other": {"stdout": "skipped \"output\""},
+            self.MINION: {
+                "stdout": "café \U0001F600\n\ttab \\ \"quoted\"",
+                "stderr": "",
+                "retcode": 2,
+                "values": [0, -1.5, 3e10, True, False, None, {}, [], "\ud800"],
+            },
+        }]}
+
+    def test_events(self):
+        events = list(iter_events(chunked('{"a": [1, "bc", null], "d": {}}', 3)))
+
+        self.assertEqual(events, [
+            ('start_map', None),
+            ('key', 'a'), ('start_array', None),
+            ('value', 1), ('string_chunk', 'b'), ('string_chunk', 'c'), ('string_end', None), ('value', None),
+            ('end_array', None),
+            ('key', 'd'), ('start_map', None), ('end_map', None),
+            ('end_map', None),
+        ])
+
+    def test_extracts_minion_return_whatever_the_chunk_size(self):
+        for ensure_ascii in [True, False]:
+            body = json.dumps(self.DOCUMENT, ensure_ascii=ensure_ascii)
+            for size in [1, 2, 3, 7, 4096]:
+                result = extract_minion_return(chunked(body, size), self.MINION)
+
+                self.assertTrue(result.found)
+                self.assertEqual(result.responses, 1)
+                self.assertEqual(result.value, self.DOCUMENT["return"][0][self.MINION])
+
+    def test_sends_output_to_callback(self):
+        output = []
+        body = json.dumps(self.DOCUMENT)
+
+        result = extract_minion_return(chunked(body, 4), self.MINION, lambda stream, text: output.append((stream, text)))
+
+        self.assertEqual(result.value["stdout"], "")
+        self.assertEqual("".join(text for stream, text in output if stream == 'stdout'), self.DOCUMENT["return"][0][self.MINION]["stdout"])
+        self.assertEqual([text for stream, text in output if stream == 'stderr'], [])
+
+    def test_sends_string_return_to_callback(self):
+        output = []
+
+        result = extract_minion_return(['{"return": [{"minion": "some output"}]}'], self.MINION, lambda stream, text: output.append((stream, text)))
+
+        self.assertEqual(result.value, "")
+        self.assertEqual(output, [('stdout', "some output")])
+
+    def test_not_returned(self):
+        result = extract_minion_return(['{"return": [{"other": 1}]}'], self.MINION)
+
+        self.assertFalse(result.found)
+        self.assertEqual(result.responses, 1)
+
+    def test_unexpected_return(self):
+        result = extract_minion_return(['{"return": ["Exception occurred"]}'], self.MINION)
+
+        self.assertFalse(result.found)
+        self.assertTrue(result.unexpected)
+
+    def test_size_cap_excludes_skipped_and_streamed_output(self):
+        body = json.dumps({"return": [{"other": "x" * 1000, self.MINION: {"stdout": "y" * 1000, "retcode": 0}}]})
+
+        result = extract_minion_return(chunked(body, 64), self.MINION, lambda stream, text: None, max_size=100)
+
+        self.assertEqual(result.value, {"stdout": "", "retcode": 0})
+
+        with self.assertRaises(JsonSizeExceeded):
+            extract_minion_return(chunked(body, 64), self.MINION, max_size=100)
+
+    def test_malformed_documents(self):
+        for body in ['{"a": "\\x"}', '{"a": "\\u12g4"}', '{"a": "abc', '{"a": 1.}', '{"a": tru}', '[1,]', '{"a" 1}', '{} {}', '']:
+            for size in [1, 3, 100]:
+                with self.assertRaises(JsonStreamError, msg=body):
+                    list(iter_events(chunked(body, size)))
@@ -0,0 +1,34 @@
+import sys, os
+import unittest
+
+sys.path.append(os.getcwd())
+from util.line_emitter import LineEmitter
+
+
+class TestLineEmitter(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        self.emitter = LineEmitter(self.lines.append, max_buffer=8)
+
+    def test_joins_chunks_into_lines(self):
+        for chunk in ["li", "ne 1\nline", " 2\n", "\nend"]:
+            self.emitter.write(chunk)
+
+        self.assertEqual(self.lines, ["line 1", "line 2", ""])
+
+        self.emitter.flush()
+
+        self.assertEqual(self.lines, ["line 1", "line 2", "", "end"])
+
+    def test_flush_without_pending_text(self):
+        self.emitter.write("line\n")
+        self.emitter.flush()
+
+        self.assertEqual(self.lines, ["line"])
+
+    def test_splits_long_lines(self):
+        self.emitter.write("0123456789abcdef01")
+
+        self.assertEqual(self.lines, ["01234567", "89abcdef"])
+        self.assertEqual(self.emitter.buffer, "01")
@@ -0,0 +1,89 @@
+import sys, os
+import unittest
+
+sys.path.append(os.getcwd())
+from util.output_spool import OutputSpool, SpooledEmitter
+
+
+class TestOutputSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        self.OUTPUT = "".join("line %03d\n" % i for i in range(100))
+
+    def emit(self, text, threshold=64, **kwargs):
+        with OutputSpool(threshold) as spool:
+            spool.write(text)
+            spool.emit(self.lines.append, **kwargs)
+            return spool
+
+    def test_small_output_kept_in_memory(self):
+        spool = self.emit("hello\nworld", threshold=1024)
+
+        self.assertFalse(spool.spooled)
+        self.assertEqual(self.lines, ["hello\nworld"])
+
+    def test_large_output_spooled(self):
+        with OutputSpool(64) as spool:
+            for i in range(100):
+                spool.write("line %03d\n" % i)
+
+            self.assertTrue(spool.spooled)
+            self.assertEqual(spool.size, len(self.OUTPUT))
+            spool.emit(self.lines.append, chunk_size=100)
+
+        self.assertEqual("\n".join(self.lines) + "\n", self.OUTPUT)
+        self.assertTrue(all(len(chunk) < 100 for chunk in self.lines))
+        # Chunks are cut at line endings
+        self.assertEqual(self.lines[0], "".join("line %03d\n" % i for i in range(11))[:-1])
+
+    def test_empty_output(self):
+        self.emit("")
+
+        self.assertEqual(self.lines, [])
+
+    def test_head_truncation(self):
+        self.emit(self.OUTPUT, chunk_size=1000, truncation='head', limit=18)
+
+        self.assertEqual(self.lines, ["line 000\nline 001", "[... 882 bytes of output truncated ...]"])
+
+    def test_tail_truncation(self):
+        self.emit(self.OUTPUT, chunk_size=1000, truncation='tail', limit=18)
+
+        self.assertEqual(self.lines, ["[... 882 bytes of output truncated ...]", "line 098\nline 099"])
+
+    def test_head_tail_truncation(self):
+        self.emit(self.OUTPUT, chunk_size=1000, truncation='head_tail', limit=18)
+
+        self.assertEqual(self.lines, ["line 000", "[... 882 bytes of output truncated ...]", "line 099"])
+
+    def test_truncation_within_limit(self):
+        self.emit("short\n", truncation='tail', limit=18)
+
+        self.assertEqual(self.lines, ["short"])
+
+    def test_invalid_truncation(self):
+        with self.assertRaises(ValueError):
+            self.emit(self.OUTPUT, truncation='middle')
+
+    def test_chunks_never_split_characters(self):
+        text = "é" * 100
+
+        self.emit(text, chunk_size=7)
+
+        self.assertEqual("".join(self.lines), text)
+        self.assertTrue(all(len(chunk.encode()) <= 7 for chunk in self.lines))
+
+    def test_spooled_emitter(self):
+        emitter = SpooledEmitter(self.lines.append, threshold=16, truncation='tail', limit=9)
+
+        for i in range(100):
+            emitter.write("line %03d\n" % i)
+        emitter.flush()
+
+        self.assertEqual(self.lines, ["[... 891 bytes of output truncated ...]", "line 099"])
+        self.assertFalse(emitter.spool.spooled)
+
+
+if __name__ == '__main__':
+    unittest.main()
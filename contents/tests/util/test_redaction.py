@@ -0,0 +1,120 @@
+import sys, os
+import logging
+import threading
+import unittest
+
+sys.path.append(os.getcwd())
+from util.redaction import Redactor, RedactingFilter, RedactingWriter, redactor_for, MASK, WRITE_SLICE
+from util.line_emitter import LineEmitter
+
+
+class TestRedactor(unittest.TestCase):
+
+    def setUp(self):
+        self.SECRETS = ["s3cr3t", "hunter2", "hunter22", "p@ss|(w.rd)*"]
+
+    def test_redact(self):
+        redactor = Redactor(self.SECRETS)
+
+        self.assertEqual(redactor.redact("login s3cr3t then s3cr3t"), "login **** then ****")
+        self.assertEqual(redactor.redact("password: p@ss|(w.rd)*"), "password: ****")
+        self.assertEqual(redactor.redact("nothing to hide"), "nothing to hide")
+
+    def test_longest_secret_masked(self):
+        self.assertEqual(Redactor(self.SECRETS).redact("hunter22 hunter2 hunter"), "**** **** hunter")
+
+    def test_without_secrets(self):
+        redactor = Redactor(["", None])
+
+        self.assertFalse(redactor)
+        self.assertEqual(redactor.redact("s3cr3t"), "s3cr3t")
+
+    def test_multi_line_secret_masked_by_line(self):
+        key = "-----BEGIN KEY-----\nMIIEpAIBAAKCAQEA\n-----END KEY-----"
+        redactor = Redactor([key])
+
+        self.assertEqual(redactor.redact("key: " + key), "key: ****")
+        self.assertEqual(redactor.redact("MIIEpAIBAAKCAQEA"), MASK)
+
+    def test_many_secrets(self):
+        secrets = ["secret%04d" % i for i in range(500)] + ["a" * 2000]
+        redactor = Redactor(secrets)
+
+        text = "x" * 1000 + "secret0042" + "a" * 2000 + "secret0499" + "secret5"
+        self.assertEqual(redactor.redact(text), "x" * 1000 + "*" * 12 + "secret5")
+
+    def test_redactor_for_reuses_redactor(self):
+        self.assertIs(redactor_for(["b", "a"]), redactor_for(["a", "b", "a"]))
+
+
+class TestRedactingWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        self.redactor = Redactor(["s3cr3t", "hunter2", "hunter22"])
+
+    def test_masks_secret_split_across_writes(self):
+        writer = RedactingWriter(self.redactor, LineEmitter(self.lines.append))
+
+        for fragment in ["key: s3", "cr3t then hun", "ter2", "2 and hunter", "2\nbye"]:
+            writer.write(fragment)
+        writer.flush()
+
+        self.assertEqual(self.lines, ["key: **** then **** and ****", "bye"])
+
+    def test_masks_before_long_lines_are_cut(self):
+        writer = RedactingWriter(self.redactor, LineEmitter(self.lines.append, max_buffer=8))
+
+        writer.write("x" * 5 + "s3cr3t" + "y" * 10)
+        writer.flush()
+
+        self.assertEqual("".join(self.lines), "x" * 5 + MASK + "y" * 10)
+        self.assertFalse(any("s3" in line for line in self.lines))
+
+    def test_masks_secret_across_slices(self):
+        writer = RedactingWriter(self.redactor, LineEmitter(self.lines.append, max_buffer=WRITE_SLICE * 3))
+
+        writer.write("x" * (WRITE_SLICE - 3) + "s3cr3t" + "y" * 10)
+        writer.flush()
+
+        self.assertEqual(self.lines, ["x" * (WRITE_SLICE - 3) + MASK + "y" * 10])
+
+
+class TestRedactingFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('test_redaction')
+        self.filter = RedactingFilter()
+        self.logger.addFilter(self.filter)
+
+    def tearDown(self):
+        self.logger.removeFilter(self.filter)
+
+    def test_filter_redacts_arguments(self):
+        with self.filter.redacting(Redactor(["s3cr3t"])):
+            with self.assertLogs(self.logger, level='INFO') as logs:
+                self.logger.info("Running %s with %s", "cmd.run", "s3cr3t")
+
+        self.assertEqual(logs.output, ["INFO:test_redaction:Running cmd.run with ****"])
+
+    def test_filter_only_redacts_thread_secrets(self):
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            with self.filter.redacting(Redactor(["s3cr3t"])):
+                thread = threading.Thread(target=self.logger.info, args=("other thread s3cr3t",))
+                thread.start()
+                thread.join()
+            self.logger.info("after s3cr3t")
+
+        self.assertEqual(logs.output, ["INFO:test_redaction:other thread s3cr3t", "INFO:test_redaction:after s3cr3t"])
+
+    def test_filter_default(self):
+        self.filter.default = Redactor(["s3cr3t"])
+
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            self.logger.info("s3cr3t")
+
+        self.assertEqual(logs.output, ["INFO:test_redaction:****"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys, os
+import stat
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.getcwd())
+from util.result_cache import ResultCache, parse_ttls
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name, {'grains.items': 300, 'pkg.*': 60, 'test.ping': 0})
+        self.KEY = ResultCache.key('https://localhost', 'user', 'password', 'pam', 'minion', 'grains.items')
+        self.GRAINS = {'os': 'Debian', 'num_cpus': 4}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_ttls(self):
+        self.assertEqual(parse_ttls("grains.items=300, pillar.get=60 pkg.*=1.5"),
+                         {'grains.items': 300, 'pillar.get': 60, 'pkg.*': 1.5})
+        self.assertEqual(parse_ttls(""), {})
+
+    def test_parse_invalid_ttls(self):
+        for value in ["grains.items", "=300", "grains.items=soon"]:
+            with self.assertRaises(ValueError):
+                parse_ttls(value)
+
+    def test_ttl(self):
+        self.assertEqual(self.cache.ttl('grains.items'), 300)
+        self.assertEqual(self.cache.ttl('pkg.version'), 60)
+        self.assertIsNone(self.cache.ttl('test.ping'))
+        self.assertIsNone(self.cache.ttl('cmd.run'))
+
+    def test_key_differs_by_call(self):
+        keys = {
+            self.KEY,
+            ResultCache.key('https://localhost', 'user', 'password', 'pam', 'minion', 'grains.item os'),
+            ResultCache.key('https://localhost', 'user', 'password', 'pam', 'other', 'grains.items'),
+            ResultCache.key('https://localhost', 'admin', 'password', 'pam', 'minion', 'grains.items'),
+            ResultCache.key('https://remote', 'user', 'password', 'pam', 'minion', 'grains.items'),
+            ResultCache.key('https://localhost', 'user', 'WRONG', 'pam', 'minion', 'grains.items'),
+        }
+
+        self.assertEqual(len(keys), 6)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get(self.KEY))
+
+    def test_put_and_get(self):
+        self.cache.put(self.KEY, 'grains.items', self.GRAINS)
+
+        self.assertEqual(self.cache.get(self.KEY), self.GRAINS)
+        mode = os.stat(os.path.join(self.directory.name, self.KEY + '.json')).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+
+    def test_put_function_not_allowed(self):
+        self.cache.put(self.KEY, 'cmd.run', "output")
+        self.cache.put(self.KEY, 'test.ping', True)
+
+        self.assertIsNone(self.cache.get(self.KEY))
+
+    def test_expired(self):
+        self.cache.put(self.KEY, 'grains.items', self.GRAINS)
+
+        with mock.patch('time.time', return_value=time.time() + 301):
+            self.assertIsNone(self.cache.get(self.KEY))
+
+        self.assertEqual(os.listdir(self.directory.name), ['salt-results.json'])
+
+    def test_evicts_least_recently_used(self):
+        self.cache.maximum_entries = 2
+        keys = [ResultCache.key('https://localhost', 'user', 'password', 'pam', minion, 'grains.items') for minion in ['a', 'b', 'c']]
+
+        self.cache.put(keys[0], 'grains.items', self.GRAINS)
+        self.cache.put(keys[1], 'grains.items', self.GRAINS)
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], 'grains.items', self.GRAINS)
+
+        self.assertEqual(self.cache.get(keys[0]), self.GRAINS)
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertEqual(self.cache.get(keys[2]), self.GRAINS)
+
+    def test_evicts_beyond_maximum_size(self):
+        self.cache.maximum_bytes = 1000
+        keys = [ResultCache.key('https://localhost', 'user', 'password', 'pam', minion, 'grains.items') for minion in ['a', 'b']]
+
+        self.cache.put(keys[0], 'grains.items', {'data': 'x' * 600})
+        self.cache.put(keys[1], 'grains.items', {'data': 'y' * 600})
+
+        self.assertIsNone(self.cache.get(keys[0]))
+        self.assertEqual(self.cache.get(keys[1]), {'data': 'y' * 600})
+
+
+if __name__ == '__main__':
+    unittest.main()
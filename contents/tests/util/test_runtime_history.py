@@ -0,0 +1,42 @@
+import sys, os
+import tempfile
+import unittest
+
+sys.path.append(os.getcwd())
+from util.runtime_history import RuntimeHistory
+
+
+class TestRuntimeHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = RuntimeHistory(os.path.join(self.directory.name, 'history.json'), smoothing=0.5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expected_unknown_function(self):
+        self.assertIsNone(self.history.expected('test.ping'))
+
+    def test_first_sample_is_expected(self):
+        self.history.record('test.ping', 300)
+
+        self.assertEqual(self.history.expected('test.ping'), 300)
+        self.assertIsNone(self.history.expected('state.highstate'))
+
+    def test_moving_average(self):
+        self.history.record('state.highstate', 1000)
+        self.history.record('state.highstate', 2000)
+        self.history.record('state.highstate', 2000)
+
+        self.assertEqual(self.history.expected('state.highstate'), 1750)
+
+    def test_drops_least_recently_run_functions(self):
+        self.history.maximum_functions = 2
+        self.history.record('test.ping', 300)
+        self.history.record('cmd.run', 500)
+        self.history.record('state.apply', 5000)
+
+        self.assertIsNone(self.history.expected('test.ping'))
+        self.assertEqual(self.history.expected('cmd.run'), 500)
+        self.assertEqual(self.history.expected('state.apply'), 5000)
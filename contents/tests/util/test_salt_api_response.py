@@ -0,0 +1,49 @@
+import sys, os
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from util.salt_api_response import SaltApiResponse
+
+
+class TestSaltApiResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.response = MagicMock()
+        self.response.status_code = 200
+        self.response.text = '{"return": [{}]}'
+        self.response.json.return_value = {"return": [{}]}
+
+    def test_decodes_once(self):
+        wrapped = SaltApiResponse(self.response)
+
+        self.assertEqual(wrapped.json(), {"return": [{}]})
+        self.assertIs(wrapped.json(), wrapped.json())
+        self.response.json.assert_called_once_with()
+
+    def test_does_not_decode_until_needed(self):
+        wrapped = SaltApiResponse(self.response)
+
+        self.assertEqual(wrapped.status_code, 200)
+        self.assertEqual(wrapped.text, '{"return": [{}]}')
+        self.response.json.assert_not_called()
+
+    def test_decode_failure_is_raised_each_time(self):
+        self.response.json.side_effect = ValueError("not json")
+        wrapped = SaltApiResponse(self.response)
+
+        with self.assertRaises(ValueError):
+            wrapped.json()
+        with self.assertRaises(ValueError):
+            wrapped.json()
+
+    def test_iter_text_defaults_to_utf8(self):
+        self.response.encoding = None
+        self.response.iter_content.return_value = iter(['{"return"', ': [{}]}'])
+
+        with SaltApiResponse(self.response) as wrapped:
+            self.assertEqual(''.join(wrapped.iter_text(1024)), '{"return": [{}]}')
+
+        self.assertEqual(self.response.encoding, 'utf-8')
+        self.response.iter_content.assert_called_once_with(chunk_size=1024, decode_unicode=True)
+        self.response.close.assert_called_once_with()
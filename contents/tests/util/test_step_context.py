@@ -0,0 +1,63 @@
+import sys, os
+import json
+import unittest
+
+sys.path.append(os.getcwd())
+from util.step_context import StepContext
+
+
+class TestStepContext(unittest.TestCase):
+
+    def setUp(self):
+        self.ENVIRON = {
+            "RD_OPTION_SALT_API_END_POINT": "https://localhost",
+            "RD_OPTION_SALT_USER": "user",
+            "RD_SECUREOPTION_SALT_PASSWORD": "password&!@$*",
+            "RD_CONFIG_FUNCTION": "cmd.run_all 'uptime'",
+            "RD_NODE_NAME": "minion",
+            "RD_JOB_EXECID": "42",
+            "RD_PLUGIN_NAME": "salt-step",
+            "PATH": "/usr/bin",
+        }
+
+    def test_from_environ(self):
+        context = StepContext.from_environ(self.ENVIRON)
+
+        self.assertEqual(context.options, {"SALT_API_END_POINT": "https://localhost", "SALT_USER": "user"})
+        self.assertEqual(context.secure_options, {"SALT_PASSWORD": "password&!@$*"})
+        self.assertEqual(context.config, {"FUNCTION": "cmd.run_all 'uptime'"})
+        self.assertEqual(context.node, {"NAME": "minion"})
+        self.assertEqual(context.job, {"EXECID": "42"})
+
+    def test_from_empty_environ(self):
+        context = StepContext.from_environ({"PATH": "/usr/bin"})
+
+        self.assertEqual(context, StepContext())
+        self.assertEqual(context.options, {})
+
+    def test_read_only(self):
+        context = StepContext.from_environ(self.ENVIRON)
+
+        with self.assertRaises(AttributeError):
+            context.options = {}
+        with self.assertRaises(AttributeError):
+            context.extra = 1
+
+    def test_to_dict_round_trip(self):
+        context = StepContext.from_environ(self.ENVIRON)
+
+        self.assertEqual(StepContext(**json.loads(json.dumps(context.to_dict()))), context)
+
+    def test_repr_hides_secure_options(self):
+        # salt.py reads the salt-api password from the plain RD_OPTION_SALT_PASSWORD
+        environ = dict(self.ENVIRON, RD_OPTION_SALT_PASSWORD="option&!@$*")
+
+        text = repr(StepContext.from_environ(environ))
+
+        self.assertNotIn("option&!@$*", text)
+        self.assertNotIn("password&!@$*", text)
+        self.assertIn("SALT_PASSWORD", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import sys, os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.getcwd())
+from util.step_metrics import StepMetrics, record_textfile
+
+
+class TestStepMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = StepMetrics()
+
+    def response(self, body, received):
+        response = MagicMock()
+        response.request.body = body
+        response.raw.tell.return_value = received
+        return response
+
+    @patch('time.monotonic')
+    def test_times_phases(self, mock_monotonic):
+        mock_monotonic.return_value = 10.0
+        self.metrics = StepMetrics()
+
+        for phase, duration in [('login', 0.5), ('poll', 0.25), ('poll', 0.25)]:
+            with self.metrics.time(phase):
+                mock_monotonic.return_value += duration
+
+        with self.assertRaises(ValueError):
+            with self.metrics.time('output'):
+                raise ValueError()
+
+        report = self.metrics.report(function='cmd.run')
+
+        self.assertEqual(report['function'], 'cmd.run')
+        self.assertEqual(report['duration_ms'], 1000)
+        self.assertEqual(report['phases'], {'login': {'count': 1, 'ms': 500}, 'poll': {'count': 2, 'ms': 500},
+                                            'output': {'count': 1, 'ms': 0}})
+        self.assertEqual(report['polls'], 2)
+
+    def test_counts_bytes(self):
+        self.metrics.count_response(self.response(b'{"fun": "test.ping"}', 120))
+        self.metrics.count_response(self.response(None, 80))
+
+        report = self.metrics.report()
+
+        self.assertEqual(report['bytes_sent'], 20)
+        self.assertEqual(report['bytes_received'], 200)
+
+    def test_counts_requests_of_its_thread_only(self):
+        thread = threading.Thread(target=self.metrics.count_response, args=(self.response(b'ignored', 10),))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(self.metrics.report()['bytes_sent'], 0)
+
+    def test_records_textfile(self):
+        report = {'function': 'cmd.run', 'result': 'success', 'duration_ms': 1500, 'polls': 2,
+                  'phases': {'poll': {'count': 2, 'ms': 500}}, 'bytes_sent': 20, 'bytes_received': 200}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'salt.prom')
+            record_textfile(path, report)
+            record_textfile(path, dict(report, function='test.ping', result='EXIT_CODE'))
+            record_textfile(path, report)
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(os.listdir(directory), ['salt.prom'])
+
+        self.assertIn('# TYPE salt_node_steps_total counter', lines)
+        self.assertIn('salt_node_steps_total{function="cmd.run",result="success"} 2.0', lines)
+        self.assertIn('salt_node_steps_total{function="test.ping",result="EXIT_CODE"} 1.0', lines)
+        self.assertIn('salt_node_step_seconds_total{function="cmd.run"} 3.0', lines)
+        self.assertIn('salt_node_step_phase_calls_total{function="cmd.run",phase="poll"} 4.0', lines)
+        self.assertIn('salt_node_step_received_bytes_total{function="cmd.run"} 400.0', lines)
+
+    def test_escapes_labels(self):
+        report = {'function': 'some"function\\', 'result': 'success', 'duration_ms': 0,
+                  'phases': {}, 'bytes_sent': 0, 'bytes_received': 0}
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'salt.prom')
+            record_textfile(path, report)
+            record_textfile(path, report)
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertIn('salt_node_steps_total{function="some\\"function\\\\",result="success"} 2.0', lines)
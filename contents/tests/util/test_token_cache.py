@@ -0,0 +1,89 @@
+import sys, os
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.getcwd())
+from util.token_cache import TokenCache
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = TokenCache(self.directory.name, expiry_margin=60)
+        self.key = TokenCache.key("https://localhost", "user", "pam")
+        self.authenticate = MagicMock(return_value=("123qwe", time.time() + 3600))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_depends_on_endpoint_user_and_eauth(self):
+        self.assertEqual(self.key, TokenCache.key("https://localhost", "user", "pam"))
+        self.assertNotEqual(self.key, TokenCache.key("https://other", "user", "pam"))
+        self.assertNotEqual(self.key, TokenCache.key("https://localhost", "other", "pam"))
+        self.assertNotEqual(self.key, TokenCache.key("https://localhost", "user", "ldap"))
+
+    def test_acquire_reuses_token(self):
+        first = self.cache.acquire(self.key, "password", self.authenticate)
+        second = TokenCache(self.directory.name).acquire(self.key, "password", self.authenticate)
+
+        self.assertEqual(first, "123qwe")
+        self.assertEqual(second, "123qwe")
+        self.authenticate.assert_called_once_with()
+
+    def test_acquire_requires_same_password(self):
+        self.cache.acquire(self.key, "password", self.authenticate)
+        self.cache.acquire(self.key, "guessed", self.authenticate)
+
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    def test_acquire_authentication_failure(self):
+        self.authenticate.return_value = (None, None)
+
+        self.assertIsNone(self.cache.acquire(self.key, "password", self.authenticate))
+        self.assertIsNone(self.cache.acquire(self.key, "password", self.authenticate))
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    def test_acquire_refreshes_expiring_token(self):
+        self.authenticate.return_value = ("old", time.time() + 30)
+        self.cache.acquire(self.key, "password", self.authenticate)
+
+        self.authenticate.return_value = ("new", time.time() + 3600)
+        result = self.cache.acquire(self.key, "password", self.authenticate)
+
+        self.assertEqual(result, "new")
+
+    def test_release_keeps_fresh_token(self):
+        token = self.cache.acquire(self.key, "password", self.authenticate)
+
+        self.assertFalse(self.cache.release(self.key, token))
+        self.assertEqual(self.cache.acquire(self.key, "password", self.authenticate), token)
+        self.authenticate.assert_called_once_with()
+
+    def test_release_logs_out_expiring_token_once_unshared(self):
+        self.authenticate.return_value = ("123qwe", time.time() + 120)
+        self.cache.acquire(self.key, "password", self.authenticate)
+        self.cache.acquire(self.key, "password", self.authenticate)
+
+        self.cache.expiry_margin = 600
+
+        self.assertFalse(self.cache.release(self.key, "123qwe"))
+        self.assertTrue(self.cache.release(self.key, "123qwe"))
+
+    def test_release_unknown_token(self):
+        self.assertFalse(self.cache.release(self.key, "123qwe"))
+
+    def test_invalidate(self):
+        token = self.cache.acquire(self.key, "password", self.authenticate)
+        self.cache.invalidate(self.key, token)
+
+        self.authenticate.return_value = ("new", time.time() + 3600)
+        self.assertEqual(self.cache.acquire(self.key, "password", self.authenticate), "new")
+        self.assertFalse(self.cache.release(self.key, token))
+
+    def test_cache_file_is_private(self):
+        self.cache.acquire(self.key, "password", self.authenticate)
+
+        self.assertEqual(os.stat(self.cache.path).st_mode & 0o777, 0o600)
@@ -0,0 +1,139 @@
+import sys, os
+import io
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+sys.path.append(os.getcwd())
+from util.tracing import Tracer, ConsoleSpanExporter, OtlpFileSpanExporter, current_span, inject_trace_context
+from util.step_metrics import StepMetrics
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+        self.PARENT_ID = "00f067aa0ba902b7"
+        self.exporter = MagicMock()
+        self.tracer = Tracer(self.exporter)
+
+    def exported(self):
+        self.exporter.export.assert_called_once()
+        return {span.name: span for span in self.exporter.export.call_args[0][0]}
+
+    def test_exports_trace_when_root_ends(self):
+        with self.tracer.span('node_step', {'rundeck.node': 'minion'}):
+            with self.tracer.span('login'):
+                pass
+            with self.tracer.span('poll', {'salt.jid': '1'}):
+                self.exporter.export.assert_not_called()
+
+        spans = self.exported()
+        self.assertEqual(sorted(spans), ['login', 'node_step', 'poll'])
+        self.assertIsNone(spans['node_step'].parent_id)
+        self.assertEqual(spans['login'].parent_id, spans['node_step'].span_id)
+        self.assertEqual(spans['poll'].parent_id, spans['node_step'].span_id)
+        self.assertEqual(len({span.trace_id for span in spans.values()}), 1)
+        self.assertEqual(spans['poll'].attributes, {'salt.jid': '1'})
+        self.assertLessEqual(spans['node_step'].start, spans['login'].start)
+        self.assertGreaterEqual(spans['node_step'].end, spans['poll'].end)
+        self.assertIsNone(current_span())
+
+    def test_continues_remote_trace(self):
+        self.tracer = Tracer(self.exporter, f"00-{self.TRACE_ID}-{self.PARENT_ID}-01")
+
+        with self.tracer.span('node_step'):
+            pass
+
+        span = self.exported()['node_step']
+        self.assertEqual(span.trace_id, self.TRACE_ID)
+        self.assertEqual(span.parent_id, self.PARENT_ID)
+
+    def test_ignores_invalid_traceparent(self):
+        self.tracer = Tracer(self.exporter, "invalid")
+
+        with self.tracer.span('node_step'):
+            pass
+
+        self.assertIsNone(self.exported()['node_step'].parent_id)
+
+    def test_records_errors(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span('node_step'):
+                raise ValueError("failed")
+
+        span = self.exported()['node_step'].to_otlp()
+        self.assertEqual(span['status'], {"code": 2, "message": "failed"})
+
+    def test_injects_traceparent(self):
+        session = requests.Session()
+        session.auth = inject_trace_context
+
+        request = session.prepare_request(requests.Request('GET', 'https://localhost/jobs'))
+        self.assertNotIn('traceparent', request.headers)
+
+        with self.tracer.span('poll') as span:
+            request = session.prepare_request(requests.Request('GET', 'https://localhost/jobs'))
+
+        self.assertEqual(request.headers['traceparent'], f"00-{span.trace_id}-{span.span_id}-01")
+
+    def test_metrics_record_phases_as_spans(self):
+        metrics = StepMetrics(self.tracer)
+        response = MagicMock(status_code=200, headers={'Content-Length': '120'})
+        response.request.method = 'POST'
+        response.request.body = b'{"fun": "test.ping"}'
+
+        with self.tracer.span('node_step'):
+            with metrics.time('dispatch', {'salt.minion': 'minion'}):
+                metrics.count_response(response)
+
+        self.assertEqual(self.exported()['dispatch'].attributes, {
+            'salt.minion': 'minion',
+            'http.request.method': 'POST',
+            'http.response.status_code': 200,
+            'http.request.body.size': 20,
+            'http.response.body.size': 120,
+        })
+        self.assertEqual(metrics.report()['polls'], 0)
+
+
+class TestSpanExporters(unittest.TestCase):
+
+    def trace(self, exporter):
+        tracer = Tracer(exporter)
+        with tracer.span('node_step', {'rundeck.node': 'minion', 'attempt': 1, 'cached': False}):
+            with tracer.span('login'):
+                pass
+
+    def test_console_exporter(self):
+        stream = io.StringIO()
+
+        self.trace(ConsoleSpanExporter(stream))
+
+        spans = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([span['name'] for span in spans], ['login', 'node_step'])
+
+    def test_otlp_file_exporter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'traces.jsonl')
+
+            self.trace(OtlpFileSpanExporter(path))
+            self.trace(OtlpFileSpanExporter(path))
+
+            with open(path) as f:
+                traces = [json.loads(line) for line in f]
+
+        self.assertEqual(len(traces), 2)
+        resource = traces[0]['resourceSpans'][0]
+        self.assertEqual(resource['resource']['attributes'], [{"key": "service.name", "value": {"stringValue": "rundeck-salt-step"}}])
+        spans = resource['scopeSpans'][0]['spans']
+        root = [span for span in spans if 'parentSpanId' not in span][0]
+        self.assertEqual(root['attributes'], [
+            {"key": "rundeck.node", "value": {"stringValue": "minion"}},
+            {"key": "attempt", "value": {"intValue": "1"}},
+            {"key": "cached", "value": {"boolValue": False}},
+        ])
+        self.assertTrue(root['endTimeUnixNano'].isdigit())
@@ -0,0 +1,32 @@
+import random
+
+from util.exponential_backoff_timer import ExponentialBackoffTimer
+
+# The fraction of the expected completion time the first poll is made after. Polling before the expected time
+# lets a job completing sooner be seen sooner, so the recorded completion times can fall after a slow run.
+FIRST_POLL_FRACTION = 0.5
+
+
+class AdaptiveBackoffTimer(ExponentialBackoffTimer):
+    def __init__(self, delay_step, maximum_delay, expected_delay, jitter=0.1, jitter_mode=None, deadline=None, fraction=FIRST_POLL_FRACTION):
+        """
+        Creates a backoff timer which first waits for a fraction of the expected completion
+        time of the job, then backs off as an ExponentialBackoffTimer does.
+
+        :param delay_step: A multiplier value (in ms) for the amount to sleep for.
+        :param maximum_delay: The maximum amount for the sleep value (in ms)
+        :param expected_delay: The expected completion time of the job (in ms)
+        :param jitter: The fraction of the first delay to randomly shift the first poll by.
+        :param jitter_mode: How to randomise the backoff after the first poll, see ExponentialBackoffTimer.
+        :param deadline: The overall amount of time (in ms) to wait for, from the first wait. None for no limit.
+        :param fraction: The fraction of the expected delay to wait for before the first poll.
+        """
+        super().__init__(delay_step, maximum_delay, jitter_mode, deadline)
+        self.expected_delay = expected_delay
+        self.first_sleep_amount = expected_delay * fraction * random.uniform(1 - jitter, 1 + jitter)
+
+    def first_delay(self):
+        """
+        Returns a fraction of the expected completion time of the job (in ms).
+        """
+        return self.first_sleep_amount
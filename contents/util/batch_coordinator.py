@@ -0,0 +1,74 @@
+import os
+import glob
+import time
+import hashlib
+
+from util.file_lock import locked_file, read_json, write_json
+
+# Seconds the coordination files of past batches are kept for, to recognise the repeated claims of their nodes
+BATCH_RETENTION = 24 * 60 * 60
+
+
+class BatchCoordinator:
+    """
+    Shares a single salt job between the node step processes of one Rundeck run.
+
+    The first node step to claim the batch submits the job for every node, the other
+    node steps read the jid from the coordination file.
+    """
+
+    def __init__(self, directory, key):
+        """
+        Creates a coordinator for the batch with the given key
+
+        :param directory: The directory to keep the coordination files in.
+        :param key: The batch key as returned by key().
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, f"batch-{key}.json")
+
+    @staticmethod
+    def key(execution_id, endpoint, function, minionIds):
+        return hashlib.sha256("\0".join([execution_id, endpoint, function] + sorted(minionIds)).encode()).hexdigest()
+
+    def claim(self, minionId, minionIds, submit, submit_alone):
+        """
+        Claims the slice of the batch job for the given minion.
+
+        The batch is recorded with the nodes it was requested for, so the nodes salt did not target
+        find the job that left them out. A minion claiming the batch again (e.g. when Rundeck retries
+        its step) submits a job for itself alone, the other nodes never run the function twice.
+
+        :param minionId: The minion id of the node step.
+        :param minionIds: The minion ids of the nodes the batch is requested for.
+        :param submit: A callable submitting the batch job and returning a (jid, minions) tuple.
+        :param submit_alone: A callable submitting a job for the minion only and returning a (jid, minions) tuple.
+        :return a tuple of the jid and the minions targeted by the job.
+        """
+        with locked_file(self.path) as f:
+            batch = read_json(f)
+
+            if batch is not None and minionId in batch['claimed']:
+                return submit_alone()
+
+            if batch is None:
+                self.prune()
+                jid, minions = submit()
+                batch = {'jid': jid, 'requested': sorted(minionIds), 'minions': minions, 'claimed': []}
+
+            batch['claimed'].append(minionId)
+            write_json(f, batch)
+
+            return batch['jid'], batch['minions']
+
+    def prune(self):
+        """
+        Removes the coordination files of the batches older than BATCH_RETENTION.
+        """
+        expired = time.time() - BATCH_RETENTION
+        for path in glob.glob(os.path.join(self.directory, "batch-*.json")):
+            try:
+                if path != self.path and os.stat(path).st_mtime < expired:
+                    os.unlink(path)
+            except OSError:
+                pass
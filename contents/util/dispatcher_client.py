@@ -0,0 +1,44 @@
+import json
+import socket
+
+
+class DispatcherUnavailable(Exception):
+    """
+    Represents a dispatcher which is not running, the step has not been handed over.
+    """
+
+
+def dispatch(socket_path, request, on_log):
+    """
+    Hands a step over to the dispatcher listening on the unix socket and waits for its result.
+
+    The protocol is one json document per line: the request, then any number of
+    {"log": [level, message]} documents and a final {"result": {...}} document.
+
+    :param socket_path: The unix socket of the dispatcher.
+    :param request: The json serializable request.
+    :param on_log: A callable receiving (level, message) for each log record of the step.
+    :return the result document.
+    :raises DispatcherUnavailable: if no dispatcher accepts connections on the socket.
+    :raises ConnectionError: if the dispatcher closed the connection before sending the result.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        sock.close()
+        raise DispatcherUnavailable(e)
+
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode() + b'\n')
+        stream.flush()
+
+        for line in stream:
+            message = json.loads(line)
+            if 'log' in message:
+                on_log(*message['log'])
+            elif 'result' in message:
+                return message['result']
+
+    raise ConnectionError("The dispatcher closed the connection without a result")
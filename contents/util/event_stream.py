@@ -0,0 +1,46 @@
+def iter_events(lines):
+    """
+    Parses the server-sent events of salt-api's /events resource.
+
+    :param lines: An iterable of decoded lines of the stream.
+    :return a generator of (tag, data) tuples, data being the undecoded json document of the event.
+    """
+    tag = None
+    data = []
+
+    for line in lines:
+        if not line:
+            if tag is not None or data:
+                yield tag, "\n".join(data)
+            tag = None
+            data = []
+            continue
+
+        if line.startswith(':'):
+            continue
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+
+        if field == 'tag':
+            tag = value
+        elif field == 'data':
+            data.append(value)
+
+    if tag is not None or data:
+        yield tag, "\n".join(data)
+
+
+def return_tag(jid, minionId):
+    """
+    Returns the tag of the event salt fires when the minion returns the job.
+    """
+    return f"salt/job/{jid}/ret/{minionId}"
+
+
+def progress_tag_prefix(jid, minionId):
+    """
+    Returns the prefix of the tags of the events salt fires as the minion runs the states of the job.
+    """
+    return f"salt/job/{jid}/prog/{minionId}/"
@@ -1,38 +1,144 @@
 import time
 import math
+import random
+
+JITTER_MODES = ['full', 'decorrelated']
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a timer is asked for a delay after its deadline passed.
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
 
 
 class ExponentialBackoffTimer:
-    def __init__(self, delay_step, maximum_delay):
+    def __init__(self, delay_step, maximum_delay, jitter_mode=None, deadline=None):
         """
         Creates a backoff timer using the given delay_step and maximum_delay
 
         :param delay_step: A multiplier value (in ms) for the amount to sleep for.
         :param maximum_delay: The maximum amount for the sleep value (in ms)
+        :param jitter_mode: None to sleep for the exact backoff, 'full' to sleep for a random amount up to it,
+                            or 'decorrelated' to sleep for a random amount between delay_step and three times the last sleep.
+        :param deadline: The overall amount of time (in ms) to wait for, from the first wait. None for no limit.
         """
+        if jitter_mode is not None and jitter_mode not in JITTER_MODES:
+            raise ValueError(f"{jitter_mode} is not a valid jitter mode")
+
         self.delay_step = delay_step
         self.maximum_delay = maximum_delay
+        self.jitter_mode = jitter_mode
+        self.deadline = deadline
+        self.started = None
+        self.reset()
+
+    def reset(self):
+        """
+        Backs off from delay_step again, e.g. after the job made progress. The deadline is kept.
+        """
         self.count = 2
         self.next_sleep_amount = self.delay_step
+        self.last_delay = self.delay_step
+
+    def start(self):
+        """
+        Starts the deadline clock. The first wait starts it if it was not started.
+        """
+        self.started = time.monotonic()
+
+    def remaining(self):
+        """
+        Returns the amount of time (in ms) left before the deadline, or None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        if self.started is None:
+            self.start()
+        return self.deadline - (time.monotonic() - self.started) * 1000
+
+    def first_delay(self):
+        """
+        Returns the amount of time (in ms) to wait before the first poll. Polls immediately by default.
+        """
+        return 0
+
+    def next_delay(self):
+        """
+        Returns the amount of time (in ms) to wait before the next poll, advancing the backoff.
+
+        Uses the default E(c) = (2^x-1)/2 formula, randomised according to the jitter mode
+        and shortened to end at the deadline.
+
+        :raises DeadlineExceeded: if the deadline passed.
+        """
+        delay = self.next_sleep_amount
+        if self.next_sleep_amount < self.maximum_delay:
+            self.next_sleep_amount = (math.pow(2, self.count) - 1) * self.delay_step
+            self.count += 1
+        self.next_sleep_amount = min(self.maximum_delay, self.next_sleep_amount)
+
+        if self.jitter_mode == 'full':
+            delay = random.uniform(0, delay)
+        elif self.jitter_mode == 'decorrelated':
+            delay = min(self.maximum_delay, random.uniform(self.delay_step, self.last_delay * 3))
+        self.last_delay = delay
+
+        return self.until_deadline(delay)
+
+    def until_deadline(self, delay):
+        """
+        Shortens the delay (in ms) to end at the deadline.
+
+        :raises DeadlineExceeded: if the deadline passed.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return delay
+        if remaining <= 0:
+            raise DeadlineExceeded("Gave up waiting after %d ms" % self.deadline)
+        return min(delay, remaining)
+
+    def wait_for_first(self):
+        """
+        Called once before the first poll, sleeps for first_delay if any.
+
+        :raises InterruptedError: if the sleep is interrupted.
+        """
+        if self.started is None:
+            self.start()
+        delay = self.first_delay()
+        if delay:
+            try:
+                self.sleep(self.until_deadline(delay))
+            except KeyboardInterrupt:
+                raise InterruptedError()
 
     def wait_for_next(self):
         """
         Calls time.sleep for an appropriate length of time depending on how many
         times this method has already been invoked.
 
-        Uses the default E(c) = (2^x-1)/2 formula.
-
         :raises InterruptedError: if the sleep is interrupted.
+        :raises DeadlineExceeded: if the deadline passed.
         """
         try:
-            self.sleep(self.next_sleep_amount)
-            if self.next_sleep_amount < self.maximum_delay:
-                self.next_sleep_amount = (math.pow(2, self.count) - 1) * self.delay_step
-                self.count += 1
-            self.next_sleep_amount = min(self.maximum_delay, self.next_sleep_amount)
+            self.sleep(self.next_delay())
         except KeyboardInterrupt:
             raise InterruptedError()
 
+    async def async_wait_for_next(self):
+        """
+        Awaits for the same length of time wait_for_next sleeps for, without blocking the event loop.
+
+        :raises DeadlineExceeded: if the deadline passed.
+        """
+        import asyncio
+
+        await asyncio.sleep(self.next_delay() / 1000.0)
+
     def sleep(self, delay):  # pragma: no cover
         """
         Sleeps for the specified amount of time.
@@ -0,0 +1,77 @@
+import os
+import json
+import fcntl
+from contextlib import contextmanager
+
+
+@contextmanager
+def locked_file(path):
+    """
+    Opens (and creates if needed) a file for reading and writing while holding an
+    exclusive lock on it, so that concurrent node step processes see consistent data.
+
+    :param path: The path of the file to open.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    while True:
+        f = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), 'r+')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Another process may have removed the file while we were waiting for the lock
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                break
+        except OSError:
+            pass
+        f.close()
+
+    with f:
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def remove_locked(path):
+    """
+    Removes a file while its lock is held, processes waiting for the lock will then open a new file.
+
+    :param path: The path of the file locked with locked_file.
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_json(f, default=None):
+    """
+    Reads the json document of a locked file.
+
+    :param f: The file returned by locked_file.
+    :param default: The value to return when the file is empty or corrupt.
+    """
+    f.seek(0)
+    content = f.read()
+    if not content:
+        return default
+
+    try:
+        return json.loads(content)
+    except ValueError:
+        return default
+
+
+def write_json(f, data):
+    """
+    Replaces the content of a locked file with the given json document.
+
+    :param f: The file returned by locked_file.
+    :param data: The document to write.
+    """
+    f.seek(0)
+    f.truncate()
+    json.dump(data, f)
+    f.flush()
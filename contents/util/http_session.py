@@ -0,0 +1,89 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which applies a default timeout to every request sent through it.
+    """
+
+    def __init__(self, timeout=None, *args, **kwargs):
+        """
+        Creates an adapter using the given default timeout
+
+        :param timeout: A (connect, read) tuple in seconds, used when the caller passes no timeout.
+        """
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class PooledSession(requests.Session):
+    """
+    A keep-alive session to salt-api with a bounded connection pool, retries and timeouts.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        super().__init__()
+        self.configure(pool_size, retries, connect_timeout, read_timeout)
+
+    def configure(self, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES,
+                  connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        """
+        (Re)mounts the adapters of this session using the given pool settings.
+
+        Only idempotent GETs are retried on read errors and 502/503/504 responses, so a job
+        is never submitted twice. Connection errors are retried for every method.
+
+        :param pool_size: The maximum number of connections kept alive per host.
+        :param retries: The maximum number of retries for a single request.
+        :param connect_timeout: The connect timeout in seconds.
+        :param read_timeout: The read timeout in seconds.
+        """
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(total=retries,
+                      backoff_factor=0.5,
+                      status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(['GET']),
+                      raise_on_status=False)
+
+        adapter = TimeoutHTTPAdapter(timeout=self.timeout,
+                                     pool_maxsize=pool_size,
+                                     max_retries=retry)
+
+        for old_adapter in set(self.adapters.values()):
+            old_adapter.close()
+
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def connection_stats(self):
+        """
+        Counts the connections opened and reused by this session so far.
+
+        :return: a tuple of (new, reused) connection counts.
+        """
+        created = 0
+        sent = 0
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                created += pool.num_connections
+                sent += pool.num_requests
+
+        return created, max(0, sent - created)
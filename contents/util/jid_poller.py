@@ -0,0 +1,192 @@
+import threading
+import time
+
+from util.exponential_backoff_timer import DeadlineExceeded
+
+RESULT_GRACE = 60
+
+
+class _Job:
+
+    def __init__(self, timer):
+        self.timer = timer
+        if timer.started is None:
+            timer.start()
+        self.due = time.monotonic() + timer.first_delay() / 1000.0
+        self.minions = set()
+        self.returns = {}
+        self.subscribers = []
+        self.served = set()
+        self.done = False
+        self.expires = None
+
+
+class JidPoller:
+    """
+    Polls the returns of all the outstanding jobs with a single lookup per tick.
+
+    A tick happens when the job due first is due according to its own backoff timer,
+    and looks up every outstanding job at once, so the number of requests does not
+    grow with the number of jobs in flight. When the lookup costs a request per job,
+    a tick looks up the due jobs only, so each job keeps its own backoff. The backoff of a job starts over when some
+    of its minions returned. The returns of a completed job are kept until each expected
+    minion was served, or for RESULT_GRACE seconds.
+    """
+
+    def __init__(self, lookup, timer_factory, sweep=True):
+        """
+        Creates a poller using the given lookup
+
+        :param lookup: A callable taking a list of jids and returning a dict of jid to either a dict of
+                       minion id to host response, or the exception the lookup of that job failed with.
+                       An exception raised by it fails all the outstanding jobs.
+        :param timer_factory: A callable returning a backoff timer for a job.
+        :param sweep: Whether a tick looks up all the outstanding jobs, or only the due ones. False when
+                      the lookup makes a request per job.
+        """
+        self.lookup = lookup
+        self.timer_factory = timer_factory
+        self.sweep = sweep
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+        self.thread = None
+        self.ticks = 0
+
+    def expect(self, jid, minionIds, timer=None):
+        """
+        Starts polling a job for minions whose returns are about to be waited for.
+        """
+        with self.lock:
+            job = self._job(jid, timer)
+            job.minions.update(minionIds)
+            self._start()
+
+    def subscribe(self, jid, minionId, callback, timer=None):
+        """
+        Calls callback(response, error) from the polling thread once the minion returned the job, or its lookup failed.
+
+        :param timer: The backoff timer for the job, if it is not polled yet. Created with timer_factory when None.
+        """
+        with self.lock:
+            job = self._job(jid, timer)
+            job.minions.add(minionId)
+
+            if minionId not in job.returns:
+                job.subscribers.append((minionId, callback))
+                self._start()
+                return
+
+            response = job.returns[minionId]
+            self._served(jid, job, minionId)
+
+        callback(response, None)
+
+    def wait(self, jid, minionId, timer=None):
+        """
+        Waits for the return of the minion to the job.
+        :return the host response.
+        """
+        done = threading.Event()
+        outcome = []
+
+        def settle(response, error):
+            outcome.append((response, error))
+            done.set()
+
+        self.subscribe(jid, minionId, settle, timer)
+        done.wait()
+
+        response, error = outcome[0]
+        if error is not None:
+            raise error
+        return response
+
+    def _job(self, jid, timer):
+        now = time.monotonic()
+        for expired in [jid for jid, job in self.jobs.items() if job.done and job.expires < now]:
+            del self.jobs[expired]
+
+        job = self.jobs.get(jid)
+        if job is None:
+            job = self.jobs[jid] = _Job(timer or self.timer_factory())
+            self.changed.notify()
+        return job
+
+    def _served(self, jid, job, minionId):
+        job.served.add(minionId)
+        if job.done and job.served.issuperset(job.minions):
+            del self.jobs[jid]
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while True:
+                    pending = [jid for jid, job in self.jobs.items() if not job.done]
+                    if not pending:
+                        self.thread = None
+                        return
+
+                    delay = min(self.jobs[jid].due for jid in pending) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.changed.wait(delay)
+
+                if not self.sweep:
+                    now = time.monotonic()
+                    pending = [jid for jid in pending if self.jobs[jid].due <= now]
+
+            try:
+                lookups = self.lookup(pending)
+            except Exception as e:
+                lookups = dict.fromkeys(pending, e)
+
+            notifications = []
+            with self.lock:
+                self.ticks += 1
+                now = time.monotonic()
+
+                for jid in pending:
+                    job = self.jobs[jid]
+                    lookup = lookups.get(jid, {})
+
+                    if isinstance(lookup, Exception):
+                        del self.jobs[jid]
+                        notifications.extend((callback, None, lookup) for minionId, callback in job.subscribers)
+                        continue
+
+                    returned = len(job.returns)
+                    job.returns.update((minionId, lookup[minionId]) for minionId in job.minions if minionId in lookup)
+
+                    waiting = []
+                    for minionId, callback in job.subscribers:
+                        if minionId in job.returns:
+                            notifications.append((callback, job.returns[minionId], None))
+                            job.served.add(minionId)
+                        else:
+                            waiting.append((minionId, callback))
+                    job.subscribers = waiting
+
+                    if job.minions.issubset(job.returns):
+                        job.done = True
+                        job.expires = now + RESULT_GRACE
+                        if job.served.issuperset(job.minions):
+                            del self.jobs[jid]
+                        continue
+
+                    if len(job.returns) > returned:
+                        job.timer.reset()
+
+                    try:
+                        job.due = now + job.timer.next_delay() / 1000.0
+                    except DeadlineExceeded as e:
+                        del self.jobs[jid]
+                        notifications.extend((callback, None, e) for minionId, callback in job.subscribers)
+
+            for callback, response, error in notifications:
+                callback(response, error)
@@ -0,0 +1,351 @@
+import re
+from json.decoder import scanstring
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?')
+_NUMBER_CHARACTERS = re.compile(r'[-+0-9.eE]*')
+# Runs of plain characters and complete escape sequences. A high surrogate escape is only
+# taken together with its low surrogate, or once it is known not to be followed by one.
+_STRING_SEGMENT = re.compile(r'(?:[^"\\]+'
+                             r'|\\[^u]'
+                             r'|\\u(?![dD][89abAB])[0-9a-fA-F]{4}'
+                             r'|\\u[dD][89abAB][0-9a-fA-F]{2}\\u[dD][c-fC-F][0-9a-fA-F]{2}'
+                             r'|\\u[dD][89abAB][0-9a-fA-F]{2}(?=[^\\]|\\[^u]|\\u(?![dD][c-fC-F])[0-9a-fA-F]{2}))*')
+_LONGEST_ESCAPE = 12
+_LITERALS = {'t': ('true', True), 'f': ('false', False), 'n': ('null', None)}
+
+# Parser states
+_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END, _COLON, _COMMA_OR_END, _DONE = range(7)
+
+
+class JsonStreamError(ValueError):
+    """
+    Represents a malformed json document.
+    """
+
+
+class JsonSizeExceeded(JsonStreamError):
+    """
+    Represents a decoded value growing beyond the configured size cap.
+    """
+
+
+class _Reader:
+    """
+    A text buffer over an iterable of chunks, only keeping the part not consumed yet.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = ''
+        self.pos = 0
+
+    def fill(self):
+        """
+        Appends the next non empty chunk to the buffer.
+
+        :return False if there are no more chunks.
+        """
+        for chunk in self.chunks:
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+
+    def ensure(self, count):
+        while len(self.buf) - self.pos < count:
+            if not self.fill():
+                raise JsonStreamError("Unexpected end of document")
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character without consuming it, None at the end of the document.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+
+def _string_chunks(reader):
+    """
+    Decodes the string at the position of the reader, yielding it in chunks of at most about one read.
+
+    Each chunk is the longest prefix of the buffer made of complete escape sequences,
+    decoded at once by the json module.
+    """
+    reader.pos += 1
+
+    while True:
+        end = _STRING_SEGMENT.match(reader.buf, reader.pos).end()
+        if end > reader.pos:
+            try:
+                chunk, _ = scanstring(reader.buf[reader.pos:end] + '"', 0)
+            except ValueError as e:
+                raise JsonStreamError("Invalid string: %s" % e)
+            reader.pos = end
+            yield chunk
+
+        if reader.pos < len(reader.buf) and reader.buf[reader.pos] == '"':
+            reader.pos += 1
+            return
+
+        if len(reader.buf) - reader.pos >= _LONGEST_ESCAPE:
+            raise JsonStreamError("Invalid escape %s" % reader.buf[reader.pos:reader.pos + _LONGEST_ESCAPE])
+
+        if not reader.fill():
+            raise JsonStreamError("Unterminated string")
+
+
+def iter_events(chunks):
+    """
+    Decodes a json document incrementally.
+
+    String values are produced as ('string_chunk', text) events followed by a
+    ('string_end', None) event, so that a huge string never has to be held whole.
+    The other events are start_map, end_map, start_array, end_array, ('key', name)
+    and ('value', scalar).
+
+    :param chunks: An iterable of text chunks of the document.
+    :raises JsonStreamError: if the document is malformed.
+    """
+    reader = _Reader(chunks)
+    stack = []
+    state = _VALUE
+
+    while True:
+        c = reader.peek()
+
+        if c is None:
+            if state != _DONE:
+                raise JsonStreamError("Unexpected end of document")
+            return
+
+        if state == _DONE:
+            raise JsonStreamError("Extra data after document")
+
+        if state == _COLON:
+            if c != ':':
+                raise JsonStreamError("Expected ':' but found %r" % c)
+            reader.pos += 1
+            state = _VALUE
+            continue
+
+        if state == _COMMA_OR_END:
+            reader.pos += 1
+            if c == ',':
+                state = _KEY if stack[-1] == '{' else _VALUE
+                continue
+            if (c == '}' and stack[-1] == '{') or (c == ']' and stack[-1] == '['):
+                stack.pop()
+                yield ('end_map' if c == '}' else 'end_array'), None
+                state = _COMMA_OR_END if stack else _DONE
+                continue
+            raise JsonStreamError("Unexpected %r" % c)
+
+        if state in (_KEY, _KEY_OR_END):
+            if c == '}' and state == _KEY_OR_END:
+                reader.pos += 1
+                stack.pop()
+                yield 'end_map', None
+                state = _COMMA_OR_END if stack else _DONE
+                continue
+            if c != '"':
+                raise JsonStreamError("Expected a key but found %r" % c)
+            yield 'key', ''.join(_string_chunks(reader))
+            state = _COLON
+            continue
+
+        # _VALUE or _VALUE_OR_END
+        if c == ']' and state == _VALUE_OR_END:
+            reader.pos += 1
+            stack.pop()
+            yield 'end_array', None
+            state = _COMMA_OR_END if stack else _DONE
+            continue
+
+        if c == '{':
+            reader.pos += 1
+            stack.append('{')
+            yield 'start_map', None
+            state = _KEY_OR_END
+            continue
+
+        if c == '[':
+            reader.pos += 1
+            stack.append('[')
+            yield 'start_array', None
+            state = _VALUE_OR_END
+            continue
+
+        if c == '"':
+            for chunk in _string_chunks(reader):
+                yield 'string_chunk', chunk
+            yield 'string_end', None
+
+        elif c == '-' or c.isdigit():
+            end = _NUMBER_CHARACTERS.match(reader.buf, reader.pos).end()
+            while end == len(reader.buf) and reader.fill():
+                end = _NUMBER_CHARACTERS.match(reader.buf, reader.pos).end()
+            number = reader.buf[reader.pos:end]
+            if not _NUMBER.fullmatch(number):
+                raise JsonStreamError("Invalid number %s" % number)
+            reader.pos = end
+            yield 'value', (float(number) if any(x in number for x in '.eE') else int(number))
+
+        elif c in _LITERALS:
+            literal, value = _LITERALS[c]
+            reader.ensure(len(literal))
+            if reader.buf[reader.pos:reader.pos + len(literal)] != literal:
+                raise JsonStreamError("Invalid literal")
+            reader.pos += len(literal)
+            yield 'value', value
+
+        else:
+            raise JsonStreamError("Unexpected %r" % c)
+
+        state = _COMMA_OR_END if stack else _DONE
+
+
+class MinionReturn:
+    """
+    The result of extract_minion_return.
+    """
+
+    def __init__(self):
+        self.found = False
+        self.value = None
+        self.responses = 0
+        self.unexpected = False
+
+
+class _Budget:
+
+    def __init__(self, maximum):
+        self.remaining = maximum
+
+    def spend(self, size):
+        if self.remaining is not None:
+            self.remaining -= size
+            if self.remaining < 0:
+                raise JsonSizeExceeded("Minion return exceeds the maximum decoded size")
+
+
+def extract_minion_return(chunks, minionId, on_output=None, max_size=None):
+    """
+    Decodes only return[0][minionId] out of a salt-api job lookup response.
+
+    The other minions' returns are skipped without being kept. When on_output is given,
+    the minion return itself (when it is a string) or its stdout/stderr members are
+    passed to on_output(stream, text) chunk by chunk and replaced by '' in the value.
+
+    :param chunks: An iterable of text chunks of the response body.
+    :param minionId: The minion id
+    :param on_output: A callable receiving ('stdout'|'stderr', text) chunks.
+    :param max_size: The maximum number of characters kept from the minion return, None for no limit.
+    :return a MinionReturn.
+    :raises JsonStreamError: if the document is malformed.
+    :raises JsonSizeExceeded: if the kept part of the minion return is larger than max_size.
+    """
+    result = MinionReturn()
+    events = iter_events(chunks)
+    budget = _Budget(max_size)
+
+    event, value = next(events, (None, None))
+    if event != 'start_map':
+        if event is not None:
+            _skip(events, event)
+        return result
+
+    for event, key in events:
+        if event == 'end_map':
+            break
+
+        event, value = next(events)
+        if key != 'return' or event != 'start_array':
+            _skip(events, event)
+            continue
+
+        for event, value in events:
+            if event == 'end_array':
+                break
+
+            result.responses += 1
+            if result.responses > 1:
+                _skip(events, event)
+            elif event != 'start_map':
+                result.unexpected = True
+                _skip(events, event)
+            else:
+                for event, minion in events:
+                    if event == 'end_map':
+                        break
+                    event, value = next(events)
+                    if minion == minionId:
+                        result.found = True
+                        streams = ('stdout', 'stderr') if on_output else ()
+                        result.value = _build(events, event, value, budget, on_output, 'stdout' if on_output else None, streams)
+                    else:
+                        _skip(events, event)
+
+    for _ in events:
+        pass
+
+    return result
+
+
+def _skip(events, event):
+    if event == 'string_chunk':
+        for event, _ in events:
+            if event == 'string_end':
+                return
+    elif event in ('start_map', 'start_array'):
+        depth = 1
+        for event, _ in events:
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    return
+
+
+def _build(events, event, value, budget, on_output, stream, streams=()):
+    if event == 'value':
+        budget.spend(8)
+        return value
+
+    if event in ('string_chunk', 'string_end'):
+        parts = []
+        while event == 'string_chunk':
+            if stream is not None:
+                on_output(stream, value)
+            else:
+                budget.spend(len(value))
+                parts.append(value)
+            event, value = next(events)
+        return ''.join(parts)
+
+    if event == 'start_map':
+        document = {}
+        for event, key in events:
+            if event == 'end_map':
+                return document
+            budget.spend(len(key))
+            event, value = next(events)
+            document[key] = _build(events, event, value, budget, on_output, key if key in streams else None)
+        raise JsonStreamError("Unexpected end of document")
+
+    if event == 'start_array':
+        document = []
+        for event, value in events:
+            if event == 'end_array':
+                return document
+            budget.spend(8)
+            document.append(_build(events, event, value, budget, None, None))
+        raise JsonStreamError("Unexpected end of document")
+
+    raise JsonStreamError("Unexpected %s" % event)
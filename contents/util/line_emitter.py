@@ -0,0 +1,40 @@
+MAXIMUM_BUFFER = 65536
+
+
+class LineEmitter:
+    """
+    Collects text written in arbitrary chunks and emits it line by line.
+
+    A line longer than max_buffer characters is emitted in parts, so the
+    buffer stays bounded whatever the written text looks like.
+    """
+
+    def __init__(self, emit, max_buffer=MAXIMUM_BUFFER):
+        """
+        Creates a line emitter
+
+        :param emit: A callable receiving each line, without its line ending.
+        :param max_buffer: The maximum number of characters held before they are emitted.
+        """
+        self.emit = emit
+        self.max_buffer = max_buffer
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split('\n')
+
+        for line in lines:
+            self.emit(line)
+
+        while len(self.buffer) > self.max_buffer:
+            self.emit(self.buffer[:self.max_buffer])
+            self.buffer = self.buffer[self.max_buffer:]
+
+    def flush(self):
+        """
+        Emits the text after the last line ending, if any.
+        """
+        if self.buffer:
+            self.emit(self.buffer)
+            self.buffer = ''
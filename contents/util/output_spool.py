@@ -0,0 +1,161 @@
+import mmap
+import tempfile
+
+DEFAULT_SPOOL_THRESHOLD = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+TRUNCATION_MODES = ['none', 'head', 'tail', 'head_tail']
+
+
+class OutputSpool:
+    """
+    Collects a stream of minion output, in memory up to a threshold and in an anonymous temporary file beyond it,
+    then emits it in chunks of bounded size, whole or truncated to its head and/or tail.
+
+    The spooled file is memory-mapped to be emitted, so only the chunk being emitted is held as a string.
+    Sizes are in bytes of UTF-8, chunks are cut after a line ending when there is one and never within a character.
+    """
+
+    def __init__(self, threshold=DEFAULT_SPOOL_THRESHOLD):
+        """
+        :param threshold: The number of bytes kept in memory, more are written to a temporary file.
+        """
+        self.threshold = threshold
+        self.buffer = bytearray()
+        self.file = None
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def spooled(self):
+        return self.file is not None
+
+    def write(self, text):
+        # Encoded a slice at a time, a large output is not copied whole
+        for i in range(0, len(text), DEFAULT_CHUNK_SIZE):
+            self._write(text[i:i + DEFAULT_CHUNK_SIZE].encode('utf-8', 'surrogateescape'))
+
+    def _write(self, data):
+        self.size += len(data)
+
+        if self.file is None and len(self.buffer) + len(data) > self.threshold:
+            self.file = tempfile.TemporaryFile()
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            self.buffer += data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.buffer = bytearray()
+
+    def emit(self, log, chunk_size=DEFAULT_CHUNK_SIZE, truncation='none', limit=DEFAULT_OUTPUT_LIMIT):
+        """
+        Passes the output to log chunk by chunk.
+
+        :param log: A callable receiving each chunk of text, e.g. logger.info
+        :param chunk_size: The maximum number of bytes of a chunk.
+        :param truncation: 'none' to emit the whole output, 'head', 'tail' or 'head_tail' to emit only
+                           the first, last, or first and last bytes of an output larger than limit.
+        :param limit: The number of bytes emitted when truncating.
+        """
+        if truncation not in TRUNCATION_MODES:
+            raise ValueError(f"{truncation} is not a valid truncation mode")
+
+        if self.size == 0:
+            return
+
+        if self.file is None:
+            self._emit(log, self.buffer, chunk_size, truncation, limit)
+            return
+
+        self.file.flush()
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self._emit(log, data, chunk_size, truncation, limit)
+
+    def _emit(self, log, data, chunk_size, truncation, limit):
+        size = len(data)
+        if truncation == 'none' or size <= limit:
+            ranges = [(0, size)]
+        elif truncation == 'head':
+            ranges = [(0, limit), None]
+        elif truncation == 'tail':
+            ranges = [None, (size - limit, size)]
+        else:
+            ranges = [(0, limit // 2), None, (size - (limit - limit // 2), size)]
+
+        emitted = sum(_char_start(data, end) - _char_start(data, start) for start, end in filter(None, ranges))
+        for byteRange in ranges:
+            if byteRange is None:
+                log("[... %d bytes of output truncated ...]" % (size - emitted))
+                continue
+
+            start, end = _char_start(data, byteRange[0]), _char_start(data, byteRange[1])
+            for chunk in _chunks(data, start, end, chunk_size):
+                log(chunk)
+
+
+def _char_start(data, offset):
+    """
+    Moves the offset back to the first byte of the UTF-8 character it is in.
+    """
+    while 0 < offset < len(data) and data[offset] & 0xC0 == 0x80:
+        offset -= 1
+    return offset
+
+
+def _chunks(data, start, end, chunk_size):
+    """
+    Yields the text between the offsets in chunks of at most chunk_size bytes,
+    cut after the last line ending of each chunk if any.
+    """
+    while start < end:
+        stop = min(end, start + chunk_size)
+        if stop < end:
+            newline = data.rfind(b'\n', start, stop)
+            stop = newline + 1 if newline >= start else max(_char_start(data, stop), start + 1)
+
+        chunk = data[start:stop].decode('utf-8', 'replace')
+        yield chunk[:-1] if chunk.endswith('\n') else chunk
+        start = stop
+
+
+class SpooledEmitter:
+    """
+    Spools the text written to it and emits it with OutputSpool.emit when flushed, like a LineEmitter
+    emitting once the whole output is known, as its tail is only known then.
+    """
+
+    def __init__(self, log, threshold=DEFAULT_SPOOL_THRESHOLD, chunk_size=DEFAULT_CHUNK_SIZE, truncation='none', limit=DEFAULT_OUTPUT_LIMIT):
+        """
+        :param log: A callable receiving each chunk of text, e.g. logger.info
+        See OutputSpool and OutputSpool.emit for the other parameters.
+        """
+        self.log = log
+        self.spool = OutputSpool(threshold)
+        self.chunk_size = chunk_size
+        self.truncation = truncation
+        self.limit = limit
+
+    def write(self, text):
+        self.spool.write(text)
+
+    def flush(self):
+        """
+        Emits the spooled text and releases the spool, the emitter can then be written again.
+        """
+        try:
+            self.spool.emit(self.log, self.chunk_size, self.truncation, self.limit)
+        finally:
+            self.spool.close()
+            self.spool = OutputSpool(self.spool.threshold)
@@ -0,0 +1,197 @@
+import re
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+MASK = '****'
+# The number of characters RedactingWriter masks at a time, so a large text is not copied whole
+WRITE_SLICE = 65536
+
+
+class Redactor:
+    """
+    Masks the secure option values of a step in arguments, log messages and minion output.
+
+    The secrets are compiled into a single regular expression shaped like a trie of their characters, so the
+    text is scanned once whatever the number of secrets, trying only the secrets sharing the prefix read so far.
+    When secrets overlap, the longest one is masked. The lines of multi-line secrets are masked on their own
+    too, as output is logged line by line.
+    """
+
+    __slots__ = ('pattern', 'mask', 'longest')
+
+    def __init__(self, secrets, mask=MASK):
+        """
+        :param secrets: The values to mask, empty values are ignored.
+        :param mask: The text replacing each secret.
+        """
+        values = set()
+        for secret in secrets:
+            if secret:
+                values.add(secret)
+                if '\n' in secret:
+                    values.update(line for line in secret.splitlines() if line.strip())
+
+        self.pattern = re.compile(_trie_pattern(values)) if values else None
+        self.mask = mask
+        self.longest = max(map(len, values), default=0)
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def redact(self, text):
+        """
+        Returns the text with the secrets masked, the text itself if it holds none.
+        """
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self.mask, text)
+
+
+class RedactingWriter:
+    """
+    Masks the secrets of a Redactor in text written in fragments, e.g. minion output as it is decoded, before
+    writing it to an emitter (a LineEmitter or a SpooledEmitter) which cuts it into log records. The records are
+    masked one by one, a secret straddling two of them would not be.
+
+    The end of each fragment a secret could continue into the next is held back until the next write or flush.
+    """
+
+    __slots__ = ('redactor', 'emitter', 'pending')
+
+    def __init__(self, redactor, emitter):
+        """
+        :param redactor: The Redactor of the secrets to mask.
+        :param emitter: The emitter to write the masked text to, with write and flush methods.
+        """
+        self.redactor = redactor
+        self.emitter = emitter
+        self.pending = ''
+
+    def write(self, text):
+        for i in range(0, len(text), WRITE_SLICE):
+            self._write(text[i:i + WRITE_SLICE])
+
+    def _write(self, text):
+        text = self.pending + text
+
+        # A secret starting before cut ends within the text, one starting after it may continue in the next write
+        cut = len(text) - self.redactor.longest + 1
+        if cut <= 0:
+            self.pending = text
+            return
+
+        parts = []
+        position = 0
+        for match in self.redactor.pattern.finditer(text):
+            if match.start() >= cut:
+                break
+            parts.append(text[position:match.start()])
+            parts.append(self.redactor.mask)
+            position = match.end()
+
+        end = max(cut, position)
+        parts.append(text[position:end])
+        self.pending = text[end:]
+        self.emitter.write(''.join(parts))
+
+    def flush(self):
+        """
+        Writes the text held back, masked, then flushes the emitter.
+        """
+        if self.pending:
+            self.emitter.write(self.redactor.redact(self.pending))
+            self.pending = ''
+        self.emitter.flush()
+
+
+@lru_cache(maxsize=32)
+def _cached_redactor(secrets):
+    return Redactor(secrets)
+
+
+def redactor_for(secrets):
+    """
+    Returns a Redactor of the secrets, reusing the one compiled for the same secrets.
+    :param secrets: An iterable of the values to mask, e.g. the values of the secure options.
+    """
+    return _cached_redactor(tuple(sorted(set(secrets))))
+
+
+def _trie_pattern(secrets):
+    """
+    Builds a regular expression matching any of the secrets from the trie of their characters,
+    e.g. ab, abc and b give (?:ab(?:c)?|b).
+    """
+    trie = {}
+    for secret in secrets:
+        node = trie
+        for character in secret:
+            node = node.setdefault(character, {})
+        node[''] = None
+
+    # The alternatives of each node, built children first without recursing on long secrets
+    patterns = {}
+    stack = [(trie, False)]
+    while stack:
+        node, visited = stack.pop()
+        children = [(character, child) for character, child in node.items() if character != '']
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child, False) for character, child in children)
+            continue
+
+        branches = [re.escape(character) + patterns.pop(id(child)) for character, child in sorted(children)]
+        if not branches:
+            pattern = ''
+        elif len(branches) == 1 and '' not in node:
+            pattern = branches[0]
+        else:
+            pattern = '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                # Greedy, the longer secrets are tried first
+                pattern += '?'
+        patterns[id(node)] = pattern
+
+    return patterns[id(trie)]
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Masks the secrets of the step logging in the current thread in the log records, before any handler
+    formats or forwards them. Steps running in other threads (see salt_dispatcher.py) mask their own secrets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+        self.default = None
+
+    @contextmanager
+    def redacting(self, redactor):
+        """
+        Masks the secrets of the redactor in the records logged by the current thread within the with block.
+        """
+        previous = getattr(self.local, 'redactor', None)
+        self.local.redactor = redactor
+        try:
+            yield redactor
+        finally:
+            self.local.redactor = previous
+
+    def current(self):
+        """
+        Returns the redactor of the current thread, the default one if it has none.
+        """
+        return getattr(self.local, 'redactor', None) or self.default
+
+    def filter(self, record):
+        redactor = self.current()
+        if redactor:
+            message = record.getMessage()
+            redacted = redactor.redact(message)
+            if redacted != message:
+                record.msg = redacted
+                record.args = None
+        return True
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import fnmatch
+import hashlib
+
+from util.file_lock import locked_file, read_json, write_json
+
+MAXIMUM_ENTRIES = 1024
+MAXIMUM_BYTES = 64 * 1024 * 1024
+
+
+def parse_ttls(value):
+    """
+    Parses a TTL allow-list, e.g. "grains.items=300, pillar.get=60 pkg.*=120"
+
+    :param value: Comma or space separated function=seconds pairs, the functions may be globs.
+    :return a dict of function (or glob) to TTL in seconds.
+    :raises ValueError: if a pair is malformed.
+    """
+    ttls = {}
+    for pair in value.replace(',', ' ').split():
+        function, separator, seconds = pair.partition('=')
+        if not separator or not function:
+            raise ValueError(f"{pair} is not a function=seconds pair")
+        ttls[function] = float(seconds)
+    return ttls
+
+
+class ResultCache:
+    """
+    A cache of the returns of read-only salt functions (grains.items, pillar.get...) shared by every
+    node step process on this host.
+
+    Only the functions of the TTL allow-list are cached. The returns are kept in one file each next to
+    an index, the least recently used are evicted once there are too many or they take too much space.
+    The files are only readable by their owner, as returns may hold pillar data.
+    """
+
+    def __init__(self, directory, ttls, maximum_entries=MAXIMUM_ENTRIES, maximum_bytes=MAXIMUM_BYTES):
+        """
+        Creates a result cache stored in the given directory
+
+        :param directory: The directory to keep the returns in.
+        :param ttls: A dict of fully qualified function name (or glob of them) to the number of seconds its returns are reused for.
+        :param maximum_entries: The number of returns to keep.
+        :param maximum_bytes: The total size of the returns to keep.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, 'salt-results.json')
+        self.ttls = ttls
+        self.maximum_entries = maximum_entries
+        self.maximum_bytes = maximum_bytes
+
+    @staticmethod
+    def key(endpoint, username, password, eauth, minionId, function):
+        """
+        Returns the cache key of a function call. The user is part of the key as salt's
+        permissions differ between users, and so is the password, as a cached return skips
+        the authentication which would check it.
+
+        :param function: The function with its arguments, as in the FUNCTION configuration.
+        """
+        return hashlib.sha256("\0".join([endpoint, username, password, eauth, minionId, function]).encode()).hexdigest()
+
+    def ttl(self, fully_qualified_function_name):
+        """
+        Returns the number of seconds the returns of the function are reused for, None if they are not cached.
+        """
+        ttl = self.ttls.get(fully_qualified_function_name)
+        if ttl is None:
+            ttl = next((seconds for pattern, seconds in self.ttls.items()
+                        if fnmatch.fnmatchcase(fully_qualified_function_name, pattern)), None)
+        return ttl if ttl else None
+
+    def get(self, key):
+        """
+        Returns the cached return for the key, or None if there is none or it expired.
+        """
+        with locked_file(self.path) as f:
+            index = read_json(f, {})
+            entry = index.get(key)
+            if entry is None:
+                return None
+
+            if entry['expire'] <= time.time():
+                del index[key]
+                self._remove(key)
+            else:
+                entry['used'] = time.time()
+            write_json(f, index)
+
+        if key not in index:
+            return None
+
+        try:
+            with open(self._entry_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, fully_qualified_function_name, value):
+        """
+        Caches a return, if the function is in the allow-list.
+        """
+        ttl = self.ttl(fully_qualified_function_name)
+        if ttl is None or value is None:
+            return
+
+        import tempfile
+
+        content = json.dumps(value)
+        with locked_file(self.path) as f:
+            index = read_json(f, {})
+
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, prefix='.result', delete=False) as tmp:
+                tmp.write(content)
+            os.replace(tmp.name, self._entry_path(key))
+
+            now = time.time()
+            index[key] = {'expire': now + ttl, 'used': now, 'size': len(content)}
+            self._evict(index, now)
+            write_json(f, index)
+
+    def _evict(self, index, now):
+        for key in [key for key, entry in index.items() if entry['expire'] <= now]:
+            del index[key]
+            self._remove(key)
+
+        leastRecentlyUsed = sorted(index, key=lambda key: index[key]['used'])
+        size = sum(entry['size'] for entry in index.values())
+        while leastRecentlyUsed and (len(index) > self.maximum_entries or size > self.maximum_bytes):
+            key = leastRecentlyUsed.pop(0)
+            size -= index.pop(key)['size']
+            self._remove(key)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _remove(self, key):
+        try:
+            os.unlink(self._entry_path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,63 @@
+import time
+
+from util.file_lock import locked_file, read_json, write_json
+
+SMOOTHING = 0.3
+MAXIMUM_FUNCTIONS = 256
+
+
+class RuntimeHistory:
+    """
+    Keeps the observed completion times (in ms) of salt functions in a local file.
+
+    Each function keeps an exponentially weighted moving average, so the expected
+    completion time follows recent runs without storing every sample.
+    """
+
+    def __init__(self, path, smoothing=SMOOTHING, maximum_functions=MAXIMUM_FUNCTIONS):
+        """
+        Creates a runtime history stored at the given path
+
+        :param path: The file to keep the history in.
+        :param smoothing: The weight (0-1) of a new sample in the moving average.
+        :param maximum_functions: The number of functions to keep, the least recently run are dropped first.
+        """
+        self.path = path
+        self.smoothing = smoothing
+        self.maximum_functions = maximum_functions
+
+    def expected(self, function):
+        """
+        Returns the expected completion time of the function in ms, or None if it never completed before.
+        """
+        with locked_file(self.path) as f:
+            stats = read_json(f, {}).get(function)
+
+        return stats['mean'] if stats else None
+
+    def record(self, function, duration):
+        """
+        Records an observed completion time.
+
+        :param function: The salt function, without arguments.
+        :param duration: The completion time in ms.
+        """
+        with locked_file(self.path) as f:
+            history = read_json(f, {})
+            stats = history.get(function)
+
+            if stats is None:
+                stats = {'mean': duration, 'count': 0}
+            else:
+                stats['mean'] += self.smoothing * (duration - stats['mean'])
+
+            stats['count'] += 1
+            stats['updated'] = time.time()
+            history[function] = stats
+
+            if len(history) > self.maximum_functions:
+                oldest = sorted(history, key=lambda name: history[name].get('updated', 0))
+                for name in oldest[:len(history) - self.maximum_functions]:
+                    del history[name]
+
+            write_json(f, history)
@@ -0,0 +1,47 @@
+_UNDECODED = object()
+
+
+class SaltApiResponse:
+    """
+    Wraps a salt-api http response so its json body is decoded at most once.
+    """
+
+    def __init__(self, response):
+        """
+        Wraps the given response
+
+        :param response: The requests response to wrap.
+        """
+        self.response = response
+        self.status_code = response.status_code
+        self._document = _UNDECODED
+
+    def json(self):
+        """
+        Returns the decoded json body, decoding it on the first call only.
+        """
+        if self._document is _UNDECODED:
+            self._document = self.response.json()
+        return self._document
+
+    @property
+    def text(self):
+        return self.response.text
+
+    def iter_text(self, chunk_size):
+        """
+        Returns the body as decoded text chunks, for responses requested with stream=True.
+
+        :param chunk_size: The number of bytes to read at once.
+        """
+        self.response.encoding = self.response.encoding or 'utf-8'
+        return self.response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,61 @@
+import os
+
+# The RD_<KIND>_ prefixes Rundeck passes the context in, and the StepContext fields holding them
+_FIELDS = {
+    'OPTION': 'options',
+    'SECUREOPTION': 'secure_options',
+    'CONFIG': 'config',
+    'NODE': 'node',
+    'JOB': 'job',
+}
+
+
+class StepContext:
+    """
+    The Rundeck context of a node step: its option, secure option, config, node and job values,
+    keyed without their RD_<KIND>_ prefix.
+
+    The context is read once, then handed to every code path needing it, e.g. from a salt.py process to the
+    dispatcher or to the multi-node engine, without reading the environment again. It cannot be modified.
+    """
+
+    __slots__ = tuple(_FIELDS.values())
+
+    def __init__(self, options=None, secure_options=None, config=None, node=None, job=None):
+        for field, values in zip(self.__slots__, (options, secure_options, config, node, job)):
+            object.__setattr__(self, field, dict(values or {}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"StepContext is read-only, cannot set {name}")
+
+    def __eq__(self, other):
+        return isinstance(other, StepContext) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        # The values of options are never shown, the salt-api password is a plain option (SALT_PASSWORD)
+        return "StepContext(options=%r, secure_options=%r, config=%r, node=%r, job=%r)" % (
+            sorted(self.options), sorted(self.secure_options), self.config, self.node, self.job)
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """
+        Reads the context from the RD_ variables of the environment, in a single pass.
+
+        :param environ: The environment to read, os.environ when None.
+        """
+        maps = {field: {} for field in cls.__slots__}
+        for variable, value in (os.environ if environ is None else environ).items():
+            if variable[0:3] != 'RD_':
+                continue
+            kind, separator, name = variable[3:].partition('_')
+            field = _FIELDS.get(kind)
+            if field is not None and separator:
+                maps[field][name] = value
+
+        return cls(**maps)
+
+    def to_dict(self):
+        """
+        Returns the context as a json serializable dict, StepContext(**d) restores it.
+        """
+        return {field: getattr(self, field) for field in self.__slots__}
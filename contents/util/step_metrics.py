@@ -0,0 +1,161 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# The metrics kept in the textfile, with their help text. All are counters labelled with the salt function.
+TEXTFILE_METRICS = {
+    'salt_node_steps_total': "Node steps run, by result (success or failure reason).",
+    'salt_node_step_seconds_total': "Time spent running node steps.",
+    'salt_node_step_phase_seconds_total': "Time spent in each phase of the node steps.",
+    'salt_node_step_phase_calls_total': "Calls of each phase of the node steps.",
+    'salt_node_step_sent_bytes_total': "Request body bytes sent to salt-api.",
+    'salt_node_step_received_bytes_total': "Response bytes received from salt-api.",
+}
+
+_SAMPLE = re.compile(r'^(\w+)(\{.*\})? (\S+)$')
+
+
+class StepMetrics:
+    """
+    Times the phases of a node step (login, dispatch, each poll, output handling, logout...)
+    and counts the bytes it exchanged with salt-api. When given a tracer, each phase is also
+    recorded as a span.
+    """
+
+    def __init__(self, tracer=None):
+        """
+        :param tracer: The util.tracing.Tracer to record the phases with, if any.
+        """
+        self.started = time.monotonic()
+        self.phases = {}
+        self.bytes_sent = 0
+        self.raw_responses = []
+        self.thread = threading.get_ident()
+        self.tracer = tracer
+
+    @contextmanager
+    def time(self, phase, attributes=None):
+        """
+        Adds the time spent in the with block to the phase.
+        :param attributes: The attributes of the span of the phase, e.g. the jid.
+        """
+        span = self.tracer.start_span(phase, attributes) if self.tracer is not None else None
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            count, elapsed = self.phases.get(phase, (0, 0.0))
+            self.phases[phase] = (count + 1, elapsed + (time.monotonic() - started) * 1000)
+            if span is not None:
+                self.tracer.end_span(span, error)
+
+    def count_response(self, response, *args, **kwargs):
+        """
+        A requests response hook counting the bytes of the requests sent by the thread of the step.
+        The received bytes are read from the raw responses when reported, as streamed bodies are read later.
+        """
+        if threading.get_ident() != self.thread:
+            return
+
+        body = response.request.body
+        if body:
+            self.bytes_sent += len(body)
+        self.raw_responses.append(response.raw)
+
+        if self.tracer is not None:
+            from util.tracing import current_span
+
+            span = current_span()
+            if span is not None:
+                span.set_attribute('http.request.method', response.request.method)
+                span.set_attribute('http.response.status_code', response.status_code)
+                span.set_attribute('http.request.body.size', len(body) if body else 0)
+                contentLength = response.headers.get('Content-Length')
+                if contentLength and contentLength.isdigit():
+                    span.set_attribute('http.response.body.size', int(contentLength))
+
+    @property
+    def bytes_received(self):
+        received = 0
+        for raw in self.raw_responses:
+            read = getattr(raw, 'tell', None)
+            read = read() if callable(read) else None
+            if isinstance(read, int):
+                received += read
+        return received
+
+    def report(self, **fields):
+        """
+        Returns the metrics of the step as a json serialisable dict
+
+        :param fields: Fields describing the step (node, function, jid, result...) to include.
+        """
+        report = dict(fields)
+        report['duration_ms'] = round((time.monotonic() - self.started) * 1000, 3)
+        report['phases'] = {phase: {'count': count, 'ms': round(elapsed, 3)} for phase, (count, elapsed) in self.phases.items()}
+        report['polls'] = self.phases.get('poll', (0, 0.0))[0]
+        report['bytes_sent'] = self.bytes_sent
+        report['bytes_received'] = self.bytes_received
+        return report
+
+
+def _sample(name, labels):
+    return name + '{' + ','.join('%s="%s"' % (key, _escape(value)) for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def record_textfile(path, report):
+    """
+    Adds a step report to the counters kept in a file in Prometheus' text format, for the textfile collector
+    of the node exporter. The file is replaced atomically, so the collector never reads a partial file.
+
+    :param path: The .prom file to keep the counters in.
+    :param report: A report returned by StepMetrics.report, with function and result fields.
+    """
+    import tempfile
+    from util.file_lock import locked_file
+
+    function = report.get('function') or ''
+    increments = {
+        _sample('salt_node_steps_total', [('function', function), ('result', report.get('result') or '')]): 1,
+        _sample('salt_node_step_seconds_total', [('function', function)]): report['duration_ms'] / 1000,
+        _sample('salt_node_step_sent_bytes_total', [('function', function)]): report['bytes_sent'],
+        _sample('salt_node_step_received_bytes_total', [('function', function)]): report['bytes_received'],
+    }
+    for phase, stats in report['phases'].items():
+        labels = [('function', function), ('phase', phase)]
+        increments[_sample('salt_node_step_phase_seconds_total', labels)] = stats['ms'] / 1000
+        increments[_sample('salt_node_step_phase_calls_total', labels)] = stats['count']
+
+    with locked_file(path) as f:
+        samples = {}
+        for line in f.read().splitlines():
+            match = _SAMPLE.match(line)
+            if match and match.group(1) in TEXTFILE_METRICS:
+                samples[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+
+        for sample, increment in increments.items():
+            samples[sample] = samples.get(sample, 0) + increment
+
+        lines = []
+        for name, help_text in TEXTFILE_METRICS.items():
+            named = sorted(sample for sample in samples if sample.split('{', 1)[0] == name)
+            if named:
+                lines.append("# HELP %s %s" % (name, help_text))
+                lines.append("# TYPE %s counter" % name)
+                lines.extend("%s %r" % (sample, float(samples[sample])) for sample in named)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, prefix='.metrics', delete=False) as tmp:
+            tmp.write("\n".join(lines) + "\n")
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, path)
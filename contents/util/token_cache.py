@@ -0,0 +1,109 @@
+import os
+import time
+import hashlib
+
+from util.file_lock import locked_file, read_json, write_json
+
+DEFAULT_EXPIRY_MARGIN = 60
+
+
+class TokenCache:
+    """
+    A salt-api token cache shared by every node step process on this host.
+
+    Tokens are keyed by (endpoint, username, eauth) and leased by the processes using
+    them, so a token is only logged out once nobody uses it and it is about to expire.
+    """
+
+    def __init__(self, directory, expiry_margin=DEFAULT_EXPIRY_MARGIN):
+        """
+        Creates a token cache stored in the given directory
+
+        :param directory: The directory to keep the cache file in.
+        :param expiry_margin: The number of seconds before expiry at which a token is no longer reused.
+        """
+        self.path = os.path.join(directory, 'salt-api-tokens.json')
+        self.expiry_margin = expiry_margin
+
+    @staticmethod
+    def key(endpoint, username, eauth):
+        return hashlib.sha256("\0".join([endpoint, username, eauth]).encode()).hexdigest()
+
+    @staticmethod
+    def digest(key, password):
+        return hashlib.sha256(f"{key}\0{password}".encode()).hexdigest()
+
+    def acquire(self, key, password, authenticate):
+        """
+        Leases a token from the cache, authenticating when no usable token is cached.
+
+        :param key: The cache key as returned by key().
+        :param password: The password of the user, a cached token is only handed out for the same password.
+        :param authenticate: A callable returning a (token, expire) tuple, token being None on failure.
+        :return the token or None if authentication failed.
+        """
+        with locked_file(self.path) as f:
+            tokens = read_json(f, {})
+            entry = tokens.get(key)
+
+            if not self._usable(entry, self.digest(key, password)):
+                token, expire = authenticate()
+                if token is None:
+                    return None
+                entry = {
+                    'token': token,
+                    'expire': expire,
+                    'digest': self.digest(key, password),
+                    'leases': 0
+                }
+
+            entry['leases'] += 1
+            tokens[key] = entry
+            write_json(f, tokens)
+
+            return entry['token']
+
+    def release(self, key, token):
+        """
+        Returns a leased token to the cache.
+
+        :param key: The cache key as returned by key().
+        :param token: The leased token.
+        :return True if the token is no longer shared and should be logged out.
+        """
+        with locked_file(self.path) as f:
+            tokens = read_json(f, {})
+            entry = tokens.get(key)
+
+            if entry is None or entry['token'] != token:
+                return False
+
+            entry['leases'] = max(0, entry['leases'] - 1)
+            if entry['leases'] == 0 and not self._fresh(entry):
+                del tokens[key]
+                write_json(f, tokens)
+                return True
+
+            write_json(f, tokens)
+            return False
+
+    def invalidate(self, key, token):
+        """
+        Drops a token that salt-api no longer accepts.
+
+        :param key: The cache key as returned by key().
+        :param token: The rejected token.
+        """
+        with locked_file(self.path) as f:
+            tokens = read_json(f, {})
+            entry = tokens.get(key)
+
+            if entry is not None and entry['token'] == token:
+                del tokens[key]
+                write_json(f, tokens)
+
+    def _usable(self, entry, digest):
+        return entry is not None and entry.get('digest') == digest and self._fresh(entry)
+
+    def _fresh(self, entry):
+        return entry.get('expire') is not None and entry['expire'] - self.expiry_margin > time.time()
@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+SERVICE_NAME = 'rundeck-salt-step'
+SCOPE_NAME = 'salt-step'
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+_context = threading.local()
+
+
+class Span:
+    """
+    A timed operation of a trace, with the fields of an OpenTelemetry span.
+    """
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'status', 'message')
+
+    def __init__(self, trace_id, parent_id, name, kind, attributes):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.message = None
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def traceparent(self):
+        """
+        Returns the W3C traceparent header value identifying this span as the parent of a remote operation.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        """
+        Returns the span in the OTLP/JSON encoding.
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.message:
+            span["status"]["message"] = self.message
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def current_span():
+    """
+    Returns the innermost span open in the calling thread, or None.
+    """
+    spans = getattr(_context, 'spans', None)
+    return spans[-1] if spans else None
+
+
+def inject_trace_context(request):
+    """
+    Adds the traceparent header of the current span to a request. Usable as the auth of a requests
+    session, which requests calls with every request it prepares.
+    """
+    span = current_span()
+    if span is not None:
+        request.headers['traceparent'] = span.traceparent()
+    return request
+
+
+class Tracer:
+    """
+    Records the spans of a node step and hands them to an exporter once its root span ends.
+    """
+
+    def __init__(self, exporter, traceparent=None):
+        """
+        Creates a tracer exporting to the given exporter
+
+        :param exporter: An object with an export(spans) method.
+        :param traceparent: A W3C traceparent header value to continue the trace of, e.g. the TRACEPARENT environment variable.
+        """
+        self.exporter = exporter
+        self.finished = []
+
+        match = _TRACEPARENT.match(traceparent or '')
+        self.trace_id = match.group(1) if match else os.urandom(16).hex()
+        self.remote_parent_id = match.group(2) if match else None
+
+    def start_span(self, name, attributes=None, kind=SPAN_KIND_INTERNAL):
+        """
+        Starts a span as a child of the current span of the thread, and makes it the current span.
+        """
+        if not hasattr(_context, 'spans'):
+            _context.spans = []
+
+        parent = current_span()
+        span = Span(self.trace_id, parent.span_id if parent is not None else self.remote_parent_id, name, kind, attributes)
+        _context.spans.append(span)
+        return span
+
+    def end_span(self, span, error=None):
+        """
+        Ends the span, exporting the trace if it is the root span.
+
+        :param error: The exception the operation failed with, if any.
+        """
+        span.end = time.time_ns()
+        if error is not None:
+            span.status = STATUS_ERROR
+            span.message = str(error)
+
+        if span in _context.spans:
+            _context.spans.remove(span)
+        self.finished.append(span)
+
+        if span.parent_id == self.remote_parent_id:
+            spans, self.finished = self.finished, []
+            self.exporter.export(spans)
+
+    @contextmanager
+    def span(self, name, attributes=None, kind=SPAN_KIND_INTERNAL):
+        """
+        Records the with block as a span.
+        """
+        span = self.start_span(name, attributes, kind)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+
+class ConsoleSpanExporter:
+    """
+    Writes each span as a json line, for reading the trace without any collector.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def export(self, spans):
+        stream = self.stream or sys.stderr
+        for span in spans:
+            stream.write(json.dumps(span.to_otlp()) + "\n")
+        stream.flush()
+
+
+class OtlpFileSpanExporter:
+    """
+    Appends each trace as one line of OTLP/JSON to a file, as the OpenTelemetry collector's file exporter does.
+    The file can be replayed to a collector with its otlpjsonfile receiver.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        document = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+        # Appended with a single write, so the traces of concurrent steps do not interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(document) + "\n").encode())
+        finally:
+            os.close(fd)
+
+
+EXPORTERS = {
+    'console': lambda path: ConsoleSpanExporter(),
+    'file': OtlpFileSpanExporter,
+}